@@ -19,16 +19,37 @@
 # noinspection PyUnresolvedReferences
 from .exceptions import *
 # noinspection PyUnresolvedReferences
+from .columns import *
+# noinspection PyUnresolvedReferences
 from .data import *
 # noinspection PyUnresolvedReferences
+from .codec import *
+# noinspection PyUnresolvedReferences
+from .capture import *
+# noinspection PyUnresolvedReferences
+from .rate_limit import *
+# noinspection PyUnresolvedReferences
+from .stats import *
+# noinspection PyUnresolvedReferences
 from .client import *
 # noinspection PyUnresolvedReferences
+from .commands import *
+# noinspection PyUnresolvedReferences
 from .state_machines import *
 # noinspection PyUnresolvedReferences
 from .bot import *
+# noinspection PyUnresolvedReferences
+from .metrics import *
 
 __all__ = (exceptions.__all__ +
+           columns.__all__ +
            data.__all__ +
+           codec.__all__ +
+           capture.__all__ +
+           rate_limit.__all__ +
+           stats.__all__ +
            client.__all__ +
+           commands.__all__ +
            state_machines.__all__ +
-           bot.__all__)
+           bot.__all__ +
+           metrics.__all__)
@@ -17,11 +17,12 @@
 import asyncio
 import logging
 import logging.config
-from typing import Mapping
+from typing import Mapping, Optional
 
 import yaml
 
 from euphoria import Bot, BotConfig
+from euphoria.metrics import render_metrics, start_metrics_server
 from tiny_agent import SupervisorOneForOne
 
 logger = logging.getLogger(__name__)
@@ -37,6 +38,9 @@ class BorgConfig:
                 dictionary = yaml.load(f)
 
         conf = dictionary['borg']
+        metrics = dictionary.get('metrics', {})
+        self._metrics_port = metrics.get('port', None)
+        self._metrics_host = metrics.get('host', "127.0.0.1")
         self._dict = {}
         for key, value in conf.items():
             bot_conf = BotConfig(dictionary=value)
@@ -46,6 +50,16 @@ class BorgConfig:
     def bots(self) -> Mapping[str, BotConfig]:
         return self._dict
 
+    @property
+    def metrics_port(self) -> Optional[int]:
+        """A port to serve Prometheus text-format metrics for every bot on, from the top level
+        metrics section. Defaults to None, which serves nothing."""
+        return self._metrics_port
+
+    @property
+    def metrics_host(self) -> str:
+        return self._metrics_host
+
 
 def make_bot_constructor(config, loop):
     def construct():
@@ -61,6 +75,9 @@ def main():
     one_for_one = SupervisorOneForOne(loop=loop)
     for name, bot_config in borg_config.bots.items():
         one_for_one.add_child(name, make_bot_constructor(bot_config, loop))
+    if borg_config.metrics_port is not None:
+        start_metrics_server(lambda: render_metrics(one_for_one.children, one_for_one),
+                             borg_config.metrics_port, borg_config.metrics_host, loop=loop)
 
     loop.run_until_complete(one_for_one.task)
     logger.info("main() borg shutdown!")
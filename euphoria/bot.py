@@ -22,19 +22,27 @@ import importlib
 import logging
 import logging.config
 from asyncio import AbstractEventLoop, Future
-from typing import Optional
+from typing import Optional, Iterable
 
 import yaml
 
 import tiny_agent
-from euphoria import Client, NickAndAuth
+from euphoria import Client, NickAndAuth, SessionViewPool, get_session_view_pool, set_session_view_pool, \
+    RateLimiter, shared_rate_limiter, Subscription, CommandRouter, RoomState, MessageCache, Message
 from tiny_agent import Agent, SupervisorOneForOne
 from .client import EUPHORIA_URL
+from .metrics import render_metrics, start_metrics_server
 
 __all__ = ['BotConfig', 'Bot']
 
 logger = logging.getLogger(__name__)
 
+# The default capacity of Bot.add_listener, meaning whatever listener_capacity is in the config.
+_FROM_CONFIG = object()
+
+# Long enough for a nick or auth command to wait out its own reply timeout, twice the default.
+NICK_AND_AUTH_TIMEOUT = 60.0
+
 
 # TODO: Add Ctrl-C handler, see https://github.com/rainbowbismuth/euphoria-py/issues/4
 
@@ -59,6 +67,22 @@ class BotConfig:
         self._nick = conf['nick']
         self._passcode = conf.get('passcode', "")
         self._uri_format = conf.get('uri_format', EUPHORIA_URL)
+        self._lazy_decoding = conf.get('lazy_decoding', False)
+        self._json_codec = conf.get('json_codec', 'auto')
+        self._session_view_pool_size = conf.get('session_view_pool_size', 0)
+        self._message_cache_size = conf.get('message_cache_size', 1000)
+        self._capture_file = conf.get('capture_file', None)
+        self._reply_timeout = conf.get('reply_timeout', 30.0)
+        self._send_rate = conf.get('send_rate', None)
+        self._send_burst = conf.get('send_burst', 10.0)
+        self._share_rate_limit = conf.get('share_rate_limit', False)
+        self._reconnect = conf.get('reconnect', True)
+        self._reconnect_delay = conf.get('reconnect_delay', 1.0)
+        self._reconnect_max_delay = conf.get('reconnect_max_delay', 60.0)
+        self._listener_capacity = conf.get('listener_capacity', None)
+        self._listener_policy = conf.get('listener_policy', 'drop_oldest')
+        self._metrics_port = conf.get('metrics_port', None)
+        self._metrics_host = conf.get('metrics_host', "127.0.0.1")
         self._services_max_restarts = conf.get('services_max_restarts', 3)
         self._services_max_restarts_period = conf.get('services_max_restarts_period', 15.0)
 
@@ -114,6 +138,170 @@ class BotConfig:
         """
         return self._uri_format
 
+    @property
+    def lazy_decoding(self) -> bool:
+        """Whether packets should only have their data decoded when a listener asks for it.
+
+        Defaults to False
+
+        :rtype: bool
+        """
+        return self._lazy_decoding
+
+    @property
+    def json_codec(self) -> str:
+        """The name of the JSON codec to use on the wire, one of 'orjson', 'ujson', 'json' or 'auto'.
+
+        Defaults to "auto", which picks the fastest one installed
+
+        :rtype: str
+        """
+        return self._json_codec
+
+    @property
+    def session_view_pool_size(self) -> int:
+        """How many distinct message senders to share :py:class:`euphoria.SessionView` objects between.
+
+        The pool is shared by every bot in the process. Defaults to 0, which leaves interning off.
+
+        :rtype: int
+        """
+        return self._session_view_pool_size
+
+    @property
+    def message_cache_size(self) -> int:
+        """How many recent messages to keep, so looking one up doesn't need a round trip to the server.
+        See :py:class:`euphoria.MessageCache`.
+
+        Defaults to 1000, 0 turns the cache off
+
+        :rtype: int
+        """
+        return self._message_cache_size
+
+    @property
+    def capture_file(self) -> Optional[str]:
+        """A file to record every inbound frame to, for replaying later with :py:func:`euphoria.replay_capture`.
+
+        Defaults to None, which records nothing
+
+        :rtype: str
+        """
+        return self._capture_file
+
+    @property
+    def reply_timeout(self) -> float:
+        """How many seconds to wait for the server to reply to a command before giving up on it.
+
+        Defaults to 30.0
+
+        :rtype: float
+        """
+        return self._reply_timeout
+
+    @property
+    def send_rate(self) -> Optional[float]:
+        """How many commands per second the bot may send, backing off further whenever the server
+        throttles it. Control frames like ping-replies aren't counted.
+
+        Defaults to None, which sends as fast as the socket takes them. 0 also turns rate limiting off
+
+        :rtype: float
+        """
+        return self._send_rate
+
+    @property
+    def send_burst(self) -> float:
+        """How many commands the bot may send back to back before send_rate kicks in.
+
+        Defaults to 10.0
+
+        :rtype: float
+        """
+        return self._send_burst
+
+    @property
+    def share_rate_limit(self) -> bool:
+        """Whether every bot in the process connected to the same room shares one send_rate budget.
+
+        Defaults to False
+
+        :rtype: bool
+        """
+        return self._share_rate_limit
+
+    @property
+    def reconnect(self) -> bool:
+        """Whether the bot's client reconnects by itself when the connection drops. If not, the
+        whole bot exits and is left to its supervisor.
+
+        Defaults to True
+
+        :rtype: bool
+        """
+        return self._reconnect
+
+    @property
+    def reconnect_delay(self) -> float:
+        """Seconds to wait before the first reconnect attempt, doubling after every failed one.
+
+        Defaults to 1.0
+
+        :rtype: float
+        """
+        return self._reconnect_delay
+
+    @property
+    def reconnect_max_delay(self) -> float:
+        """The longest to wait between reconnect attempts, in seconds.
+
+        Defaults to 60.0
+
+        :rtype: float
+        """
+        return self._reconnect_max_delay
+
+    @property
+    def listener_capacity(self) -> Optional[int]:
+        """How many packets may wait for each service before its overload policy kicks in.
+
+        Defaults to None, which leaves the queues unbounded so nothing is ever dropped
+
+        :rtype: int
+        """
+        return self._listener_capacity
+
+    @property
+    def listener_policy(self) -> str:
+        """What to do with packets for a service that is listener_capacity packets behind. One of
+        'block', 'drop_oldest', 'drop_newest' or 'coalesce', see :py:class:`euphoria.Subscription`.
+
+        Defaults to "drop_oldest"
+
+        :rtype: str
+        """
+        return self._listener_policy
+
+    @property
+    def metrics_port(self) -> Optional[int]:
+        """A port to serve Prometheus text-format metrics on, see :py:mod:`euphoria.metrics`.
+
+        Defaults to None, which serves nothing
+
+        :rtype: int
+        """
+        return self._metrics_port
+
+    @property
+    def metrics_host(self) -> str:
+        """The interface to serve metrics on.
+
+        Defaults to "127.0.0.1"
+
+        :rtype: str
+        """
+        return self._metrics_host
+
     @property
     def services_max_restarts(self) -> int:
         return self._services_max_restarts
@@ -146,11 +334,34 @@ class Bot(Agent):
     def __init__(self, config: BotConfig, loop: AbstractEventLoop = None):
         super(Bot, self).__init__(loop=loop)
         self._config = config
-        self._client = Client(config.room, config.uri_format, handle_pings=True, loop=loop)
+        if config.session_view_pool_size and get_session_view_pool() is None:
+            set_session_view_pool(SessionViewPool(config.session_view_pool_size))
+        if not config.send_rate:
+            rate_limiter = None
+        elif config.share_rate_limit:
+            rate_limiter = shared_rate_limiter(config.room, config.send_rate, config.send_burst)
+        else:
+            rate_limiter = RateLimiter(config.send_rate, config.send_burst)
+        self._client = Client(config.room, config.uri_format, handle_pings=True,
+                              lazy_decoding=config.lazy_decoding, json_codec=config.json_codec,
+                              capture_file=config.capture_file, reply_timeout=config.reply_timeout,
+                              rate_limiter=rate_limiter, reconnect=config.reconnect,
+                              reconnect_delay=config.reconnect_delay,
+                              reconnect_max_delay=config.reconnect_max_delay, loop=loop)
         self._nick_and_auth = NickAndAuth(self._client, config.nick, config.passcode)
+        self._room_state = RoomState(self._client, loop=loop)
+        self._message_cache = None
+        if config.message_cache_size:
+            self._message_cache = MessageCache(self._client, config.message_cache_size, loop=loop)
+        self._commands = CommandRouter(self)
+        self._client.add_listener(self._commands, ['send-event'])
         self._service_supervisor = SupervisorOneForOne(max_restarts=config.services_max_restarts,
                                                        period=config.services_max_restarts_period, loop=loop)
         self._start_time = datetime.datetime.now()
+        self._metrics_server = None
+        if config.metrics_port is not None:
+            self._metrics_server = start_metrics_server(lambda: render_metrics({self._config.nick: self}),
+                                                        config.metrics_port, config.metrics_host, loop=loop)
 
         for short_name, config in config.services.items():
             mod = importlib.import_module(config["module"])
@@ -158,6 +369,9 @@ class Bot(Agent):
 
         self.bidirectional_link(self._client)
         self.bidirectional_link(self._nick_and_auth)
+        self.bidirectional_link(self._room_state)
+        if self._message_cache is not None:
+            self.bidirectional_link(self._message_cache)
         self.bidirectional_link(self._service_supervisor)
 
         self._client.connect()
@@ -169,6 +383,44 @@ class Bot(Agent):
         :rtype: euphoria.BotConfig"""
         return self._config
 
+    @property
+    def client(self) -> Client:
+        return self._client
+
+    @property
+    def room_state(self) -> RoomState:
+        """Who is in the room, kept up to date as people join, leave and change nicks.
+
+        :rtype: euphoria.RoomState"""
+        return self._room_state
+
+    @property
+    def message_cache(self) -> Optional[MessageCache]:
+        """The recent messages, or None if message_cache_size is 0.
+
+        :rtype: euphoria.MessageCache"""
+        return self._message_cache
+
+    @property
+    def service_supervisor(self) -> SupervisorOneForOne:
+        return self._service_supervisor
+
+    def mailbox_depths(self) -> dict:
+        """Returns how many messages are waiting in the mailbox of the bot, its client, its nick
+        and auth and room state machines, its message cache, and each of its services.
+
+        :rtype: dict"""
+        depths = {'bot': self.mailbox_depth,
+                  'client': self._client.mailbox_depth,
+                  'nick_and_auth': self._nick_and_auth.mailbox_depth,
+                  'room_state': self._room_state.mailbox_depth,
+                  'services': self._service_supervisor.mailbox_depth}
+        if self._message_cache is not None:
+            depths['message_cache'] = self._message_cache.mailbox_depth
+        for name, service in self._service_supervisor.children.items():
+            depths[name] = service.mailbox_depth
+        return depths
+
     @property
     def start_time(self) -> datetime.date:
         """Returns the time that the Bot was started.
@@ -192,26 +444,78 @@ class Bot(Agent):
     def connected(self) -> bool:
         return self._client.connected
 
+    @property
+    def joined(self) -> bool:
+        return self._client.joined
+
     @property
     def authorized(self) -> bool:
         return self._nick_and_auth.authorized
 
-    @tiny_agent.call
+    @tiny_agent.call(timeout=NICK_AND_AUTH_TIMEOUT)
     async def set_desired_nick(self, new_nick: str) -> Optional[str]:
         return await self._nick_and_auth.set_desired_nick(new_nick)
 
-    @tiny_agent.call
+    @tiny_agent.call(timeout=NICK_AND_AUTH_TIMEOUT)
     async def set_passcode(self, new_passcode: str) -> Optional[str]:
         return await self._nick_and_auth.set_passcode(new_passcode)
 
+    def stats(self) -> dict:
+        """Returns the latency histograms and counters of the bot's client, see :py:meth:`euphoria.Client.stats`.
+
+        :rtype: dict"""
+        return self._client.stats()
+
     def send_content(self, content: str, parent: Optional[str] = None) -> Future:
         return self._client.send_content(content, parent)
 
     def send_get_message(self, id_: str) -> Future:
         return self._client.send_get_message(id_)
 
-    def add_listener(self, listener: Agent):
-        self._client.add_listener(listener)
+    async def get_message(self, id_: str) -> Message:
+        """Returns the message with this id, from the message cache if it's there and otherwise from the server.
+
+        :raises euphoria.ErrorResponse: if the server couldn't find it
+        :rtype: euphoria.Message"""
+        if self._message_cache is not None:
+            return await self._message_cache.get_message(id_)
+        packet = await self._client.send_get_message(id_)
+        return packet.data
+
+    def exit(self, exc: Optional[Exception] = None):
+        super(Bot, self).exit(exc)
+        metrics_server = getattr(self, '_metrics_server', None)  # we might not have gotten that far in __init__
+        if metrics_server is not None:
+            metrics_server.close()
+
+    def add_listener(self, listener: Agent, types: Optional[Iterable[str]] = None,
+                     capacity: Optional[int] = _FROM_CONFIG, policy: Optional[str] = None):
+        """Registers a listener with the bot's client, bounded by listener_capacity and listener_policy
+        from the config unless capacity or policy are given. Passing capacity=None leaves this
+        listener unbounded whatever the config says."""
+        self._client.add_listener(listener, types,
+                                  capacity=self._config.listener_capacity if capacity is _FROM_CONFIG else capacity,
+                                  policy=self._config.listener_policy if policy is None else policy)
+
+    def subscription(self, listener: Agent, method: str = 'on_packet') -> Optional[Subscription]:
+        return self._client.subscription(listener, method)
+
+    def add_command_listener(self, listener: Agent, commands: Iterable[str], capacity: Optional[int] = _FROM_CONFIG,
+                             policy: Optional[str] = None):
+        """Registers an agent to have its on_command method called with every :py:class:`euphoria.Command`
+        of the given names, like ['ping', 'uptime']. Messages are parsed once for all services, and
+        a service only hears about its own commands. Like add_listener, the commands wait in a
+        :py:class:`euphoria.Subscription` bounded by listener_capacity and listener_policy from the
+        config unless capacity or policy are given."""
+        capacity = self._config.listener_capacity if capacity is _FROM_CONFIG else capacity
+        if capacity is not None:
+            policy = self._config.listener_policy if policy is None else policy
+            listener = self._client.subscribe(listener, capacity, policy, method='on_command')
+        self._commands.add(listener, commands)
+
+    @property
+    def command_router(self) -> CommandRouter:
+        return self._commands
 
 
 def main():
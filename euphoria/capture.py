@@ -0,0 +1,139 @@
+# euphoria-py
+# Copyright (C) 2015  Emily A. Bellows
+#
+# This program is free software: you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation, either version 3 of the License, or
+# (at your option) any later version.
+#
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with this program.  If not, see <http://www.gnu.org/licenses/>.
+
+"""Recording inbound frames to a capture file, and replaying them through a Client.
+
+A capture file starts with an 8 byte magic string, followed by one record per
+frame: a little-endian float64 unix timestamp, a uint32 length, and that many
+bytes of UTF-8 frame. Files are only ever appended to."""
+
+import asyncio
+import os
+import struct
+import time
+from typing import Iterator, Tuple, Union
+
+from .exceptions import EuphoriaException
+
+__all__ = ['CaptureWriter', 'read_capture', 'replay_capture', 'BadCaptureFile']
+
+MAGIC = b"EUPHCAP1"
+_HEADER = struct.Struct("<dI")
+
+
+class BadCaptureFile(EuphoriaException):
+    """Raised when a file isn't a capture file, or is cut off in the middle of a record."""
+    pass
+
+
+class CaptureWriter:
+    """Appends frames to a capture file. Writes are buffered, so this is cheap enough to leave on.
+
+    :param str path: The file to append to, created if it doesn't exist
+    :param int buffer_size: How many bytes to buffer before writing to disk"""
+
+    def __init__(self, path: str, buffer_size: int = 1 << 16):
+        self._path = path
+        self._file = open(path, "ab", buffering=buffer_size)
+        if self._file.tell() == 0:
+            self._file.write(MAGIC)
+        self._pack = _HEADER.pack
+        self._frames = 0
+
+    def __repr__(self):
+        return "<euphoria.CaptureWriter path='{0}'>".format(self._path)
+
+    @property
+    def path(self) -> str:
+        return self._path
+
+    @property
+    def frames(self) -> int:
+        """How many frames this writer has recorded.
+
+        :rtype: int"""
+        return self._frames
+
+    @property
+    def closed(self) -> bool:
+        return self._file.closed
+
+    def write(self, frame: Union[str, bytes], timestamp: float = None):
+        """Records one frame, stamped with the current time unless timestamp is given."""
+        if isinstance(frame, str):
+            frame = frame.encode('utf-8')
+        self._file.write(self._pack(time.time() if timestamp is None else timestamp, len(frame)))
+        self._file.write(frame)
+        self._frames += 1
+
+    def flush(self):
+        self._file.flush()
+
+    def close(self):
+        self._file.close()
+
+
+def read_capture(path: str) -> Iterator[Tuple[float, bytes]]:
+    """Yields (timestamp, frame) for every record in a capture file.
+
+    :raises euphoria.BadCaptureFile: if the file isn't a capture or is truncated"""
+    header_size = _HEADER.size
+    unpack = _HEADER.unpack
+    with open(path, "rb") as f:
+        if f.read(len(MAGIC)) != MAGIC:
+            raise BadCaptureFile("{0} is not a capture file".format(path))
+        while True:
+            header = f.read(header_size)
+            if not header:
+                return
+            if len(header) < header_size:
+                raise BadCaptureFile("{0} ends in the middle of a record".format(path))
+            timestamp, length = unpack(header)
+            frame = f.read(length)
+            if len(frame) < length:
+                raise BadCaptureFile("{0} ends in the middle of a record".format(path))
+            yield timestamp, frame
+
+
+async def replay_capture(client, path: str, realtime: bool = False, speed: float = 1.0,
+                         yield_every: int = 100) -> int:
+    """Feeds every frame in a capture file through a :py:class:`euphoria.Client`, which decodes
+    them and dispatches them to its listeners just like frames from a socket.
+
+    :param client: The Client to feed, it doesn't need to be connected
+    :param str path: The capture file
+    :param bool realtime: If true, wait between frames as long as they were apart when recorded
+    :param float speed: With realtime, how many times faster than recorded to go
+    :param int yield_every: When not realtime, let other tasks run after this many frames
+    :returns: The number of frames replayed
+    :rtype: int"""
+    assert os.path.exists(path), "there has to be a capture to replay"
+    loop = client.loop or asyncio.get_event_loop()
+    count = 0
+    first_recorded = None
+    started = loop.time()
+    for timestamp, frame in read_capture(path):
+        if realtime:
+            if first_recorded is None:
+                first_recorded = timestamp
+            delay = started + (timestamp - first_recorded) / speed - loop.time()
+            if delay > 0:
+                await asyncio.sleep(delay, loop=loop)
+        elif count % yield_every == 0:
+            await asyncio.sleep(0, loop=loop)
+        client.feed(frame)
+        count += 1
+    return count
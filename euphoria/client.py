@@ -17,37 +17,304 @@
 """Contains the class that lets you connect to an euphoria server"""
 
 import asyncio
-import json
+import heapq
 import logging
+import random
+import time
 from asyncio import Future, AbstractEventLoop
-from typing import Tuple
+from collections import deque
+from typing import Tuple, Iterable, List, Optional, Union
 
 import websockets
 
 import tiny_agent
-from euphoria import Packet, PingEvent
+from euphoria import Packet, PingEvent, JsonCodec, get_codec, CaptureWriter, ReplyTimeout, Disconnected, RateLimiter, \
+    EuphoriaException, Message, SnapshotEvent, Histogram
 from tiny_agent import Agent
 
-__all__ = ['Client']
+__all__ = ['Client', 'Subscription', 'BLOCK', 'DROP_OLDEST', 'DROP_NEWEST', 'COALESCE']
 
 logger = logging.getLogger(__name__)
 
 EUPHORIA_URL = "wss://euphoria.io:443/room/{0}/ws"
 
+# What a Subscription does with a new packet when its listener is too far behind.
+BLOCK = 'block'  # stop reading from the socket until the listener catches up
+DROP_OLDEST = 'drop_oldest'  # throw away the longest waiting packet
+DROP_NEWEST = 'drop_newest'  # throw away the new packet
+COALESCE = 'coalesce'  # throw away a waiting packet of the same type, or else the oldest
+_POLICIES = (BLOCK, DROP_OLDEST, DROP_NEWEST, COALESCE)
+
+# Older releases of websockets return None from recv() on close and raise InvalidState from send(),
+# newer ones raise ConnectionClosed from both.
+_ConnectionClosed = getattr(websockets.exceptions, 'ConnectionClosed', websockets.exceptions.InvalidState)
+
+
+def _fail_reply(future: Future, exc: Exception):
+    # Plenty of callers send and never look at the reply, and a failure nobody reads would otherwise
+    # be logged as an error when the future is collected. Whoever does await it still gets exc.
+    future.set_exception(exc)
+    future.exception()
+    logger.debug("%s", exc)
+
+
+class _PendingReply:
+    __slots__ = ['id', 'future', 'type', 'deadline', 'sent']
+
+    def __init__(self, id_: str, future: Future, type_: str, deadline: float):
+        self.id = id_
+        self.future = future
+        self.type = type_
+        self.deadline = deadline
+        self.sent = None  # when the writer handed the command to the socket
+
+
+class Subscription:
+    """A bounded buffer of packets between a :py:class:`euphoria.Client` and one listener.
+
+    The listener is handed one packet at a time, the next only once it has finished
+    with the last, so at most capacity packets are ever waiting on it. A @tiny_agent.batch
+    on_packet is handed everything waiting instead, up to the listener's MAILBOX_BATCH.
+    When the buffer is full, policy decides what happens to the next packet.
+
+    :param listener: The agent whose on_packet method gets the packets, a @tiny_agent.send or @tiny_agent.batch method
+    :param int capacity: How many packets may wait for the listener
+    :param str policy: One of BLOCK, DROP_OLDEST, DROP_NEWEST or COALESCE
+    :param str method: The listener's method to hand things to, on_command when a
+        :py:class:`euphoria.CommandRouter` feeds it :py:class:`euphoria.Command` instead of packets"""
+
+    def __init__(self, listener: Agent, capacity: int, policy: str = DROP_OLDEST, method: str = 'on_packet',
+                 loop: AbstractEventLoop = None):
+        assert capacity > 0, "a subscription needs room for at least one packet"
+        assert policy in _POLICIES, "unknown overload policy {0}".format(policy)
+        bound = getattr(listener, method)
+        handler = getattr(bound, '__wrapped__', None)
+        assert handler is not None, "bounded listeners need an {0} decorated with tiny_agent.send or batch" \
+            .format(method)
+        self._listener = listener
+        self._method = method
+        self._handler = handler
+        self._batched = getattr(bound, 'batched', False)
+        self._capacity = capacity
+        self._policy = policy
+        self._loop = loop
+        self._buffer = deque()
+        self._ready = asyncio.Event(loop=loop)
+        self._has_room = asyncio.Event(loop=loop)
+        self._has_room.set()
+        self._max_depth = 0
+        self._delivered = 0
+        self._dropped = 0
+        self._overflowing = False  # dropping since the buffer was last empty
+
+    def __repr__(self):
+        return "<euphoria.Subscription listener={0} depth={1}/{2} policy={3}>".format(
+            self._listener, len(self._buffer), self._capacity, self._policy)
+
+    @property
+    def listener(self) -> Agent:
+        return self._listener
+
+    @property
+    def method(self) -> str:
+        return self._method
+
+    @property
+    def capacity(self) -> int:
+        return self._capacity
+
+    @property
+    def policy(self) -> str:
+        return self._policy
+
+    @property
+    def alive(self) -> bool:
+        return self._listener.alive
+
+    @property
+    def depth(self) -> int:
+        """How many packets are waiting for the listener.
+
+        :rtype: int"""
+        return len(self._buffer)
+
+    @property
+    def max_depth(self) -> int:
+        """The most packets that have ever been waiting for the listener at once.
+
+        :rtype: int"""
+        return self._max_depth
+
+    @property
+    def delivered(self) -> int:
+        """How many packets the listener has finished handling.
+
+        :rtype: int"""
+        return self._delivered
+
+    @property
+    def dropped(self) -> int:
+        """How many packets were thrown away because the listener was too far behind.
+
+        :rtype: int"""
+        return self._dropped
+
+    @property
+    def full(self) -> bool:
+        return len(self._buffer) >= self._capacity
+
+    def on_packet(self, packet: Packet):
+        buffer = self._buffer
+        if len(buffer) >= self._capacity:
+            policy = self._policy
+            if policy == DROP_NEWEST:
+                self._drop()
+                return
+            elif policy == DROP_OLDEST:
+                buffer.popleft()
+                self._drop()
+            elif policy == COALESCE:
+                type_ = packet.type
+                for i, waiting in enumerate(buffer):
+                    if waiting.type == type_:
+                        del buffer[i]
+                        break
+                else:
+                    buffer.popleft()
+                self._drop()
+            # With BLOCK the packet goes in anyway, and the receive loop waits for room.
+        buffer.append(packet)
+        if len(buffer) > self._max_depth:
+            self._max_depth = len(buffer)
+        if len(buffer) >= self._capacity:
+            self._has_room.clear()
+        self._ready.set()
+
+    # A CommandRouter hands commands over the same way the Client hands over packets.
+    on_command = on_packet
+
+    def _drop(self):
+        # Warns once each time the listener falls behind, rather than once per packet.
+        self._dropped += 1
+        if not self._overflowing:
+            self._overflowing = True
+            logger.warning("%s is too far behind, dropping packets (%d dropped so far)", self, self._dropped)
+
+    def on_reconnected(self, missed: List[Message]):
+        method = getattr(self._listener, 'on_reconnected', None)
+        if method:
+            method(missed)
+
+    async def wait_for_room(self):
+        await self._has_room.wait()
+
+    async def pump(self):
+        # Hands packets to the listener one at a time until it exits.
+        loop = self._loop or asyncio.get_event_loop()
+        buffer = self._buffer
+        listener = self._listener
+        while listener.alive:
+            task = listener.task
+            if not buffer:
+                self._overflowing = False
+                self._ready.clear()
+                waiter = asyncio.ensure_future(self._ready.wait(), loop=loop)
+                try:
+                    await asyncio.wait([waiter, task], loop=loop, return_when=asyncio.FIRST_COMPLETED)
+                finally:
+                    waiter.cancel()
+                continue
+            if self._batched:
+                count = min(len(buffer), listener.MAILBOX_BATCH)
+                packets = [buffer.popleft() for _ in range(count)]
+            else:
+                count = 1
+                packets = buffer.popleft()
+            if len(buffer) < self._capacity:
+                self._has_room.set()
+            future = listener.post(self._handler, listener, packets)
+            await asyncio.wait([future, task], loop=loop, return_when=asyncio.FIRST_COMPLETED)
+            if future.done() and not future.cancelled() and future.exception() is None:
+                self._delivered += count
+        # Nobody is going to take these now, don't leave the receive loop waiting on us.
+        buffer.clear()
+        self._has_room.set()
+
 
 class Client(Agent):
+    # The writer sends at most this many frames before letting other tasks run.
+    OUTBOUND_BATCH = 64
+    # drain() returns once no more than this many frames are waiting to go out.
+    OUTBOUND_LOW_WATER = 256
+    # How many pages of 1000 messages to fetch at most when catching up after a reconnect.
+    RESUME_MAX_PAGES = 5
+
     @tiny_agent.init
     def __init__(self, room: str, uri_format: str = EUPHORIA_URL,
-                 handle_pings: bool = True, loop: AbstractEventLoop = None):
+                 handle_pings: bool = True, lazy_decoding: bool = False,
+                 json_codec: Union[str, JsonCodec] = 'auto', capture_file: Optional[str] = None,
+                 reply_timeout: float = 30.0, rate_limiter: Optional[RateLimiter] = None,
+                 reconnect: bool = False, reconnect_delay: float = 1.0, reconnect_max_delay: float = 60.0,
+                 loop: AbstractEventLoop = None):
         super(Client, self).__init__(loop=loop)
         self._next_msg_id = 0xBEEF  # just for fun
-        self._reply_map = {}
+        self._reply_map = {}  # id -> _PendingReply
+        self._reply_timeout = reply_timeout
+        # One heap of (deadline, id) and a single timer armed for the earliest
+        # deadline, instead of a timer per command.
+        self._deadlines = []
+        self._deadline_timer = None
+        self._deadline_timer_at = None
+        self._timed_out_replies = 0
+        self._orphaned_replies = 0
+        self._unexpected_replies = 0
         self._room = room
         self._uri = uri_format.format(room)
         self._handle_pings = handle_pings
+        self._lazy_decoding = lazy_decoding
+        self._codec = json_codec if isinstance(json_codec, JsonCodec) else get_codec(json_codec)
+        self._loads = self._codec.loads
+        self._dumps = self._codec.dumps
+        self._capture = CaptureWriter(capture_file) if capture_file else None
+        self._rate_limiter = rate_limiter
+        self._throttled_replies = 0
+        self._reconnect = reconnect
+        self._reconnect_delay = reconnect_delay
+        self._reconnect_max_delay = reconnect_max_delay
+        self._reconnects = 0
+        self._joined = False
+        self._last_message_id = None
+        self._resuming = False
+        self._resume_after = None
         self._sock = None
+        self._connecting = False
+        self._closing = None  # the close of a dropped socket, left to finish in the background
         self._receiver = None
-        self._listeners = set()
+        self._writer = None
+        self._outbound = deque()
+        self._control = deque()
+        self._outbound_ready = asyncio.Event(loop=loop)
+        self._drained = asyncio.Event(loop=loop)
+        self._drained.set()
+        self._max_outbound_depth = 0
+        self._frames_sent = 0
+        self._batches_sent = 0
+        self._send_wait_time = 0.0
+        self._ping_replies_sent = 0
+        self._ping_turnaround_total = 0.0
+        self._ping_turnaround_max = 0.0
+        self._latencies = {}  # command type -> Histogram of seconds from sending to the reply
+        self._packets_in = {}  # packet type -> count
+        self._packets_out = {}  # command type -> count
+        self._bytes_in = 0
+        self._bytes_out = 0
+        self._decode_time = 0.0
+        self._ping_intervals = Histogram()
+        self._last_ping_at = None
+        self._subscriptions = {}  # (listener, method) -> Subscription, for bounded listeners
+        self._blocking = []  # Subscriptions with the BLOCK policy
+        self._listeners = set()  # listeners that want every packet
+        self._listeners_by_type = {}  # packet type -> set of listeners that only want those
 
     def __repr__(self):
         fmt = "<euphoria.Client room='{0}' uri='{1}'>"
@@ -65,129 +332,713 @@ class Client(Agent):
     def handle_pings(self) -> bool:
         return self._handle_pings
 
+    @property
+    def lazy_decoding(self) -> bool:
+        return self._lazy_decoding
+
+    @property
+    def json_codec(self) -> JsonCodec:
+        return self._codec
+
+    @property
+    def capture(self) -> Optional[CaptureWriter]:
+        return self._capture
+
+    @property
+    def rate_limiter(self) -> Optional[RateLimiter]:
+        """The limiter ordinary outbound commands wait on, or None if they go out as fast as they can.
+
+        :rtype: euphoria.RateLimiter"""
+        return self._rate_limiter
+
+    @property
+    def throttled_replies(self) -> int:
+        """How many replies the server has marked as throttled.
+
+        :rtype: int"""
+        return self._throttled_replies
+
+    @property
+    def reply_timeout(self) -> float:
+        return self._reply_timeout
+
+    @property
+    def pending_replies(self) -> int:
+        """How many commands are waiting on a reply.
+
+        :rtype: int"""
+        return len(self._reply_map)
+
+    @property
+    def timed_out_replies(self) -> int:
+        """How many commands never got a reply before their deadline.
+
+        :rtype: int"""
+        return self._timed_out_replies
+
+    @property
+    def orphaned_replies(self) -> int:
+        """How many commands were still waiting on a reply when the connection closed, or were
+        never sent because we weren't connected.
+
+        :rtype: int"""
+        return self._orphaned_replies
+
+    @property
+    def unexpected_replies(self) -> int:
+        """How many replies arrived that nothing was waiting for, usually because they came too late.
+
+        :rtype: int"""
+        return self._unexpected_replies
+
+    @property
+    def outbound_queue_depth(self) -> int:
+        """How many frames are waiting for the writer.
+
+        :rtype: int"""
+        return len(self._outbound)
+
+    @property
+    def max_outbound_queue_depth(self) -> int:
+        """The most frames that have ever been waiting for the writer at once.
+
+        :rtype: int"""
+        return self._max_outbound_depth
+
+    @property
+    def frames_sent(self) -> int:
+        return self._frames_sent
+
+    @property
+    def batches_sent(self) -> int:
+        """How many times the writer woke up and sent something.
+
+        :rtype: int"""
+        return self._batches_sent
+
+    @property
+    def send_wait_time(self) -> float:
+        """Total seconds the writer has spent waiting on the socket to take frames.
+
+        :rtype: float"""
+        return self._send_wait_time
+
+    @property
+    def ping_replies_sent(self) -> int:
+        """How many ping-events the Client has answered by itself.
+
+        :rtype: int"""
+        return self._ping_replies_sent
+
+    @property
+    def ping_turnaround_mean(self) -> float:
+        """Average seconds from receiving a ping-event to our ping-reply being handed to the socket.
+
+        :rtype: float"""
+        if not self._ping_replies_sent:
+            return 0.0
+        return self._ping_turnaround_total / self._ping_replies_sent
+
+    @property
+    def ping_turnaround_max(self) -> float:
+        """The longest any ping-reply took from receiving its ping-event to being sent, in seconds.
+
+        :rtype: float"""
+        return self._ping_turnaround_max
+
+    @property
+    def packets_in(self) -> dict:
+        """How many packets of each type have come in.
+
+        :rtype: dict"""
+        return self._packets_in
+
+    @property
+    def packets_out(self) -> dict:
+        """How many commands of each type have been sent.
+
+        :rtype: dict"""
+        return self._packets_out
+
+    @property
+    def bytes_in(self) -> int:
+        """The total length of every frame that has come in.
+
+        :rtype: int"""
+        return self._bytes_in
+
+    @property
+    def bytes_out(self) -> int:
+        """The total length of every frame the writer has sent.
+
+        :rtype: int"""
+        return self._bytes_out
+
+    @property
+    def decode_time(self) -> float:
+        """Total seconds spent decoding incoming frames into packets.
+
+        :rtype: float"""
+        return self._decode_time
+
+    @property
+    def latencies(self) -> dict:
+        """The reply latency histograms, keyed by command type.
+
+        :rtype: dict"""
+        return self._latencies
+
+    def latency(self, type_: str) -> Optional[Histogram]:
+        """Returns the histogram of seconds between sending a command of the given type, like 'send',
+        and getting its reply, or None if no such command has been answered yet.
+
+        :rtype: euphoria.Histogram"""
+        return self._latencies.get(type_)
+
+    @property
+    def ping_intervals(self) -> Histogram:
+        """A histogram of the seconds between ping-events arriving. The server sends them on a steady
+        schedule, so a spread here means either the server or our event loop is running late.
+
+        :rtype: euphoria.Histogram"""
+        return self._ping_intervals
+
+    def stats(self) -> dict:
+        """Returns the Client's latency histograms and counters as plain data, for exporting.
+
+        :rtype: dict"""
+        return {'room': self._room,
+                'latency': {type_: histogram.summary() for type_, histogram in self._latencies.items()},
+                'ping_interval': self._ping_intervals.summary(),
+                'ping_turnaround': {'count': self._ping_replies_sent,
+                                    'mean': self.ping_turnaround_mean,
+                                    'max': self._ping_turnaround_max},
+                'packets_in': dict(self._packets_in),
+                'packets_out': dict(self._packets_out),
+                'bytes_in': self._bytes_in,
+                'bytes_out': self._bytes_out,
+                'decode_seconds': self._decode_time,
+                'frames_sent': self._frames_sent,
+                'pending_replies': len(self._reply_map),
+                'outbound_queue_depth': len(self._outbound),
+                'timed_out_replies': self._timed_out_replies,
+                'orphaned_replies': self._orphaned_replies,
+                'throttled_replies': self._throttled_replies,
+                'dropped_packets': self.dropped_packets,
+                'reconnects': self._reconnects}
+
+    @property
+    def reconnect(self) -> bool:
+        """Whether the Client reconnects by itself when the connection drops, instead of exiting.
+
+        :rtype: bool"""
+        return self._reconnect
+
+    @property
+    def reconnects(self) -> int:
+        """How many times the Client has reconnected after losing its connection.
+
+        :rtype: int"""
+        return self._reconnects
+
     @property
     def connected(self) -> bool:
         return self._sock and self._sock.open
 
+    @property
+    def joined(self) -> bool:
+        """Whether the server has sent us a snapshot-event since we last connected, which is when
+        it starts taking our messages.
+
+        :rtype: bool"""
+        return self._joined
+
     @tiny_agent.send
     async def connect(self):
         assert self.alive, "we better be alive to be connected"
         assert not self.connected, "make sure we don't get connected twice ever"
-        self._sock = await websockets.connect(self._uri)
+        if self._reconnect:
+            self._receiver = self.spawn_linked_task(self._reconnect_loop(), unlink_on_success=False)
+        else:
+            await self._open()
+            self._receiver = self.spawn_linked_task(self._receive_loop(), unlink_on_success=False)
+        self._writer = self.spawn_linked_task(self._write_loop(), unlink_on_success=False)
 
-        async def receive_loop():
-            try:
-                while self.alive:
+    async def _open(self):
+        self._connecting = True
+        try:
+            self._sock = await websockets.connect(self._uri)
+        finally:
+            self._connecting = False
+
+    async def _receive_loop(self):
+        try:
+            while self.alive:
+                try:
                     msg = await self._sock.recv()
-                    if msg is None:
-                        return
-                    logger.debug("%s got message %s", self, msg)
-                    packet = Packet(json.loads(msg))
-
-                    if packet.is_type(PingEvent) and self._handle_pings:
-                        self.send_ping_reply(packet.data.time)
-
-                    if packet.id is not None:
-                        # If the message has an ID that means its a response to a
-                        # message we sent, so we put it into the corresponding future.
-                        fut = self._take_reply_future(packet.id)
-                        if fut:
-                            fut.set_result(packet)
-
-                    to_remove = []
-                    for listener in self._listeners:
-                        if listener.alive:
-                            listener.on_packet(packet)
-                        else:
-                            to_remove.append(listener)
-                    for listener in to_remove:
-                        self._listeners.remove(listener)
-            finally:
+                except _ConnectionClosed:
+                    return
+                if msg is None:
+                    return
+                if self._capture is not None:
+                    self._capture.write(msg)
+                self.feed(msg)
+                for subscription in self._blocking:
+                    if subscription.full:
+                        await subscription.wait_for_room()
+        finally:
+            self._joined = False
+            self._fail_pending_replies()
+            self._outbound.clear()
+            self._control.clear()
+            self._drained.set()
+            if self._reconnect:
+                # Closing a dead socket can wait out a long timeout, don't hold up reconnecting for it.
+                self._closing = asyncio.ensure_future(self._sock.close(), loop=self._loop)
+                self._closing.add_done_callback(self._on_closed)
+            else:
                 await self._sock.close()
 
-        self._receiver = self.spawn_linked_task(receive_loop(), unlink_on_success=False)
+    def _on_closed(self, closing: Future):
+        # A socket that already dropped often fails to close cleanly, that's expected and not worth an error.
+        if not closing.cancelled() and closing.exception() is not None:
+            logger.debug("%s closing the old connection failed with %r", self, closing.exception())
+
+    async def _reconnect_loop(self):
+        # Keeps a connection up for as long as we're alive. After the first
+        # connection, the next snapshot-event kicks off _resume, which catches
+        # up on missed messages and tells the listeners we're back.
+        loop = self._loop or asyncio.get_event_loop()
+        attempt = 0
+        first = True
+        while self.alive:
+            if attempt:
+                delay = min(self._reconnect_max_delay, self._reconnect_delay * 2 ** (attempt - 1))
+                delay = random.uniform(delay / 2, delay)  # jitter, so a borg doesn't reconnect all at once
+                logger.info("%s connecting again in %.1f seconds", self, delay)
+                await asyncio.sleep(delay, loop=loop)
+            attempt += 1
+            try:
+                await self._open()
+            except (OSError, asyncio.TimeoutError, websockets.InvalidHandshake) as exc:
+                logger.info("%s couldn't connect because %s", self, exc)
+                continue
+            attempt = 1  # after a drop, wait the base delay before trying again
+            if not first:
+                self._reconnects += 1
+                self._resuming = True
+                logger.info("%s reconnected", self)
+            first = False
+            await self._receive_loop()
+            self._resume_after = self._last_message_id
+            logger.info("%s lost its connection", self)
+
+    async def _write_loop(self):
+        # Drains the outbound queues, several frames per wake up. Awaiting the
+        # socket's send is what pushes back on us when its buffer is full.
+        # Control frames are checked before every frame, so a ping-reply
+        # never waits behind more than the one frame being sent. Only ordinary
+        # frames wait on the rate limiter; they stay queued until it lets them go.
+        loop = self._loop or asyncio.get_event_loop()
+        outbound = self._outbound
+        control = self._control
+        limiter = self._rate_limiter
+        while self.alive:
+            if not outbound and not control:
+                self._outbound_ready.clear()
+                await self._outbound_ready.wait()
+                continue
+            self._batches_sent += 1
+            for _ in range(self.OUTBOUND_BATCH):
+                if control:
+                    packet, pending, received_at = control.popleft()
+                elif outbound:
+                    if limiter is not None:
+                        wait = limiter.try_acquire(loop.time())
+                        if wait:
+                            await self._wait_for_outbound(wait)
+                            break
+                    packet, pending, received_at = outbound.popleft()
+                else:
+                    break
+                if not self.connected:
+                    self._drop_unsent(packet, pending)
+                    continue
+                logger.debug("%s sending message %s", self, packet)
+                start = loop.time()
+                try:
+                    await self._sock.send(packet)
+                except _ConnectionClosed:
+                    # The receiver finds out about the drop on its own and cleans up after it.
+                    self._drop_unsent(packet, pending)
+                    continue
+                now = loop.time()
+                self._send_wait_time += now - start
+                self._frames_sent += 1
+                self._bytes_out += len(packet)
+                if pending is not None:
+                    pending.sent = now
+                if received_at is not None:
+                    turnaround = now - received_at
+                    self._ping_replies_sent += 1
+                    self._ping_turnaround_total += turnaround
+                    if turnaround > self._ping_turnaround_max:
+                        self._ping_turnaround_max = turnaround
+            if len(outbound) <= self.OUTBOUND_LOW_WATER:
+                self._drained.set()
+            if outbound or control:
+                await asyncio.sleep(0, loop=loop)
+
+    async def _wait_for_outbound(self, timeout: float):
+        # Sleeps for up to timeout seconds, waking early if anything new is queued.
+        self._outbound_ready.clear()
+        try:
+            await asyncio.wait_for(self._outbound_ready.wait(), timeout, loop=self._loop)
+        except asyncio.TimeoutError:
+            pass
+
+    async def drain(self):
+        """Waits until the outbound queue is down to OUTBOUND_LOW_WATER frames. Services
+        that send in bursts can await this to avoid piling up frames faster than the socket
+        takes them."""
+        while len(self._outbound) > self.OUTBOUND_LOW_WATER and self.alive:
+            self._drained.clear()
+            await self._drained.wait()
+
+    def feed(self, msg: Union[str, bytes]):
+        """Handles one frame as if it came in over the socket: decodes it, answers pings,
+        resolves reply futures and dispatches the packet to listeners.
+
+        This is what the receive loop runs on every frame, and what
+        :py:func:`euphoria.replay_capture` uses to replay recorded traffic."""
+        logger.debug("%s got message %s", self, msg)
+        start = time.perf_counter()
+        j = self._loads(msg)
+        packet = Packet(j, lazy=self._lazy_decoding)
+        type_ = packet.type
+        self._decode_time += time.perf_counter() - start
+        self._bytes_in += len(msg)
+        packets_in = self._packets_in
+        packets_in[type_] = packets_in.get(type_, 0) + 1
+
+        if type_ == 'snapshot-event':
+            self._joined = True
+
+        if self._reconnect:
+            # Remember the newest message we've seen, to know where to catch up from after a reconnect.
+            # It's read straight from the JSON so lazy packets stay undecoded.
+            if type_ == 'send-event':
+                self._last_message_id = j['data']['id']
+            elif type_ == 'snapshot-event':
+                log = j['data'].get('log')
+                if log:
+                    self._last_message_id = max(self._last_message_id or "", log[-1]['id'])
+                if self._resuming:
+                    self._resuming = False
+                    self.spawn_linked_task(self._resume(packet.data, self._resume_after))
+
+        if packet.is_type(PingEvent):
+            now = (self._loop or asyncio.get_event_loop()).time()
+            if self._last_ping_at is not None:
+                self._ping_intervals.record(now - self._last_ping_at)
+            self._last_ping_at = now
+            if self._handle_pings:
+                self._send_ping_reply(packet.data.time, now)
+
+        if packet.throttled:
+            self._throttled_replies += 1
+            if self._rate_limiter is not None:
+                self._rate_limiter.throttled((self._loop or asyncio.get_event_loop()).time())
+
+        if packet.id is not None:
+            # If the message has an ID that means its a response to a
+            # message we sent, so we put it into the corresponding future.
+            fut = self._take_reply_future(packet.id)
+            if fut and not fut.done():
+                fut.set_result(packet)
+
+        self._dispatch(self._listeners, packet)
+        typed_listeners = self._listeners_by_type.get(type_)
+        if typed_listeners:
+            self._dispatch(typed_listeners, packet)
+
+    async def _resume(self, snapshot: SnapshotEvent, since: Optional[str]):
+        # The snapshot holds the last hundred or so messages. If all of them
+        # are new to us there may be a gap before them, so page back through
+        # the log until we reach the last message we saw.
+        missed = [m for m in snapshot.log if since is not None and m.id > since]
+        if missed and len(missed) == len(snapshot.log):
+            before = missed[0].id
+            for _ in range(self.RESUME_MAX_PAGES):
+                try:
+                    packet = await self.send_log_command(before, n=1000)
+                except EuphoriaException as exc:
+                    logger.info("%s couldn't fetch missed messages because %s", self, exc)
+                    break
+                if packet.error:
+                    logger.info("%s couldn't fetch missed messages because %s", self, packet.error)
+                    break
+                log = packet.log_reply.log
+                older = [m for m in log if m.id > since]
+                missed = older + missed
+                if not log or len(older) < len(log):
+                    break
+                before = log[0].id
+        logger.info("%s caught up on %d missed messages", self, len(missed))
+        self._notify_reconnected(missed)
+
+    def _notify_reconnected(self, missed: List[Message]):
+        listeners = set(self._listeners)
+        for typed_listeners in self._listeners_by_type.values():
+            listeners.update(typed_listeners)
+        for listener in listeners:
+            if not listener.alive:
+                continue
+            method = getattr(listener, 'on_reconnected', None)
+            if method:
+                method(missed)
 
-    def add_listener(self, listener: Agent):
-        self._listeners.add(listener)
+    def add_listener(self, listener: Agent, types: Optional[Iterable[str]] = None, capacity: Optional[int] = None,
+                     policy: str = DROP_OLDEST):
+        """Registers an agent to have its on_packet method called with incoming packets.
 
-    def _next_id_and_future(self) -> Tuple[str, Future]:
+        :param listener: The agent to send packets to
+        :param types: The packet types the listener wants, like 'send-event'. If None then
+            the listener receives every packet.
+        :param int capacity: If given, at most this many packets wait for the listener, see
+            :py:class:`euphoria.Subscription`. If None, packets go straight into its mailbox.
+        :param str policy: What to do with packets once capacity are waiting
+
+        If the Client reconnects by itself, listeners with an on_reconnected method get it called
+        once per reconnect, with the list of :py:class:`euphoria.Message` sent while we were away."""
+        if capacity is not None:
+            listener = self.subscribe(listener, capacity, policy)
+        if types is None:
+            self._listeners.add(listener)
+        else:
+            for type_ in types:
+                self._listeners_by_type.setdefault(type_, set()).add(listener)
+
+    def subscribe(self, listener: Agent, capacity: int, policy: str = DROP_OLDEST,
+                  method: str = 'on_packet') -> Subscription:
+        """Starts a :py:class:`euphoria.Subscription` feeding the given method of a listener, pumped for as
+        long as both we and the listener are alive. With BLOCK, the receive loop waits for it to have room.
+        add_listener uses this for bounded listeners, and :py:class:`euphoria.Bot` for bounded command handlers.
+
+        :rtype: euphoria.Subscription"""
+        subscription = Subscription(listener, capacity, policy, method, loop=self._loop)
+        self._subscriptions[(listener, method)] = subscription
+        if policy == BLOCK:
+            self._blocking.append(subscription)
+        self.spawn_linked_task(self._run_subscription(subscription))
+        return subscription
+
+    async def _run_subscription(self, subscription: Subscription):
+        try:
+            await subscription.pump()
+        finally:
+            key = (subscription.listener, subscription.method)
+            if self._subscriptions.get(key) is subscription:
+                del self._subscriptions[key]
+            if subscription in self._blocking:
+                self._blocking.remove(subscription)
+
+    def subscription(self, listener: Agent, method: str = 'on_packet') -> Optional[Subscription]:
+        """Returns the Subscription feeding a listener added with a capacity, or None.
+
+        :rtype: euphoria.Subscription"""
+        return self._subscriptions.get((listener, method))
+
+    @property
+    def dropped_packets(self) -> int:
+        """How many packets have been dropped across every bounded listener still subscribed.
+
+        :rtype: int"""
+        return sum(subscription.dropped for subscription in self._subscriptions.values())
+
+    @staticmethod
+    def _dispatch(listeners: set, packet: Packet):
+        to_remove = []
+        for listener in listeners:
+            if listener.alive:
+                listener.on_packet(packet)
+            else:
+                to_remove.append(listener)
+        for listener in to_remove:
+            listeners.remove(listener)
+
+    def exit(self, exc: Optional[Exception] = None):
+        super(Client, self).exit(exc)
+        self._fail_pending_replies()
+        if self._capture is not None:
+            self._capture.close()
+
+    def _next_id_and_future(self, type_: str, timeout: Optional[float] = None) -> Tuple[str, Future]:
         # Generate a new ID to put into a message we are about to send, and
         # a corresponding future to receive the eventual reply from the server.
+        self._next_msg_id += 1
         id_ = str(self._next_msg_id)
-        future = asyncio.Future()
-        self._reply_map[id_] = future
+        loop = self._loop or asyncio.get_event_loop()
+        future = Future(loop=loop)
+        deadline = loop.time() + (self._reply_timeout if timeout is None else timeout)
+        self._reply_map[id_] = _PendingReply(id_, future, type_, deadline)
+        heapq.heappush(self._deadlines, (deadline, id_))
+        if self._deadline_timer_at is None or deadline < self._deadline_timer_at:
+            self._arm_deadline_timer(loop, deadline)
         return id_, future
 
-    def _take_reply_future(self, id_: str) -> Future:
+    def _take_reply_future(self, id_: str) -> Optional[Future]:
         # If there is a future for this ID, then we retrieve it and remove it
-        # from the map. (There will only be one response per ID.)
-        if id_ in self._reply_map:
-            future = self._reply_map[id_]
-            del self._reply_map[id_]
-            return future
+        # from the map. (There will only be one response per ID.) Its entry in
+        # the deadline heap is skipped over when it comes up.
+        pending = self._reply_map.pop(id_, None)
+        if pending is None:
+            self._unexpected_replies += 1
+            return None
+        if pending.sent is not None:
+            histogram = self._latencies.get(pending.type)
+            if histogram is None:
+                histogram = self._latencies[pending.type] = Histogram()
+            histogram.record((self._loop or asyncio.get_event_loop()).time() - pending.sent)
+        return pending.future
 
-    @tiny_agent.send
-    async def _send_packet(self, packet: str):
-        if self.connected:
-            logger.debug("%s sending message %s", self, packet)
-            await self._sock.send(packet)
+    def _arm_deadline_timer(self, loop: AbstractEventLoop, deadline: float):
+        if self._deadline_timer is not None:
+            self._deadline_timer.cancel()
+        self._deadline_timer = loop.call_at(deadline, self._expire_replies, loop)
+        self._deadline_timer_at = deadline
+
+    def _expire_replies(self, loop: AbstractEventLoop):
+        self._deadline_timer = None
+        self._deadline_timer_at = None
+        now = loop.time()
+        deadlines = self._deadlines
+        while deadlines and (deadlines[0][0] <= now or deadlines[0][1] not in self._reply_map):
+            deadline, id_ = heapq.heappop(deadlines)
+            pending = self._reply_map.pop(id_, None)
+            if pending is not None and not pending.future.done():
+                self._timed_out_replies += 1
+                _fail_reply(pending.future, ReplyTimeout("no reply to {0} command {1}".format(pending.type, id_)))
+        if deadlines:
+            self._arm_deadline_timer(loop, deadlines[0][0])
+
+    def _fail_pending_replies(self):
+        # Nothing we've sent will be answered now, so let everyone waiting know.
+        if self._deadline_timer is not None:
+            self._deadline_timer.cancel()
+            self._deadline_timer = None
+            self._deadline_timer_at = None
+        pending_replies = list(self._reply_map.items())
+        self._reply_map.clear()
+        self._deadlines = []
+        for id_, pending in pending_replies:
+            if not pending.future.done():
+                self._orphaned_replies += 1
+                _fail_reply(pending.future, Disconnected("lost connection before a reply to {0} command {1}"
+                                                         .format(pending.type, id_)))
 
-    def _send_msg_with_reply_type(self, type_: str, data: dict) -> Future:
+    def _send_packet(self, packet: str, pending: Optional[_PendingReply] = None):
+        # Queue the frame for the writer rather than going through our own
+        # mailbox, so sending doesn't wait behind unrelated work. The writer
+        # stamps pending with the time it went out, for the latency stats.
+        if not (self._connecting or self.connected) or not self.alive:
+            self._drop_unsent(packet, pending)
+            return
+        outbound = self._outbound
+        outbound.append((packet, pending, None))
+        if len(outbound) > self._max_outbound_depth:
+            self._max_outbound_depth = len(outbound)
+        self._outbound_ready.set()
+
+    def _send_control_packet(self, packet: str, pending: Optional[_PendingReply] = None,
+                             received_at: Optional[float] = None):
+        # Like _send_packet, but the writer sends these ahead of everything in
+        # the ordinary queue. received_at is when the ping-event we're
+        # answering arrived, for the turnaround stats.
+        if not (self._connecting or self.connected) or not self.alive:
+            self._drop_unsent(packet, pending)
+            return
+        self._control.append((packet, pending, received_at))
+        self._outbound_ready.set()
+
+    def _drop_unsent(self, packet: str, pending: Optional[_PendingReply]):
+        # A frame that never went out won't be answered, so fail its reply now rather than at its deadline.
+        logger.debug("%s dropping message %s, not connected", self, packet)
+        if pending is not None and self._reply_map.pop(pending.id, None) is not None and not pending.future.done():
+            self._orphaned_replies += 1
+            _fail_reply(pending.future, Disconnected("not connected, so {0} command {1} wasn't sent"
+                                                     .format(pending.type, pending.id)))
+
+    def _send_msg_with_reply_type(self, type_: str, data: dict, timeout: Optional[float] = None,
+                                  control: bool = False) -> Future:
         # A small helper to send messages that will be replied to by the
         # server.
-        id_, future = self._next_id_and_future()
-        j = json.dumps({"type": type_, "id": id_, "data": data})
-        self._send_packet(j)
+        id_, future = self._next_id_and_future(type_, timeout)
+        self._packets_out[type_] = self._packets_out.get(type_, 0) + 1
+        j = self._dumps({"type": type_, "id": id_, "data": data})
+        if control:
+            self._send_control_packet(j, self._reply_map[id_])
+        else:
+            self._send_packet(j, self._reply_map[id_])
         return future
 
     def _send_msg_no_reply(self, type_: str, data: dict) -> None:
         # A small helper to send a message that won't receive a reply from the
         # server.
-        j = json.dumps({"type": type_, "data": data})
+        self._packets_out[type_] = self._packets_out.get(type_, 0) + 1
+        j = self._dumps({"type": type_, "data": data})
         self._send_packet(j)
 
-    def send_nick(self, name: str) -> Future:
+    def send_nick(self, name: str, timeout: Optional[float] = None) -> Future:
         """Sends a nick command to the server.
 
         :param str name: The new nick you want this Client to have
+        :param float timeout: Seconds to wait for the reply, defaults to the Client's reply_timeout
         :returns: A future that will contain a :py:class:`euphoria.NickReply`
         :rtype: asyncio.Future"""
-        return self._send_msg_with_reply_type("nick", {"name": name})
+        return self._send_msg_with_reply_type("nick", {"name": name}, timeout)
 
     def send_ping_reply(self, time: int) -> None:
-        """Sends a ping reply to the server.
+        """Sends a ping reply to the server. It goes out ahead of anything else waiting to be sent.
 
         :param int time: The time you got passed in a PingEvent"""
-        self._send_msg_no_reply("ping-reply", {"time": time})
+        self._send_ping_reply(time, None)
+
+    def _send_ping_reply(self, time: int, received_at: Optional[float]):
+        self._packets_out["ping-reply"] = self._packets_out.get("ping-reply", 0) + 1
+        self._send_control_packet(self._dumps({"type": "ping-reply", "data": {"time": time}}), None, received_at)
 
-    def send_auth(self, passcode: str) -> Future:
+    def send_auth(self, passcode: str, timeout: Optional[float] = None) -> Future:
         """Sends an auth command to the server.
 
         :param str passcode: The password to the room the Client is connected to
+        :param float timeout: Seconds to wait for the reply, defaults to the Client's reply_timeout
         :returns: a future that will contain an :py:class:`euphoria.AuthReply`
         :rtype: asyncio.Future"""
         return self._send_msg_with_reply_type("auth",
                                               {"type": "passcode",
-                                               "passcode": passcode})
+                                               "passcode": passcode}, timeout, control=True)
 
-    def send_content(self, content: str, parent: str = None) -> Future:
+    def send_content(self, content: str, parent: str = None, timeout: Optional[float] = None) -> Future:
         """Sends a send command to the server.
 
         :param str content: The message you want this Client to say to the room
         :param str parent: The message ID you want to parent to
+        :param float timeout: Seconds to wait for the reply, defaults to the Client's reply_timeout
         :returns: A future that will contain a :py:class:`euphoria.SendReply`
         :rtype: asyncio.Future"""
         d = {"content": content}
         if parent:
             d["parent"] = parent
-        return self._send_msg_with_reply_type("send", d)
+        return self._send_msg_with_reply_type("send", d, timeout)
 
-    def send_log_command(self, before: str, n: int = 10) -> Future:
-        return self._send_msg_with_reply_type("log", {"before": before, "n": n})
+    def send_log_command(self, before: str, n: int = 10, timeout: Optional[float] = None) -> Future:
+        return self._send_msg_with_reply_type("log", {"before": before, "n": n}, timeout)
 
-    def send_get_message(self, id_: str) -> Future:
+    def send_get_message(self, id_: str, timeout: Optional[float] = None) -> Future:
         """Sends a get-message command to the server.
 
+        :param float timeout: Seconds to wait for the reply, defaults to the Client's reply_timeout
         :returns: A future that would contain a :py:class:`euphoria.GetMessageReply`
         :rtype: asyncio.Future"""
-        return self._send_msg_with_reply_type("get-message", {"id": id_})
+        return self._send_msg_with_reply_type("get-message", {"id": id_}, timeout)
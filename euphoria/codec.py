@@ -0,0 +1,115 @@
+# euphoria-py
+# Copyright (C) 2015  Emily A. Bellows
+#
+# This program is free software: you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation, either version 3 of the License, or
+# (at your option) any later version.
+#
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with this program.  If not, see <http://www.gnu.org/licenses/>.
+
+"""JSON codecs for the websocket wire format, using orjson or ujson when they're installed"""
+
+import json
+from typing import Any, Callable, Union
+
+try:
+    import orjson
+except ImportError:
+    orjson = None
+
+try:
+    import ujson
+except ImportError:
+    ujson = None
+
+__all__ = ['JsonCodec', 'get_codec', 'available_codecs']
+
+
+class JsonCodec:
+    """A pair of functions to turn frames into JSON values and back.
+
+    loads accepts both str and bytes frames, dumps always returns a str so it goes out as a text frame."""
+
+    __slots__ = ['_name', '_loads', '_dumps']
+
+    def __init__(self, name: str, loads: Callable[[Union[str, bytes]], Any], dumps: Callable[[Any], str]):
+        self._name = name
+        self._loads = loads
+        self._dumps = dumps
+
+    def __repr__(self):
+        return "<euphoria.JsonCodec name='{0}'>".format(self._name)
+
+    @property
+    def name(self) -> str:
+        """The name this codec can be looked up with in :py:func:`euphoria.get_codec`.
+
+        :rtype: str"""
+        return self._name
+
+    @property
+    def loads(self) -> Callable[[Union[str, bytes]], Any]:
+        """The function that parses a frame.
+
+        :rtype: function"""
+        return self._loads
+
+    @property
+    def dumps(self) -> Callable[[Any], str]:
+        """The function that serializes a command.
+
+        :rtype: function"""
+        return self._dumps
+
+
+def _json_loads(frame: Union[str, bytes]) -> Any:
+    # Python 3.5's json.loads won't take bytes.
+    if isinstance(frame, bytes):
+        frame = frame.decode('utf-8')
+    return json.loads(frame)
+
+
+def _json_dumps(obj: Any) -> str:
+    return json.dumps(obj, separators=(',', ':'))
+
+
+def _orjson_dumps(obj: Any) -> str:
+    return orjson.dumps(obj).decode('utf-8')
+
+
+_CODECS = {'json': JsonCodec('json', _json_loads, _json_dumps)}
+if orjson is not None:
+    _CODECS['orjson'] = JsonCodec('orjson', orjson.loads, _orjson_dumps)
+if ujson is not None:
+    _CODECS['ujson'] = JsonCodec('ujson', ujson.loads, ujson.dumps)
+
+_PREFERENCE = ['orjson', 'ujson', 'json']
+
+
+def available_codecs() -> list:
+    """Returns the names of the codecs that can be used in this interpreter, fastest first.
+
+    :rtype: list"""
+    return [name for name in _PREFERENCE if name in _CODECS]
+
+
+def get_codec(name: str = 'auto') -> JsonCodec:
+    """Looks up a codec by name.
+
+    :param str name: One of 'orjson', 'ujson', 'json', or 'auto' to pick the fastest one installed
+    :raises ValueError: if the codec is unknown or isn't installed
+    :rtype: euphoria.JsonCodec"""
+    if name == 'auto':
+        return _CODECS[available_codecs()[0]]
+    if name not in _CODECS:
+        if name in _PREFERENCE:
+            raise ValueError("the {0} JSON codec isn't installed".format(name))
+        raise ValueError("unknown JSON codec: {0}".format(name))
+    return _CODECS[name]
@@ -0,0 +1,219 @@
+# euphoria-py
+# Copyright (C) 2015  Emily A. Bellows
+#
+# This program is free software: you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation, either version 3 of the License, or
+# (at your option) any later version.
+#
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with this program.  If not, see <http://www.gnu.org/licenses/>.
+
+"""A columnar layout for batches of messages, for filtering and aggregating logs in bulk"""
+
+import re
+import sys
+from array import array
+from bisect import bisect_left
+from collections import Counter
+from typing import Iterable, List, Optional, Tuple
+
+__all__ = ['MessageColumns']
+
+# Ends each message in the content table. Contents may hold it too, so rows are only ever found by offset.
+_SEPARATOR = '\x00'
+
+
+class MessageColumns:
+    """A batch of messages stored as parallel columns instead of one object per message.
+
+    Ids, parents, sender ids and sender names are lists of strings, times are an
+    array of integers, and every message's content lives in one string table.
+    Row i of every column belongs to the same message."""
+
+    __slots__ = ['_ids', '_times', '_parents', '_sender_ids', '_sender_names', '_table', '_offsets']
+
+    def __init__(self, ids: List[str], times: array, parents: List[Optional[str]], sender_ids: List[str],
+                 sender_names: List[str], table: str, offsets: array):
+        self._ids = ids
+        self._times = times
+        self._parents = parents
+        self._sender_ids = sender_ids
+        self._sender_names = sender_names
+        self._table = table
+        self._offsets = offsets
+
+    @classmethod
+    def _build(cls, rows: Iterable[Tuple[str, int, Optional[str], str, str, str]]) -> 'MessageColumns':
+        ids = []
+        times = array('q')
+        parents = []
+        sender_ids = []
+        sender_names = []
+        contents = []
+        offsets = array('q', [0])
+        position = 0
+        intern = sys.intern
+        for id_, time, parent, sender_id, sender_name, content in rows:
+            ids.append(id_)
+            times.append(time)
+            parents.append(parent)
+            sender_ids.append(intern(sender_id))
+            sender_names.append(intern(sender_name))
+            contents.append(content)
+            position += len(content) + 1
+            offsets.append(position)
+        return cls(ids, times, parents, sender_ids, sender_names, _SEPARATOR.join(contents) + _SEPARATOR, offsets)
+
+    @classmethod
+    def from_json(cls, log: List[dict]) -> 'MessageColumns':
+        """Builds the columns straight from the JSON of a log, without making any Message objects.
+
+        :param list log: The JSON objects of the messages
+        :rtype: euphoria.MessageColumns"""
+        return cls._build((j['id'], j['time'], j.get('parent'), j['sender']['id'], j['sender']['name'], j['content'])
+                          for j in log)
+
+    @classmethod
+    def from_messages(cls, messages: Iterable) -> 'MessageColumns':
+        """Builds the columns out of :py:class:`euphoria.Message` like objects.
+
+        :rtype: euphoria.MessageColumns"""
+        return cls._build((m.id, m.time, m.parent, m.sender.id, m.sender.name, m.content) for m in messages)
+
+    def __len__(self):
+        return len(self._ids)
+
+    def __repr__(self):
+        return "<euphoria.MessageColumns messages={0}>".format(len(self))
+
+    @property
+    def ids(self) -> List[str]:
+        """The message ids.
+
+        :rtype: list"""
+        return self._ids
+
+    @property
+    def times(self) -> array:
+        """The unix timestamps of the messages, as an array of 64 bit integers.
+
+        :rtype: array.array"""
+        return self._times
+
+    @property
+    def parents(self) -> List[Optional[str]]:
+        """The parent message ids, None for top-level messages.
+
+        :rtype: list"""
+        return self._parents
+
+    @property
+    def sender_ids(self) -> List[str]:
+        """The agent or account ids of the senders.
+
+        :rtype: list"""
+        return self._sender_ids
+
+    @property
+    def sender_names(self) -> List[str]:
+        """The names the senders were using.
+
+        :rtype: list"""
+        return self._sender_names
+
+    def content(self, row: int) -> str:
+        """Returns the content of the message in the given row.
+
+        :rtype: str"""
+        return self._table[self._offsets[row]:self._offsets[row + 1] - 1]
+
+    def contents(self) -> List[str]:
+        """Returns the content of every message, in row order.
+
+        :rtype: list"""
+        table = self._table
+        offsets = self._offsets
+        return [table[offsets[row]:offsets[row + 1] - 1] for row in range(len(self._ids))]
+
+    def select(self, rows: Iterable[int]) -> 'MessageColumns':
+        """Returns new columns holding only the given rows, in the given order.
+
+        :rtype: euphoria.MessageColumns"""
+        return MessageColumns._build((self._ids[row], self._times[row], self._parents[row], self._sender_ids[row],
+                                      self._sender_names[row], self.content(row)) for row in rows)
+
+    def rows_by_time(self) -> List[int]:
+        """Returns the row numbers ordered from oldest to newest message.
+
+        :rtype: list"""
+        times = self._times
+        return sorted(range(len(times)), key=times.__getitem__)
+
+    def sorted_by_time(self) -> 'MessageColumns':
+        """Returns new columns ordered from oldest to newest message.
+
+        :rtype: euphoria.MessageColumns"""
+        return self.select(self.rows_by_time())
+
+    def rows_between(self, start: int, end: int) -> List[int]:
+        """Returns the rows of messages posted at or after start, and before end.
+
+        :rtype: list"""
+        return [row for row, time in enumerate(self._times) if start <= time < end]
+
+    def rows_from(self, sender_id: str) -> List[int]:
+        """Returns the rows of messages sent by the given agent or account id.
+
+        :rtype: list"""
+        return [row for row, id_ in enumerate(self._sender_ids) if id_ == sender_id]
+
+    def rows_replying_to(self, parent: str) -> List[int]:
+        """Returns the rows of messages whose parent is the given message id.
+
+        :rtype: list"""
+        return [row for row, id_ in enumerate(self._parents) if id_ == parent]
+
+    def rows_matching(self, pattern: str, flags: int = 0) -> List[int]:
+        """Returns the rows whose content matches the regular expression, searched one message at a
+        time so anchors like ^ and $ mean the start and end of the message.
+
+        :rtype: list"""
+        search = re.compile(pattern, flags).search
+        table = self._table
+        offsets = self._offsets
+        # Searching a slice rather than the table between two positions, ^ only matches at the real start.
+        return [row for row in range(len(self._ids)) if search(table[offsets[row]:offsets[row + 1] - 1])]
+
+    def row_of(self, id_: str) -> Optional[int]:
+        """Returns the row of the given message id, or None. Expects ids in ascending order,
+        which is how the server sends logs.
+
+        :rtype: int"""
+        row = bisect_left(self._ids, id_)
+        if row < len(self._ids) and self._ids[row] == id_:
+            return row
+        return None
+
+    def count_by_sender(self) -> Counter:
+        """Counts the messages per sender id.
+
+        :rtype: collections.Counter"""
+        return Counter(self._sender_ids)
+
+    def to_numpy(self) -> dict:
+        """Returns the columns as NumPy arrays, keyed by column name. Needs NumPy installed.
+
+        :rtype: dict"""
+        import numpy
+        return {'ids': numpy.array(self._ids),
+                'times': numpy.frombuffer(self._times, dtype=numpy.int64),
+                'parents': numpy.array(self._parents, dtype=object),
+                'sender_ids': numpy.array(self._sender_ids),
+                'sender_names': numpy.array(self._sender_names),
+                'contents': numpy.array(self.contents(), dtype=object)}
@@ -0,0 +1,137 @@
+# euphoria-py
+# Copyright (C) 2015  Emily A. Bellows
+#
+# This program is free software: you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation, either version 3 of the License, or
+# (at your option) any later version.
+#
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with this program.  If not, see <http://www.gnu.org/licenses/>.
+
+"""Routing '!command @nick args' messages to the services that handle them, parsing each message once"""
+
+import re
+from typing import Iterable, List, Optional
+
+from euphoria import Packet, SendEvent
+from tiny_agent import Agent
+
+__all__ = ['Command', 'CommandRouter']
+
+# The command word, then an optional @mention, then whatever is left.
+_COMMAND_RE = re.compile(r"!(\S+)(?:\s+@(\S+))?(?:\s+(.*))?\Z", re.DOTALL)
+
+
+class Command:
+    """A message like '!ping @bot' or '!remind 15m eat food', split into its parts.
+
+    :param str name: The word after the '!', like 'ping'
+    :param target: The nick of an @mention right after the name, without the '@', or None
+    :param str args: Everything after the name and mention, or an empty string
+    :param send_event: The message the command came in"""
+
+    __slots__ = ['name', 'target', 'args', 'send_event']
+
+    def __init__(self, name: str, target: Optional[str], args: str, send_event: SendEvent):
+        self.name = name
+        self.target = target
+        self.args = args
+        self.send_event = send_event
+
+    def __repr__(self):
+        return "<euphoria.Command name='{0}' target={1!r} args={2!r}>".format(self.name, self.target, self.args)
+
+    @classmethod
+    def parse(cls, send_event: SendEvent) -> Optional['Command']:
+        """Returns the command in a message, or None if it isn't one.
+
+        :rtype: euphoria.Command"""
+        match = _COMMAND_RE.match(send_event.content)
+        if match is None:
+            return None
+        name, target, args = match.groups()
+        return cls(name, target, args or "", send_event)
+
+    @property
+    def type(self) -> str:
+        """The name again, so a coalescing :py:class:`euphoria.Subscription` keeps only the newest of each command.
+
+        :rtype: str"""
+        return self.name
+
+    def addressed_to(self, nick: str) -> bool:
+        """True if the command @mentions the nick. Mentions leave out the spaces in a nick, but a
+        nick with spaces typed out in full counts too.
+
+        :rtype: bool"""
+        if self.target is None or not nick:
+            return False
+        return self.target == nick.replace(" ", "") or (self.target + " " + self.args).rstrip() == nick
+
+
+class CommandRouter:
+    """Listens for send-events on behalf of every service, parses each message once, and hands the
+    :py:class:`euphoria.Command` only to the agents that registered for its name, by calling their
+    on_command method. It's a plain listener rather than an agent, so it adds no mailbox hop.
+
+    :param owner: The router lives as long as this agent, usually the :py:class:`euphoria.Bot`"""
+
+    def __init__(self, owner: Agent):
+        self._owner = owner
+        self._handlers = {}  # command name -> set of agents
+        self._routed = 0
+
+    def __repr__(self):
+        return "<euphoria.CommandRouter commands={0}>".format(self.commands)
+
+    @property
+    def alive(self) -> bool:
+        return self._owner.alive
+
+    @property
+    def commands(self) -> List[str]:
+        """The command names some live agent is registered for.
+
+        :rtype: list"""
+        return sorted(name for name, handlers in self._handlers.items()
+                      if any(handler.alive for handler in handlers))
+
+    @property
+    def routed(self) -> int:
+        """How many commands were handed to a handler.
+
+        :rtype: int"""
+        return self._routed
+
+    def add(self, handler: Agent, commands: Iterable[str]):
+        """Registers an agent to have its on_command method called with the commands of the given names,
+        like ['ping', 'uptime'], until it exits. The handler can also be a :py:class:`euphoria.Subscription`
+        feeding an agent's on_command, to bound how many commands wait for it."""
+        for name in commands:
+            self._handlers.setdefault(name, set()).add(handler)
+
+    def on_packet(self, packet: Packet):
+        send_event = packet.send_event
+        if send_event is None or not send_event.content.startswith("!"):
+            return
+        command = Command.parse(send_event)
+        if command is None:
+            return
+        handlers = self._handlers.get(command.name)
+        if not handlers:
+            return
+        to_remove = []
+        for handler in handlers:
+            if handler.alive:
+                handler.on_command(command)
+                self._routed += 1
+            else:
+                to_remove.append(handler)
+        for handler in to_remove:
+            handlers.remove(handler)
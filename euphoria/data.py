@@ -14,453 +14,380 @@
 # You should have received a copy of the GNU General Public License
 # along with this program.  If not, see <http://www.gnu.org/licenses/>.
 
-"""Contains all the different types you may receive from the euphoria server"""
+"""Contains all the different types you may receive from the euphoria server
 
-from typing import Any, List
-from .exceptions import ErrorResponse
-
-__all__ = ['Packet', 'SessionView', 'Message', 'SendEvent', 'SnapshotEvent', 'JoinEvent', 'HelloEvent', 'BounceEvent',
-           'PingEvent', 'NetworkEvent', 'NickEvent', 'SendReply', 'NickReply', 'GetMessageReply', 'LogReply']
-
-
-class SessionViewBased:
-    __slots__ = ['_id', '_name', '_server_id', '_server_era', '_session_id', '_is_staff', '_is_manager']
-
-    def __init__(self, j: dict):
-        self._id = j['id']
-        self._name = j['name']
-        self._server_id = j['server_id']
-        self._server_era = j['server_era']
-        self._session_id = j['session_id']
-        self._is_staff = j.get('is_staff', False)
-        self._is_manager = j.get('is_manager', False)
-
-    @property
-    def id(self) -> str:
-        """The id of an agent or account.
-
-        :rtype: str"""
-        return self._id
-
-    @property
-    def name(self) -> str:
-        """The name-in-use at the time this view was captured.
-
-        :rtype: str"""
-        return self._name
-
-    @property
-    def server_id(self) -> str:
-        """The id of the server that captured this view.
-
-        :rtype: str"""
-        return self._server_id
-
-    @property
-    def server_era(self) -> str:
-        """The era of the server that captured this view.
+Each type declares its fields once as a list of :py:class:`Field`, and the
+constructor and slots are generated from that list when the module is
+imported. Fields are plain slot attributes, so reading one is as cheap as
+attribute access gets; treat them as read-only."""
 
-        :rtype: str"""
-        return self._server_era
-
-    @property
-    def session_id(self) -> str:
-        """ID of the session, unique across all sessions globally.
-
-        :rtype: str"""
-        return self._session_id
-
-    @property
-    def is_staff(self) -> bool:
-        """If true, this session belongs to a member of staff.
-
-        :rtype: bool"""
-        return self._is_staff
-
-    @property
-    def is_manager(self) -> bool:
-        """If true, this session belongs to a manager of the room.
-
-        :rtype: bool"""
-        return self._is_manager
+from collections import OrderedDict
+from typing import Any, List, Optional
+from .exceptions import ErrorResponse
+from .columns import MessageColumns
+
+__all__ = ['Packet', 'SessionView', 'SessionViewPool', 'set_session_view_pool', 'get_session_view_pool',
+           'Message', 'SendEvent', 'SnapshotEvent', 'JoinEvent', 'HelloEvent', 'BounceEvent', 'PingEvent',
+           'NetworkEvent', 'NickEvent', 'SendReply', 'NickReply', 'GetMessageReply', 'LogReply']
+
+
+class Field:
+    """Describes one field of a type the server sends us.
+
+    :param str name: The attribute name on the Python object
+    :param str rtype: The type of the field, for the documentation
+    :param str doc: A description of the field, for the documentation
+    :param str key: The key in the JSON object, if it differs from name
+    :param bool optional: If true, the key may be missing and default is used instead
+    :param default: The value to use when an optional key is missing
+    :param convert: A function applied to the JSON value to build the attribute, or the name
+        of one that will be looked up each time an object is built
+    :param bool lazy: If true, the JSON value is kept as is and only converted the first time
+        the attribute is read"""
+
+    __slots__ = ['name', 'rtype', 'doc', 'key', 'optional', 'default', 'convert', 'lazy']
+
+    def __init__(self, name: str, rtype: str, doc: str, key: str = None, optional: bool = False,
+                 default: Any = None, convert=None, lazy: bool = False):
+        self.name = name
+        self.rtype = rtype
+        self.doc = doc
+        self.key = key or name
+        self.optional = optional
+        self.default = default
+        self.convert = convert
+        self.lazy = lazy
+        assert not lazy or callable(convert), "a lazy field needs a function to convert with"
+
+    @property
+    def slots(self) -> tuple:
+        if self.lazy:
+            return '_raw_' + self.name, '_' + self.name
+        return self.name,
+
+
+# The globals every generated constructor runs with. Converters given by name
+# are looked up here on each call, so they can be swapped out after the fact.
+_generated_globals = {}
+
+
+def _compile_init(type_name: str, fields: List[Field]):
+    # Writes out a constructor with one assignment per field, so building an
+    # object doesn't have to loop over the field specs at runtime.
+    lines = ["def __init__(self, j):"]
+    for i, field in enumerate(fields):
+        if not field.optional:
+            value = "j[{0!r}]".format(field.key)
+        elif field.default is None or isinstance(field.default, (bool, int, str)):
+            value = "j.get({0!r}, {1!r})".format(field.key, field.default)
+        else:
+            default_name = "_{0}_default_{1}".format(type_name, i)
+            _generated_globals[default_name] = field.default
+            value = "j.get({0!r}, {1})".format(field.key, default_name)
+        if field.lazy:
+            lines.append("    self._raw_{0} = {1}".format(field.name, value))
+            lines.append("    self._{0} = None".format(field.name))
+            continue
+        if isinstance(field.convert, str):
+            value = "{0}({1})".format(field.convert, value)
+        elif field.convert:
+            convert_name = "_{0}_convert_{1}".format(type_name, i)
+            _generated_globals[convert_name] = field.convert
+            value = "{0}({1})".format(convert_name, value)
+        lines.append("    self.{0} = {1}".format(field.name, value))
+    if not fields:
+        lines.append("    pass")
+    namespace = {}
+    exec(compile("\n".join(lines), "<euphoria.data.{0}>".format(type_name), "exec"), _generated_globals, namespace)
+    init = namespace['__init__']
+    init.__qualname__ = "{0}.__init__".format(type_name)
+    return init
+
+
+def _document(doc: Optional[str], fields: List[Field]) -> str:
+    lines = [doc.rstrip() if doc else ""]
+    for field in fields:
+        lines.append("")
+        lines.append(":ivar {0}: {1}".format(field.name, field.doc))
+        lines.append(":vartype {0}: {1}".format(field.name, field.rtype))
+    return "\n".join(lines).strip()
+
+
+def _lazy_property(type_name: str, field: Field) -> property:
+    # Compiled like the constructors, so reading the field goes straight to its slots rather than through
+    # getattr and setattr by name.
+    source = "\n".join(["def get(self):",
+                        "    raw = self._raw_{0}",
+                        "    if raw is not None:",
+                        "        self._{0} = convert(raw)",
+                        "        self._raw_{0} = None",
+                        "    return self._{0}"]).format(field.name)
+    namespace = {}
+    exec(compile(source, "<euphoria.data.{0}.{1}>".format(type_name, field.name), "exec"),
+         {'convert': field.convert}, namespace)
+    get = namespace['get']
+    get.__qualname__ = "{0}.{1}".format(type_name, field.name)
+    return property(get, doc=field.doc)
+
+
+class _Schema(type):
+    """Builds __slots__, __init__ and the docstring of a class out of its _fields."""
+
+    def __new__(mcs, name, bases, namespace):
+        fields = namespace.get('_fields')
+        if fields is not None:
+            namespace['__slots__'] = tuple(slot for field in fields for slot in field.slots)
+            namespace['__init__'] = _compile_init(name, fields)
+            for field in fields:
+                if field.lazy:
+                    namespace[field.name] = _lazy_property(name, field)
+        else:
+            # Subclasses reuse their parent's fields, and stay free of a __dict__.
+            namespace.setdefault('__slots__', ())
+            for base in bases:
+                fields = getattr(base, '_fields', None)
+                if fields is not None:
+                    break
+        namespace['__doc__'] = _document(namespace.get('__doc__'), fields or [])
+        return super(_Schema, mcs).__new__(mcs, name, bases, namespace)
+
+
+class SessionViewBased(metaclass=_Schema):
+    _fields = [Field('id', 'str', "The id of an agent or account."),
+               Field('name', 'str', "The name-in-use at the time this view was captured."),
+               Field('server_id', 'str', "The id of the server that captured this view."),
+               Field('server_era', 'str', "The era of the server that captured this view."),
+               Field('session_id', 'str', "ID of the session, unique across all sessions globally."),
+               Field('is_staff', 'bool', "If true, this session belongs to a member of staff.",
+                     optional=True, default=False),
+               Field('is_manager', 'bool', "If true, this session belongs to a manager of the room.",
+                     optional=True, default=False)]
 
 
 class SessionView(SessionViewBased):
     """A SessionView describes a session and its identity."""
 
 
-class MessageBased:
-    __slots__ = ['_id', '_edit_id', '_parent', '_previous_edit_id', '_time', '_sender', '_content',
-                 '_encryption_key_id', '_edited', '_deleted', '_truncated']
+class SessionViewPool:
+    """A bounded cache that lets repeated message senders share one :py:class:`euphoria.SessionView`.
 
-    def __init__(self, j: dict):
-        self._id = j['id']
-        self._edit_id = j.get('edit_id', None)
-        self._parent = j.get('parent', None)
-        self._previous_edit_id = j.get('previous_edit_id', None)
-        self._time = j['time']
-        self._sender = SessionView(j['sender'])
-        self._content = j['content']
-        self._encryption_key_id = j.get('encryption_key_id', None)
-        self._edited = j.get('edited', None)
-        self._deleted = j.get('deleted', None)
-        self._truncated = j.get('truncated', False)
+    Views are keyed on their session_id, name and server_era, and the least
+    recently used ones are forgotten once there are more than max_size of them.
 
-    @property
-    def id(self) -> str:
-        """The id of the message (unique within a room).
+    :param int max_size: The most views to remember"""
 
-        :rtype: str"""
-        return self._id
+    __slots__ = ['_max_size', '_views', '_hits', '_misses']
 
-    @property
-    def edit_id(self) -> str:
-        """The ID of the edit. None if this isn't an EditMessageEvent.
+    def __init__(self, max_size: int = 4096):
+        self._max_size = max_size
+        self._views = OrderedDict()
+        self._hits = 0
+        self._misses = 0
 
-        :rtype: str"""
-        return self._edit_id
+    def __len__(self):
+        return len(self._views)
 
     @property
-    def parent(self) -> str:
-        """The id of the message's parent, or None if top-level.
+    def max_size(self) -> int:
+        """The most views this pool will remember.
 
-        :rtype: str"""
-        return self._parent
+        :rtype: int"""
+        return self._max_size
 
     @property
-    def previous_edit_id(self) -> str:
-        """The edit id of the most recent edit of this message, or None if it's
-        never been edited.
+    def hits(self) -> int:
+        """How many times a view was shared instead of built.
 
-        :rtype: str"""
-        return self._previous_edit_id
+        :rtype: int"""
+        return self._hits
 
     @property
-    def time(self) -> int:
-        """The unix timestamp of when the message was posted.
+    def misses(self) -> int:
+        """How many times a view had to be built.
 
         :rtype: int"""
-        return self._time
+        return self._misses
 
-    @property
-    def sender(self) -> SessionView:
-        """The view of the sender's session.
+    def intern(self, j: dict) -> SessionView:
+        """Returns the shared view for this JSON, building it if we haven't seen it recently.
 
         :rtype: euphoria.SessionView"""
-        return self._sender
+        key = (j['session_id'], j['name'], j['server_era'])
+        views = self._views
+        view = views.get(key)
+        if view is not None:
+            views.move_to_end(key)
+            self._hits += 1
+            return view
+        self._misses += 1
+        view = SessionView(j)
+        views[key] = view
+        if len(views) > self._max_size:
+            views.popitem(last=False)
+        return view
 
-    @property
-    def content(self) -> str:
-        """The content of the message (client-defined).
+    def clear(self):
+        """Forgets every view."""
+        self._views.clear()
 
-        :rtype: str"""
-        return self._content
 
-    @property
-    def encryption_key_id(self) -> str:
-        """The id of the key that encrypts the message in storage. Potentially
-        None.
+_session_view_pool = None
 
-        :rtype: str"""
-        return self._encryption_key_id
 
-    @property
-    def edited(self) -> int:
-        """The unix timestamp of when the message was last edited. Potentially
-        None.
+def set_session_view_pool(pool: Optional[SessionViewPool]):
+    """Sets the pool message senders are interned in, or turns interning off with None.
 
-        :rtype: int"""
-        return self._edited
+    Interning is off by default.
 
-    @property
-    def deleted(self) -> int:
-        """The unix timestamp of when the message was deleted. Potentially
-        None.
+    :param pool: The :py:class:`euphoria.SessionViewPool` to use"""
+    global _session_view_pool
+    _session_view_pool = pool
+    _generated_globals['_sender_view'] = SessionView if pool is None else pool.intern
 
-        :rtype: int"""
-        return self._deleted
 
-    @property
-    def truncated(self) -> bool:
-        """If true, then the full content of this message is not included.
+def get_session_view_pool() -> Optional[SessionViewPool]:
+    """Returns the pool message senders are interned in, or None if interning is off.
 
-        :rtype: bool"""
-        return self._truncated
+    :rtype: euphoria.SessionViewPool"""
+    return _session_view_pool
 
 
-class Message(MessageBased):
-    """A Message is a node in a Room's Log. It corresponds to a chat message,
-    or a post, or any broadcasted event in a room that should appear in the log."""
-    pass
+_generated_globals['_sender_view'] = SessionView
 
 
-class HelloEvent:
-    """A HelloEvent is sent by the server to the client when a session is
-    started. It includes information about the client's authentication and
-    associated identity."""
+def _session_views(js: List[dict]) -> List[SessionView]:
+    return [SessionView(j) for j in js]
 
-    __slots__ = ['_id', '_account', '_session', '_account_has_access', '_room_is_private', '_version']
 
-    def __init__(self, j: dict):
-        self._id = j['id']
-        self._account = j.get('account', None)
-        self._session = SessionView(j['session'])
-        self._account_has_access = j.get('account_has_access', True)
-        self._room_is_private = j.get('room_is_private')
-        self._version = j.get('version')
+class MessageBased(metaclass=_Schema):
+    _fields = [Field('id', 'str', "The id of the message (unique within a room)."),
+               Field('edit_id', 'str', "The ID of the edit. None if this isn't an EditMessageEvent.",
+                     optional=True),
+               Field('parent', 'str', "The id of the message's parent, or None if top-level.", optional=True),
+               Field('previous_edit_id', 'str', "The edit id of the most recent edit of this message, "
+                                                "or None if it's never been edited.", optional=True),
+               Field('time', 'int', "The unix timestamp of when the message was posted."),
+               Field('sender', 'euphoria.SessionView', "The view of the sender's session.",
+                     convert='_sender_view'),
+               Field('content', 'str', "The content of the message (client-defined)."),
+               Field('encryption_key_id', 'str', "The id of the key that encrypts the message in storage. "
+                                                 "Potentially None.", optional=True),
+               Field('edited', 'int', "The unix timestamp of when the message was last edited. Potentially None.",
+                     optional=True),
+               Field('deleted', 'int', "The unix timestamp of when the message was deleted. Potentially None.",
+                     optional=True),
+               Field('truncated', 'bool', "If true, then the full content of this message is not included.",
+                     optional=True, default=False)]
 
-    @property
-    def id(self) -> str:
-        """The id of the agent or account logged into this session.
-
-        :rtype: str"""
-        return self._id
 
-    @property
-    def account(self) -> dict:
-        """Details about the user's account, if the session is logged in. None
-        otherwise.
+class Message(MessageBased):
+    """A Message is a node in a Room's Log. It corresponds to a chat message,
+    or a post, or any broadcasted event in a room that should appear in the log."""
 
-        :rtype: dict"""
-        return self._account
 
-    @property
-    def session(self) -> SessionView:
-        """A :py:class:`euphoria.SessionView` describing the session.
+def _messages(js: List[dict]) -> List[Message]:
+    return [Message(j) for j in js]
 
-        :rtype: euphoria.SessionView"""
-        return self._session
 
-    @property
-    def account_has_access(self) -> bool:
-        """If true, then the account has an explicit access grant to the current room.
+def _log_columns(obj) -> MessageColumns:
+    # Use the JSON if it's still around, it's cheaper than going through Message objects.
+    if obj._raw_log is not None:
+        return MessageColumns.from_json(obj._raw_log)
+    return MessageColumns.from_messages(obj._log)
 
-        :rtype: bool"""
-        return self._account_has_access
 
-    @property
-    def room_is_private(self) -> bool:
-        """If true, the session is connected to a private room.
+def _passcode_if_unspecified(auth_options: Optional[list]) -> list:
+    if not auth_options:
+        return ["passcode"]
+    return auth_options
 
-        :rtype: bool"""
-        return self._room_is_private
 
-    @property
-    def version(self) -> str:
-        """The version of the code being run and served by the server.
+class HelloEvent(metaclass=_Schema):
+    """A HelloEvent is sent by the server to the client when a session is
+    started. It includes information about the client's authentication and
+    associated identity."""
 
-        :rtype: str"""
-        return self._version
+    _fields = [Field('id', 'str', "The id of the agent or account logged into this session."),
+               Field('account', 'dict', "Details about the user's account, if the session is logged in. "
+                                        "None otherwise.", optional=True),
+               Field('session', 'euphoria.SessionView', "A :py:class:`euphoria.SessionView` describing the session.",
+                     convert=SessionView),
+               Field('account_has_access', 'bool', "If true, then the account has an explicit access grant to "
+                                                   "the current room.", optional=True, default=True),
+               Field('room_is_private', 'bool', "If true, the session is connected to a private room.",
+                     optional=True),
+               Field('version', 'str', "The version of the code being run and served by the server.",
+                     optional=True)]
 
 
-class PingEvent:
+class PingEvent(metaclass=_Schema):
     """A PingEvent represents a server-to-client ping. The client should send
      back a ping-reply with the same value for the time field as soon as
      possible (or risk disconnection)."""
 
-    __slots__ = ['_time', '_next']
-
-    def __init__(self, j: dict):
-        self._time = j['time']
-        self._next = j['next']
-
-    @property
-    def time(self) -> int:
-        """A unix timestamp according to the server's clock.
+    _fields = [Field('time', 'int', "A unix timestamp according to the server's clock."),
+               Field('next', 'int', "The expected time of the next ping-event, according to the server's clock.")]
 
-        :rtype: int"""
-        return self._time
 
-    @property
-    def next(self) -> int:
-        """The expected time of the next ping-event, according to the server's clock.
-
-        :rtype: int"""
-        return self._next
-
-
-class BounceEvent:
+class BounceEvent(metaclass=_Schema):
     """A BounceEvent indicates that access to a room is denied."""
 
-    __slots__ = ['_reason', '_auth_options']
+    _fields = [Field('reason', 'str', "The reason why access was denied. Potentially None.", optional=True),
+               Field('auth_options', 'list', "A list of authentication options that may be used.",
+                     optional=True, convert=_passcode_if_unspecified)]
 
-    def __init__(self, j: dict):
-        self._reason = j.get('reason', None)
-        self._auth_options = j.get('auth_options', None)
 
-    @property
-    def reason(self) -> str:
-        """The reason why access was denied. Potentially None.
-
-        :rtype: str"""
-        return self._reason
-
-    @property
-    def auth_options(self) -> list:
-        """A list of authentication options that may be used. Potentially None.
-
-        :rtype: list"""
-        if not self._auth_options:
-            return ["passcode"]
-        return self._auth_options
-
-
-class AuthReply:
+class AuthReply(metaclass=_Schema):
     """An AuthReply reports whether the auth command succeeded."""
 
-    __slots__ = ['_success', '_reason']
-
-    def __init__(self, j: dict):
-        self._success = j['success']
-        self._reason = j.get('reason', None)
-
-    @property
-    def success(self) -> bool:
-        """True if authentication succeeded.
-
-        :rtype: bool"""
-        return self._success
-
-    @property
-    def reason(self) -> str:
-        """If AuthReply.success was false, the reason for failure.
-
-        :rtype: str"""
-        return self._reason
+    _fields = [Field('success', 'bool', "True if authentication succeeded."),
+               Field('reason', 'str', "If AuthReply.success was false, the reason for failure.", optional=True)]
 
 
-class SnapshotEvent:
+class SnapshotEvent(metaclass=_Schema):
     """A SnapshotEvent indicates that a session has successfully joined a room.
     It also offers a snapshot of the room's state and recent history."""
 
-    __slots__ = ['_identity', '_session_id', '_version', '_listing', '_log']
-
-    def __init__(self, j: dict):
-        self._identity = j['identity']
-        self._session_id = j['session_id']
-        self._version = j['version']
-        self._listing = [SessionView(sub_j) for sub_j in j['listing']]
-        self._log = [Message(sub_j) for sub_j in j['log']]
+    _fields = [Field('identity', 'str', "The id of the agent or account logged into this session."),
+               Field('session_id', 'str', "The globally unique id of this session."),
+               Field('version', 'str', "The server's version identifier."),
+               Field('listing', 'list', "The list of all other sessions joined to the room (excluding this "
+                                        "session), as :py:class:`euphoria.SessionView`", convert=_session_views),
+               Field('log', 'list', "The most recent messages posted to the room (currently up to 100), as "
+                                    ":py:class:`euphoria.Message`", convert=_messages, lazy=True)]
 
     @property
-    def identity(self) -> str:
-        """The id of the agent or account logged into this session.
+    def columns(self) -> MessageColumns:
+        """The log as a :py:class:`euphoria.MessageColumns`, built without making a Message for each entry
+        if the log hasn't been read yet.
 
-        :rtype: str"""
-        return self._identity
+        :rtype: euphoria.MessageColumns"""
+        return _log_columns(self)
 
-    @property
-    def session_id(self) -> str:
-        """The globally unique id of this session.
 
-        :rtype: str"""
-        return self._session_id
+class NetworkEvent(metaclass=_Schema):
+    _fields = [Field('type', 'str', "The type of network event; for now, always 'partition'."),
+               Field('server_id', 'str', "The id of the affected server."),
+               Field('server_era', 'str', "The era of the affected server.")]
 
-    @property
-    def version(self) -> str:
-        """The server's version identifier.
-
-        :rtype: str"""
-        return self._version
-
-    @property
-    def listing(self) -> List[SessionView]:
-        """The list of all other sessions joined to the room (excluding this session.)
-
-        :return: A list of :py:class:`euphoria.SessionView`
-        :rtype: list"""
-        return self._listing
-
-    @property
-    def log(self) -> List[Message]:
-        """The most recent messages posted to the room (currently up to 100.)
-
-        :return: A list of :py:class:`euphoria.Message`
-        :rtype: list"""
-        return self._log
 
-
-class NetworkEvent:
-    __slots__ = ['_type', '_server_id', '_server_era']
-
-    def __init__(self, j: dict):
-        self._type = j['type']
-        self._server_id = j['server_id']
-        self._server_era = j['server_era']
-
-    @property
-    def type(self) -> str:
-        """The type of network event; for now, always 'partition'.
-
-        :rtype: str"""
-        return self._type
-
-    @property
-    def server_id(self) -> str:
-        """The id of the affected server.
-
-        :rtype: str"""
-        return self._server_id
-
-    @property
-    def server_era(self) -> str:
-        """The era of the affected server.
-
-        :rtype: str"""
-        return self._server_era
-
-
-class NickBased:
-    __slots__ = ['_session_id', '_id', '_from', '_to']
-
-    def __init__(self, j: dict):
-        self._session_id = j['session_id']
-        self._id = j['id']
-        self._from = j['from']
-        self._to = j['to']
-
-    @property
-    def session_id(self) -> str:
-        """The id of the session this name applies to.
-
-        :rtype: str"""
-        return self._session_id
-
-    @property
-    def id(self) -> str:
-        """The id of the agent or account logged into the session.
-
-        :rtype: str"""
-        return self._id
-
-    @property
-    def from_(self) -> str:
-        """The previous name associated with the session.
-
-        :rtype: str"""
-        return self._from
-
-    @property
-    def to(self) -> str:
-        """The name associated with the session henceforth.
-
-        :rtype: str"""
-        return self._to
+class NickBased(metaclass=_Schema):
+    _fields = [Field('session_id', 'str', "The id of the session this name applies to."),
+               Field('id', 'str', "The id of the agent or account logged into the session."),
+               Field('from_', 'str', "The previous name associated with the session.", key='from'),
+               Field('to', 'str', "The name associated with the session henceforth.")]
 
 
 class NickEvent(NickBased):
     """A NickEvent indicates that a session successfully changed their nick."""
-    pass
 
 
 class NickReply(NickBased):
     """A NickReply indicates that you successfully changed your nick."""
-    pass
 
 
 class SendEvent(MessageBased):
     """A SendEvent indicates a message received by the room from another session."""
-    pass
 
 
 class EditMessageEvent(MessageBased):
@@ -483,41 +410,59 @@ class PartEvent(SessionViewBased):
     """A PartEvent indicates a session just disconnected from the room."""
 
 
-class LogReply:
-    def __init__(self, j: dict):
-        self._before = j.get('before', None)
-        self._log = [Message(x) for x in j['log']]
+class LogReply(metaclass=_Schema):
+    """A LogReply contains messages retrieved by a log command."""
 
-    @property
-    def before(self) -> str:
-        return self._before
+    _fields = [Field('before', 'str', "The message id the log was fetched before, if one was given.",
+                     optional=True),
+               Field('log', 'list', "The requested messages, as :py:class:`euphoria.Message`", convert=_messages,
+                     lazy=True)]
 
     @property
-    def log(self) -> List[Message]:
-        return self._log
+    def columns(self) -> MessageColumns:
+        """The log as a :py:class:`euphoria.MessageColumns`, built without making a Message for each entry
+        if the log hasn't been read yet.
+
+        :rtype: euphoria.MessageColumns"""
+        return _log_columns(self)
 
 
 class Packet:
-    """A message received from Euphoria"""
+    """A message received from Euphoria
+
+    :param dict j: The decoded JSON of the packet
+    :param bool lazy: If true, only the envelope is read up front, and the
+        typed data is built the first time it is asked for."""
 
-    __slots__ = ['_id', '_type', '_data', '_error', '_throttled', '_throttled_reason']
+    __slots__ = ['_id', '_type', '_data', '_raw_data', '_error', '_throttled', '_throttled_reason']
 
-    def __init__(self, j: dict):
+    def __init__(self, j: dict, lazy: bool = False):
         self._id = j.get('id', None)
         self._type = j['type']
-        if j.get('data', None):
-            self._data = DATA_TYPES[self.type](j['data'])
-        else:
-            self._data = None
+        self._raw_data = j.get('data', None) or None
+        self._data = None
         self._error = j.get('error', None)
         self._throttled = j.get('throttled', False)
         self._throttled_reason = j.get('throttled_reason', None)
+        if not lazy:
+            self._decode()
+
+    def _decode(self) -> Any:
+        # Build the typed data out of the raw JSON, and then drop the JSON so
+        # we're not holding onto two copies of it.
+        if self._raw_data is not None:
+            self._data = DATA_TYPES[self._type](self._raw_data)
+            self._raw_data = None
+        return self._data
 
     def is_type(self, type_: type) -> bool:
         """Returns whether or not this packet contains data of the given type.
 
         :param type_: The type to check for
         :rtype: bool"""
+        if self._raw_data is not None:
+            data_type = DATA_TYPES.get(self._type)
+            return data_type is not None and issubclass(data_type, type_)
         return isinstance(self._data, type_)
 
     @property
@@ -542,6 +487,8 @@ class Packet:
         :raises euphoria.ErrorResponse: if this Packet contains an error."""
         if self.error:
             raise ErrorResponse(self.error)
+        if self._raw_data is not None:
+            return self._decode()
         return self._data
 
     @property
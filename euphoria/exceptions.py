@@ -16,7 +16,7 @@
 
 """A collection of exceptions this library may throw at you"""
 
-__all__ = ['EuphoriaException', 'ErrorResponse']
+__all__ = ['EuphoriaException', 'ErrorResponse', 'ReplyTimeout', 'Disconnected']
 
 
 class EuphoriaException(Exception):
@@ -27,3 +27,13 @@ class EuphoriaException(Exception):
 class ErrorResponse(EuphoriaException):
     """Raised when a :py:class:`euphoria.Packet` contains an error and you try to access its data."""
     pass
+
+
+class ReplyTimeout(EuphoriaException):
+    """Set on a reply future when the server doesn't answer a command in time."""
+    pass
+
+
+class Disconnected(EuphoriaException):
+    """Set on every outstanding reply future when the :py:class:`euphoria.Client` loses its connection."""
+    pass
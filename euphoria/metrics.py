@@ -0,0 +1,196 @@
+# euphoria-py
+# Copyright (C) 2015  Emily A. Bellows
+#
+# This program is free software: you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation, either version 3 of the License, or
+# (at your option) any later version.
+#
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with this program.  If not, see <http://www.gnu.org/licenses/>.
+
+"""Serving the counters bots keep as Prometheus text-format metrics over HTTP.
+
+Nothing here is counted as it happens, the counters already live on the Client,
+agents and supervisors. A scrape just reads them and formats the text."""
+
+import asyncio
+import logging
+from asyncio import AbstractEventLoop
+from collections import OrderedDict
+from typing import Callable, Mapping, Optional
+
+__all__ = ['render_metrics', 'MetricsServer']
+
+logger = logging.getLogger(__name__)
+
+
+def _escape(value) -> str:
+    return str(value).replace('\\', '\\\\').replace('"', '\\"').replace('\n', '\\n')
+
+
+def _labels(**labels) -> str:
+    return "{" + ",".join('{0}="{1}"'.format(key, _escape(value)) for key, value in sorted(labels.items())) + "}"
+
+
+class _Writer:
+    # Collects samples grouped by metric, since every sample of a metric has to be together in the output.
+    def __init__(self):
+        self._families = OrderedDict()
+
+    def _family(self, name: str, kind: str, help_: str) -> list:
+        lines = self._families.get(name)
+        if lines is None:
+            lines = self._families[name] = ["# HELP {0} {1}".format(name, help_),
+                                             "# TYPE {0} {1}".format(name, kind)]
+        return lines
+
+    def metric(self, name: str, kind: str, help_: str, value, **labels):
+        self._family(name, kind, help_).append("{0}{1} {2}".format(name, _labels(**labels), value))
+
+    def histogram(self, name: str, help_: str, histogram, **labels):
+        lines = self._family(name, "histogram", help_)
+        seen = 0
+        for bound, n in zip(histogram.bounds, histogram.counts):
+            seen += n
+            lines.append("{0}_bucket{1} {2}".format(name, _labels(le="{0:.6g}".format(bound), **labels), seen))
+        lines.append("{0}_bucket{1} {2}".format(name, _labels(le="+Inf", **labels), histogram.count))
+        lines.append("{0}_sum{1} {2}".format(name, _labels(**labels), histogram.sum))
+        lines.append("{0}_count{1} {2}".format(name, _labels(**labels), histogram.count))
+
+    def text(self) -> str:
+        return "".join(line + "\n" for lines in self._families.values() for line in lines)
+
+
+def _render_bot(out: _Writer, name: str, bot):
+    client = bot.client
+    labels = {'bot': name, 'room': client.room}
+    for type_, n in sorted(client.packets_in.items()):
+        out.metric("euphoria_packets_in_total", "counter", "Packets received, by type.", n, type=type_, **labels)
+    for type_, n in sorted(client.packets_out.items()):
+        out.metric("euphoria_packets_out_total", "counter", "Commands sent, by type.", n, type=type_, **labels)
+    out.metric("euphoria_bytes_in_total", "counter", "Length of every frame received.", client.bytes_in, **labels)
+    out.metric("euphoria_bytes_out_total", "counter", "Length of every frame sent.", client.bytes_out, **labels)
+    out.metric("euphoria_decode_seconds_total", "counter", "Time spent decoding frames into packets.",
+               client.decode_time, **labels)
+    out.metric("euphoria_pending_replies", "gauge", "Commands still waiting for a reply.", client.pending_replies,
+               **labels)
+    out.metric("euphoria_outbound_queue_depth", "gauge", "Frames waiting for the writer.",
+               client.outbound_queue_depth, **labels)
+    out.metric("euphoria_reconnects_total", "counter", "Times the client reconnected after a drop.",
+               client.reconnects, **labels)
+    out.metric("euphoria_throttled_replies_total", "counter", "Replies the server marked as throttled.",
+               client.throttled_replies, **labels)
+    out.metric("euphoria_timed_out_replies_total", "counter", "Commands that never got a reply in time.",
+               client.timed_out_replies, **labels)
+    out.metric("euphoria_dropped_packets_total", "counter", "Packets dropped because a listener fell behind.",
+               client.dropped_packets, **labels)
+    for type_, histogram in sorted(client.latencies.items()):
+        out.histogram("euphoria_reply_latency_seconds", "Seconds from sending a command to its reply.", histogram,
+                      type=type_, **labels)
+    out.histogram("euphoria_ping_interval_seconds", "Seconds between ping-events arriving.", client.ping_intervals,
+                  **labels)
+    for agent, depth in sorted(bot.mailbox_depths().items()):
+        out.metric("tiny_agent_mailbox_depth", "gauge", "Messages waiting in an agent's mailbox.", depth,
+                   agent=agent, **labels)
+    for child, n in sorted(bot.service_supervisor.restarts_by_name.items()):
+        out.metric("tiny_agent_supervisor_restarts_total", "counter", "Children restarted by a supervisor.", n,
+                   supervisor=name + ".services", child=child)
+
+
+def render_metrics(bots: Mapping, supervisor=None, supervisor_name: str = "borg") -> str:
+    """Formats the counters of some bots, and optionally the supervisor running them, as Prometheus text.
+
+    :param bots: A mapping from names to :py:class:`euphoria.Bot`
+    :param supervisor: A :py:class:`tiny_agent.SupervisorOneForOne` whose restarts to report
+    :param str supervisor_name: The supervisor label for its restarts
+    :rtype: str"""
+    out = _Writer()
+    for name, bot in sorted(bots.items()):
+        if bot.alive:
+            _render_bot(out, name, bot)
+    if supervisor is not None:
+        for child, n in sorted(supervisor.restarts_by_name.items()):
+            out.metric("tiny_agent_supervisor_restarts_total", "counter", "Children restarted by a supervisor.", n,
+                       supervisor=supervisor_name, child=child)
+    return out.text()
+
+
+class MetricsServer:
+    """A tiny HTTP server that answers every GET with the text from render.
+
+    :param render: Called on every scrape, returns the metrics text
+    :param str host: The interface to listen on, only the local machine by default
+    :param int port: The port to listen on, 0 picks a free one
+    :param loop: The event loop to run on"""
+
+    def __init__(self, render: Callable[[], str], host: str = "127.0.0.1", port: int = 9100,
+                 loop: AbstractEventLoop = None):
+        self._render = render
+        self._host = host
+        self._port = port
+        self._loop = loop
+        self._server = None
+
+    def __repr__(self):
+        return "<euphoria.MetricsServer host='{0}' port={1}>".format(self._host, self._port)
+
+    @property
+    def port(self) -> int:
+        return self._port
+
+    async def start(self):
+        self._server = await asyncio.start_server(self._handle, self._host, self._port, loop=self._loop)
+        self._port = self._server.sockets[0].getsockname()[1]
+        logger.info("%s listening", self)
+
+    def close(self):
+        if self._server is not None:
+            self._server.close()
+            self._server = None
+
+    async def _handle(self, reader: asyncio.StreamReader, writer: asyncio.StreamWriter):
+        try:
+            request = await reader.readline()
+            while True:
+                line = await reader.readline()
+                if not line or line in (b"\r\n", b"\n"):
+                    break
+            parts = request.split()
+            if len(parts) < 2 or parts[0] != b"GET":
+                status, body = "405 Method Not Allowed", ""
+            else:
+                try:
+                    status, body = "200 OK", self._render()
+                except Exception:
+                    logger.exception("%s couldn't render metrics", self)
+                    status, body = "500 Internal Server Error", ""
+            payload = body.encode('utf-8')
+            writer.write("HTTP/1.0 {0}\r\nContent-Type: text/plain; version=0.0.4\r\nContent-Length: {1}\r\n"
+                         "Connection: close\r\n\r\n".format(status, len(payload)).encode('ascii'))
+            writer.write(payload)
+            await writer.drain()
+        except ConnectionError:
+            pass
+        finally:
+            writer.close()
+
+
+def start_metrics_server(render: Callable[[], str], port: int, host: str = "127.0.0.1",
+                         loop: Optional[AbstractEventLoop] = None) -> MetricsServer:
+    # Starts listening in the background, logging rather than raising if the port is taken.
+    server = MetricsServer(render, host, port, loop=loop)
+
+    async def start():
+        try:
+            await server.start()
+        except OSError as exc:
+            logger.warning("%s couldn't start because %s", server, exc)
+
+    asyncio.ensure_future(start(), loop=loop)
+    return server
@@ -0,0 +1,374 @@
+# euphoria-py
+# Copyright (C) 2015  Emily A. Bellows
+#
+# This program is free software: you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation, either version 3 of the License, or
+# (at your option) any later version.
+#
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with this program.  If not, see <http://www.gnu.org/licenses/>.
+
+"""A small in-process euphoria server, for offline tests and load generation.
+
+It speaks enough of the protocol for :py:class:`euphoria.Client`: hello, snapshot,
+ping, nick, auth and bounce, send, log and get-message. Point a Client or a Bot at
+it with the uri_format option, for example::
+
+    server = MockServer(loop=loop)
+    loop.run_until_complete(server.start())
+    client = Client("test", uri_format=server.uri_format, loop=loop)
+"""
+
+import argparse
+import asyncio
+import itertools
+import json
+import logging
+import re
+import time
+from asyncio import AbstractEventLoop
+from collections import deque
+from typing import Optional, List
+
+import websockets
+
+__all__ = ['MockServer']
+
+logger = logging.getLogger(__name__)
+
+SERVER_ID = "mock.1"
+SERVER_ERA = "mockera"
+VERSION = "euphoria-py-mock"
+
+_ROOM_RE = re.compile(r"/room/([^/]+)/ws")
+
+# Older releases of websockets return None from recv() on close, newer ones raise.
+_ConnectionClosed = getattr(websockets.exceptions, 'ConnectionClosed', ())
+
+
+class _Session:
+    __slots__ = ['sock', 'view', 'joined', 'ping_task']
+
+    def __init__(self, sock, view: dict):
+        self.sock = sock
+        self.view = view
+        self.joined = False
+        self.ping_task = None
+
+
+class _Room:
+    __slots__ = ['name', 'sessions', 'log', 'by_id']
+
+    def __init__(self, name: str, log_size: int):
+        self.name = name
+        self.sessions = []
+        self.log = deque(maxlen=log_size)
+        self.by_id = {}
+
+    def remember(self, message: dict):
+        if len(self.log) == self.log.maxlen:
+            del self.by_id[self.log[0]["id"]]
+        self.log.append(message)
+        self.by_id[message["id"]] = message
+
+
+class MockServer:
+    """An in-process websocket server that behaves like a euphoria.io room.
+
+    :param str host: The interface to listen on
+    :param int port: The port to listen on, 0 picks a free one
+    :param str passcode: If given, every room is private and needs this passcode
+    :param float ping_interval: Seconds between ping-events sent to each session
+    :param int log_size: How many messages each room remembers
+    :param loop: The event loop to run on"""
+
+    def __init__(self, host: str = "127.0.0.1", port: int = 0, passcode: Optional[str] = None,
+                 ping_interval: float = 30.0, log_size: int = 1000, loop: AbstractEventLoop = None):
+        self._host = host
+        self._port = port
+        self._passcode = passcode
+        self._ping_interval = ping_interval
+        self._log_size = log_size
+        self._loop = loop
+        self._server = None
+        self._rooms = {}
+        self._ids = itertools.count(1)
+        self._next_message_id = 0x00a000000000
+        self._received = {}
+
+    def __repr__(self):
+        return "<euphoria.MockServer host='{0}' port={1}>".format(self._host, self._port)
+
+    @property
+    def port(self) -> int:
+        """The port the server is listening on, known once it has started.
+
+        :rtype: int"""
+        return self._port
+
+    @property
+    def uri_format(self) -> str:
+        """A uri_format for :py:class:`euphoria.Client` that connects to this server.
+
+        :rtype: str"""
+        return "ws://{0}:{1}/room/{{0}}/ws".format(self._host, self._port)
+
+    @property
+    def received(self) -> dict:
+        """How many commands of each type the server has received.
+
+        :rtype: dict"""
+        return self._received
+
+    def sessions(self, room: str) -> int:
+        """Returns how many sessions are connected to the room.
+
+        :rtype: int"""
+        return len(self._rooms[room].sessions) if room in self._rooms else 0
+
+    async def start(self):
+        """Starts listening. Once this returns, port holds the real port number."""
+        self._server = await websockets.serve(self._handle, self._host, self._port, loop=self._loop)
+        # Older releases of websockets wrap the asyncio server instead of returning it.
+        server = getattr(self._server, 'server', self._server)
+        self._port = server.sockets[0].getsockname()[1]
+        logger.info("%s listening", self)
+
+    def close(self):
+        """Stops accepting connections and disconnects everyone."""
+        if self._server is not None:
+            self._server.close()
+            self._server = None
+        for room in self._rooms.values():
+            for session in room.sessions:
+                if session.ping_task:
+                    session.ping_task.cancel()
+
+    async def wait_closed(self):
+        if self._server is not None:
+            await self._server.wait_closed()
+
+    def _room(self, name: str) -> _Room:
+        room = self._rooms.get(name)
+        if room is None:
+            room = self._rooms[name] = _Room(name, self._log_size)
+        return room
+
+    def _make_view(self, name: str = "") -> dict:
+        n = next(self._ids)
+        return {"id": "agent:mock{0:08x}".format(n),
+                "name": name,
+                "server_id": SERVER_ID,
+                "server_era": SERVER_ERA,
+                "session_id": "mock{0:012x}".format(n)}
+
+    def _make_message(self, sender: dict, content: str, parent: Optional[str] = None) -> dict:
+        self._next_message_id += 1
+        message = {"id": "{0:013x}".format(self._next_message_id),
+                   "time": int(time.time()),
+                   "sender": sender,
+                   "content": content}
+        if parent:
+            message["parent"] = parent
+        return message
+
+    @staticmethod
+    async def _send(session: _Session, type_: str, data: Optional[dict] = None, id_: Optional[str] = None,
+                    error: Optional[str] = None):
+        packet = {"type": type_}
+        if id_ is not None:
+            packet["id"] = id_
+        if data is not None:
+            packet["data"] = data
+        if error is not None:
+            packet["error"] = error
+        if not session.sock.open:
+            return
+        try:
+            await session.sock.send(json.dumps(packet))
+        except _ConnectionClosed:
+            pass
+
+    async def _broadcast(self, room: _Room, type_: str, data: dict, exclude: Optional[_Session] = None):
+        for session in list(room.sessions):
+            if session is not exclude and session.joined:
+                await self._send(session, type_, data)
+
+    async def _join(self, room: _Room, session: _Session):
+        session.joined = True
+        listing = [other.view for other in room.sessions if other.joined and other is not session]
+        await self._send(session, "snapshot-event", {"identity": session.view["id"],
+                                                     "session_id": session.view["session_id"],
+                                                     "version": VERSION,
+                                                     "listing": listing,
+                                                     "log": list(room.log)[-100:]})
+        await self._broadcast(room, "join-event", session.view, exclude=session)
+
+    async def _ping_loop(self, session: _Session):
+        while True:
+            await asyncio.sleep(self._ping_interval, loop=self._loop)
+            now = int(time.time())
+            await self._send(session, "ping-event", {"time": now, "next": now + int(self._ping_interval)})
+
+    async def _handle(self, sock, path: str):
+        match = _ROOM_RE.match(path)
+        if not match:
+            return
+        room = self._room(match.group(1))
+        session = _Session(sock, self._make_view())
+        room.sessions.append(session)
+        session.ping_task = asyncio.ensure_future(self._ping_loop(session), loop=self._loop)
+        try:
+            await self._send(session, "hello-event", {"id": session.view["id"],
+                                                      "session": session.view,
+                                                      "room_is_private": self._passcode is not None,
+                                                      "version": VERSION})
+            if self._passcode is None:
+                await self._join(room, session)
+            else:
+                await self._send(session, "bounce-event", {"reason": "authentication required",
+                                                           "auth_options": ["passcode"]})
+            while True:
+                try:
+                    frame = await sock.recv()
+                except _ConnectionClosed:
+                    break
+                if frame is None:
+                    break
+                await self._on_command(room, session, json.loads(frame))
+        finally:
+            session.ping_task.cancel()
+            room.sessions.remove(session)
+            if session.joined:
+                await self._broadcast(room, "part-event", session.view)
+
+    async def _on_command(self, room: _Room, session: _Session, command: dict):
+        type_ = command.get("type")
+        id_ = command.get("id")
+        data = command.get("data") or {}
+        self._received[type_] = self._received.get(type_, 0) + 1
+
+        if type_ == "ping-reply":
+            return
+
+        if type_ == "auth":
+            if data.get("passcode") == self._passcode:
+                await self._send(session, "auth-reply", {"success": True}, id_=id_)
+                if not session.joined:
+                    await self._join(room, session)
+            else:
+                await self._send(session, "auth-reply", {"success": False, "reason": "passcode incorrect"}, id_=id_)
+            return
+
+        if not session.joined:
+            await self._send(session, type_ + "-reply", id_=id_, error="access denied")
+            return
+
+        if type_ == "nick":
+            name = data.get("name", "").strip()
+            if not name or len(name) > 36:
+                await self._send(session, "nick-reply", id_=id_, error="invalid nick")
+                return
+            change = {"session_id": session.view["session_id"], "id": session.view["id"],
+                      "from": session.view["name"], "to": name}
+            session.view = dict(session.view, name=name)
+            await self._send(session, "nick-reply", change, id_=id_)
+            await self._broadcast(room, "nick-event", change, exclude=session)
+
+        elif type_ == "send":
+            message = self._make_message(session.view, data.get("content", ""), data.get("parent"))
+            room.remember(message)
+            await self._send(session, "send-reply", message, id_=id_)
+            await self._broadcast(room, "send-event", message, exclude=session)
+
+        elif type_ == "log":
+            before = data.get("before")
+            n = min(int(data.get("n", 10)), 1000)
+            log = [message for message in room.log if before is None or message["id"] < before][-n:]
+            reply = {"log": log}
+            if before is not None:
+                reply["before"] = before
+            await self._send(session, "log-reply", reply, id_=id_)
+
+        elif type_ == "get-message":
+            message = room.by_id.get(data.get("id"))
+            if message is None:
+                await self._send(session, "get-message-reply", id_=id_, error="message not found")
+            else:
+                await self._send(session, "get-message-reply", message, id_=id_)
+
+        else:
+            await self._send(session, type_ + "-reply", id_=id_, error="command not supported by the mock server")
+
+    def kick(self, room: str):
+        """Drops the connection of every session in the room without a closing handshake, as if the
+        network had gone away."""
+        for session in list(self._rooms[room].sessions if room in self._rooms else []):
+            transport = getattr(session.sock, 'transport', None) or session.sock.writer.transport
+            transport.abort()
+
+    async def say(self, room: str, content: str, sender_name: str = "mock-user", parent: Optional[str] = None) -> str:
+        """Posts a message to the room as if a session named sender_name had sent it.
+
+        :returns: The id of the new message
+        :rtype: str"""
+        room_ = self._room(room)
+        message = self._make_message(self._make_view(sender_name), content, parent)
+        room_.remember(message)
+        await self._broadcast(room_, "send-event", message)
+        return message["id"]
+
+    async def flood(self, room: str, rate: float, count: int, senders: int = 10,
+                    contents: Optional[List[str]] = None):
+        """Sends count send-events to every session in the room at about rate messages per second.
+
+        :param str room: The room to post in
+        :param float rate: Messages per second
+        :param int count: How many messages to post in total
+        :param int senders: How many different fake sessions the messages come from
+        :param list contents: The message contents to cycle through"""
+        room_ = self._room(room)
+        views = [self._make_view("flood-{0}".format(i)) for i in range(senders)]
+        contents = contents or ["hello", "!ping", "what's up", "lol"]
+        interval = 1.0 / rate
+        start = time.monotonic()
+        for i in range(count):
+            message = self._make_message(views[i % senders], contents[i % len(contents)])
+            room_.remember(message)
+            await self._broadcast(room_, "send-event", message)
+            delay = start + (i + 1) * interval - time.monotonic()
+            if delay > 0:
+                await asyncio.sleep(delay, loop=self._loop)
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Runs a mock euphoria server for local testing.")
+    parser.add_argument("--host", default="127.0.0.1")
+    parser.add_argument("--port", type=int, default=8765)
+    parser.add_argument("--passcode", default=None)
+    parser.add_argument("--flood-room", default=None, help="a room to post generated messages into")
+    parser.add_argument("--flood-rate", type=float, default=10.0, help="messages per second")
+    parser.add_argument("--flood-count", type=int, default=1000)
+    args = parser.parse_args()
+
+    logging.basicConfig(level=logging.INFO)
+    loop = asyncio.get_event_loop()
+    server = MockServer(args.host, args.port, passcode=args.passcode, loop=loop)
+    loop.run_until_complete(server.start())
+    print("uri_format: " + server.uri_format)
+    if args.flood_room:
+        asyncio.ensure_future(server.flood(args.flood_room, args.flood_rate, args.flood_count), loop=loop)
+    try:
+        loop.run_forever()
+    finally:
+        server.close()
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,116 @@
+# euphoria-py
+# Copyright (C) 2015  Emily A. Bellows
+#
+# This program is free software: you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation, either version 3 of the License, or
+# (at your option) any later version.
+#
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with this program.  If not, see <http://www.gnu.org/licenses/>.
+
+"""A token bucket for outbound commands that backs off when the server says we're throttled"""
+
+__all__ = ['RateLimiter', 'shared_rate_limiter']
+
+
+class RateLimiter:
+    """A token bucket that refills at rate tokens per second, up to burst tokens.
+
+    Every throttled reply multiplies the rate by backoff, down to min_rate. After
+    that the rate climbs back towards max_rate by recovery tokens per second, every second.
+
+    :param float rate: The most commands per second to send
+    :param float burst: How many commands can go out back to back after a quiet spell
+    :param float min_rate: The rate never drops below this
+    :param float backoff: What to multiply the rate by when a reply comes back throttled
+    :param float recovery: How much the rate rises per second after backing off"""
+
+    def __init__(self, rate: float, burst: float = 10.0, min_rate: float = 0.2, backoff: float = 0.5,
+                 recovery: float = 0.1):
+        assert rate > 0, "a rate limiter needs a positive rate"
+        self._max_rate = rate
+        self._rate = rate
+        self._burst = burst
+        self._min_rate = min(min_rate, rate)
+        self._backoff = backoff
+        self._recovery = recovery
+        self._tokens = burst
+        self._updated = None
+        self._throttle_events = 0
+        self._delays = 0
+
+    def __repr__(self):
+        return "<euphoria.RateLimiter rate={0:.2f}/{1:.2f}>".format(self._rate, self._max_rate)
+
+    @property
+    def rate(self) -> float:
+        """The rate currently being enforced, in commands per second.
+
+        :rtype: float"""
+        return self._rate
+
+    @property
+    def max_rate(self) -> float:
+        return self._max_rate
+
+    @property
+    def throttle_events(self) -> int:
+        """How many throttled replies this limiter has backed off for.
+
+        :rtype: int"""
+        return self._throttle_events
+
+    @property
+    def delays(self) -> int:
+        """How many times a command had to wait for a token.
+
+        :rtype: int"""
+        return self._delays
+
+    def _refill(self, now: float):
+        if self._updated is not None:
+            elapsed = now - self._updated
+            if self._rate < self._max_rate:
+                self._rate = min(self._max_rate, self._rate + self._recovery * elapsed)
+            self._tokens = min(self._burst, self._tokens + self._rate * elapsed)
+        self._updated = now
+
+    def try_acquire(self, now: float) -> float:
+        """Takes a token if there is one.
+
+        :param float now: The current time, from the event loop's clock
+        :returns: 0.0 if a token was taken, otherwise how many seconds until one will be available
+        :rtype: float"""
+        self._refill(now)
+        if self._tokens >= 1.0:
+            self._tokens -= 1.0
+            return 0.0
+        self._delays += 1
+        return (1.0 - self._tokens) / self._rate
+
+    def throttled(self, now: float):
+        """Tells the limiter the server said we were throttled, so it slows down and empties the bucket."""
+        self._refill(now)
+        self._throttle_events += 1
+        self._rate = max(self._min_rate, self._rate * self._backoff)
+        self._tokens = 0.0
+
+
+_shared = {}
+
+
+def shared_rate_limiter(key: str, rate: float, burst: float = 10.0) -> RateLimiter:
+    """Returns the RateLimiter registered under key, creating it with the given rate and burst
+    if there isn't one yet. Bots in a borg that share a room share their budget this way.
+
+    :rtype: euphoria.RateLimiter"""
+    limiter = _shared.get(key)
+    if limiter is None:
+        limiter = _shared[key] = RateLimiter(rate, burst)
+    return limiter
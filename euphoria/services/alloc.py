@@ -21,7 +21,7 @@ import os
 import tracemalloc
 
 import tiny_agent
-from euphoria import Bot, Packet
+from euphoria import Bot, Command
 from tiny_agent import Agent
 
 tracemalloc.start()
@@ -61,13 +61,11 @@ class Service(Agent):
     @tiny_agent.init
     def __init__(self, bot: Bot, _: dict):
         super(Service, self).__init__(loop=bot.loop)
-        bot.add_listener(self)
+        bot.add_command_listener(self, ['alloc'])
         self._bot = bot
 
     @tiny_agent.send
-    async def on_packet(self, packet: Packet):
-        send_event = packet.send_event
-        if send_event and send_event.content.startswith("!alloc"):
-            snapshot = tracemalloc.take_snapshot()
-            line = display_top(snapshot)
-            await self._bot.send_content(line, parent=send_event.id)
+    async def on_command(self, command: Command):
+        snapshot = tracemalloc.take_snapshot()
+        line = display_top(snapshot)
+        await self._bot.send_content(line, parent=command.send_event.id)
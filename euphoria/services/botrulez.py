@@ -14,59 +14,51 @@
 # You should have received a copy of the GNU General Public License
 # along with this program.  If not, see <http://www.gnu.org/licenses/>.
 
-"""Implements the !ping, !uptime, !kill, and !restart from https://github.com/jedevc/botrulez"""
+"""Implements the !ping, !uptime, !kill, and !restart from https://github.com/jedevc/botrulez, and a !stats
+command that reports the bot's latencies"""
 
 import datetime
-import re
 
 import tiny_agent
-from euphoria import Bot, Packet
+from euphoria import Bot, Command
 from tiny_agent import Agent
 
 
+def format_stats(stats: dict) -> str:
+    lines = ["/me latency in &{0}, p50 / p99:".format(stats['room'])]
+    for type_, summary in sorted(stats['latency'].items()):
+        lines.append("{0}: {1:.0f}ms / {2:.0f}ms ({3} replies)".format(type_, summary['p50'] * 1000,
+                                                                     summary['p99'] * 1000, summary['count']))
+    ping = stats['ping_interval']
+    lines.append("ping interval: {0:.1f}s / {1:.1f}s, ping-reply turnaround max {2:.0f}ms".format(
+        ping['p50'], ping['p99'], stats['ping_turnaround']['max'] * 1000))
+    return "\n".join(lines)
+
+
 class Service(Agent):
     @tiny_agent.init
     def __init__(self, bot: Bot, _: dict):
         super(Service, self).__init__(loop=bot.loop)
-        bot.add_listener(self)
+        bot.add_command_listener(self, ['ping', 'uptime', 'stats', 'kill', 'restart'])
         self._bot = bot
 
-        self._ping_re = re.compile("!ping @(.*)")
-        self._uptime_re = re.compile("!uptime @(.*)")
-        self._kill_re = re.compile("!kill @(.*)")
-        self._restart_re = re.compile("!restart @(.*)")
-
     @tiny_agent.send
-    async def on_packet(self, packet: Packet):
-        send_event = packet.send_event
-        if not send_event:
+    async def on_command(self, command: Command):
+        if not command.addressed_to(self._bot.current_nick):
             return
+        send_event = command.send_event
 
-        ping_match = self._ping_re.match(send_event.content)
-        if ping_match:
-            if ping_match.group(1) == self._bot.current_nick:
-                await self._bot.send_content("pong!", parent=send_event.id)
-            return
-
-        uptime_match = self._uptime_re.match(send_event.content)
-        if uptime_match:
-            if uptime_match.group(1) != self._bot.current_nick:
-                return
+        if command.name == "ping":
+            await self._bot.send_content("pong!", parent=send_event.id)
 
+        elif command.name == "uptime":
             now = datetime.datetime.now()
             diff = now - self._bot.start_time
             await self._bot.send_content("/me has been up since {0} ({1})".format(self._bot.start_time.ctime(),
                                                                                   str(diff)), parent=send_event.id)
-            return
 
-        kill_match = self._kill_re.match(send_event.content)
-        if kill_match:
-            if kill_match.group(1) == self._bot.current_nick:
-                self._bot.exit()
-                return
+        elif command.name == "stats":
+            await self._bot.send_content(format_stats(self._bot.stats()), parent=send_event.id)
 
-        restart_match = self._restart_re.match(send_event.content)
-        if restart_match:
-            if restart_match.group(1) == self._bot.current_nick:
-                self._bot.exit()
-                return
+        elif command.name in ("kill", "restart"):
+            self._bot.exit()
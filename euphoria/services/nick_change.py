@@ -17,7 +17,7 @@
 """Say '!nick' new_nick to change the bots name to new_nick"""
 
 import tiny_agent
-from euphoria import Bot, Packet
+from euphoria import Bot, Command
 from tiny_agent import Agent
 
 
@@ -25,13 +25,12 @@ class Service(Agent):
     @tiny_agent.init
     def __init__(self, bot: Bot, _: dict):
         super(Service, self).__init__(loop=bot.loop)
-        bot.add_listener(self)
+        bot.add_command_listener(self, ['nick'])
         self._bot = bot
 
     @tiny_agent.send
-    async def on_packet(self, packet: Packet):
-        send_event = packet.send_event
-        if send_event and send_event.content.startswith("!nick"):
-            error = await self._bot.set_desired_nick(send_event.content[6:])
-            if error:
-                self._bot.send_content(error, parent=send_event.id)
+    async def on_command(self, command: Command):
+        send_event = command.send_event
+        error = await self._bot.set_desired_nick(send_event.content[6:])
+        if error:
+            self._bot.send_content(error, parent=send_event.id)
@@ -17,7 +17,7 @@
 import re
 import shelve
 import asyncio
-from euphoria import Bot, Packet
+from euphoria import Bot, Command
 from tiny_agent import Agent
 import tiny_agent
 
@@ -49,14 +49,14 @@ class Service(Agent):
     @tiny_agent.init
     def __init__(self, bot: Bot, config: dict):
         super(Service, self).__init__(loop=bot.loop)
-        bot.add_listener(self)
+        bot.add_command_listener(self, ['quote'])
         self._bot = bot
         assert "db_file" in config, "quote_db must be configured with a distinct filename"
         self._db_file = config["db_file"]
-        self._set_re = re.compile("!quote set (.*)")
-        self._get_re = re.compile("!quote get (.*)")
-        self._del_re = re.compile("!quote delete (.*)")
-        self._find_re = re.compile("!quote find (.*)")
+        self._set_re = re.compile("set (.*)")
+        self._get_re = re.compile("get (.*)")
+        self._del_re = re.compile("delete (.*)")
+        self._find_re = re.compile("find (.*)")
 
     @tiny_agent.send
     async def find(self, regex: str, parent: str):
@@ -85,48 +85,46 @@ class Service(Agent):
             self._bot.send_content('no matches found, sorry', parent=parent)
 
     @tiny_agent.send
-    async def on_packet(self, packet: Packet):
-        send_event = packet.send_event
-        if send_event and send_event.content.startswith("!quote"):
-            set_match = self._set_re.match(send_event.content)
-            if set_match:
-                name = set_match.group(1)
-                parent = await self._bot.send_get_message(send_event.parent)
-                message = parent.data
-                with shelve.open(self._db_file, 'c') as db:
-                    if name in db:
-                        self._bot.send_content("a quote already exists with this name", parent=send_event.id)
-                    else:
-                        db[name] = Quote(sender=message.sender.name, content=message.content, time=message.time)
-                        self._bot.send_content("acknowledged!", parent=send_event.id)
-                return
+    async def on_command(self, command: Command):
+        send_event = command.send_event
+        set_match = self._set_re.match(command.args)
+        if set_match:
+            name = set_match.group(1)
+            message = await self._bot.get_message(send_event.parent)
+            with shelve.open(self._db_file, 'c') as db:
+                if name in db:
+                    self._bot.send_content("a quote already exists with this name", parent=send_event.id)
+                else:
+                    db[name] = Quote(sender=message.sender.name, content=message.content, time=message.time)
+                    self._bot.send_content("acknowledged!", parent=send_event.id)
+            return
 
-            get_match = self._get_re.match(send_event.content)
-            if get_match:
-                name = get_match.group(1)
-                with shelve.open(self._db_file, 'r') as db:
-                    if name in db:
-                        self._bot.send_content(db[name].joined, parent=send_event.id)
-                    else:
-                        self._bot.send_content("sorry, no quote exists with that name", parent=send_event.id)
-                return
+        get_match = self._get_re.match(command.args)
+        if get_match:
+            name = get_match.group(1)
+            with shelve.open(self._db_file, 'r') as db:
+                if name in db:
+                    self._bot.send_content(db[name].joined, parent=send_event.id)
+                else:
+                    self._bot.send_content("sorry, no quote exists with that name", parent=send_event.id)
+            return
 
-            del_match = self._del_re.match(send_event.content)
-            if del_match:
-                name = del_match.group(1)
-                with shelve.open(self._db_file, 'w') as db:
-                    if name in db:
-                        del db[name]
-                        self._bot.send_content("quote deleted", parent=send_event.id)
-                    else:
-                        self._bot.send_content("sorry, no quote exists with that name", parent=send_event.id)
-                return
+        del_match = self._del_re.match(command.args)
+        if del_match:
+            name = del_match.group(1)
+            with shelve.open(self._db_file, 'w') as db:
+                if name in db:
+                    del db[name]
+                    self._bot.send_content("quote deleted", parent=send_event.id)
+                else:
+                    self._bot.send_content("sorry, no quote exists with that name", parent=send_event.id)
+            return
 
-            find_match = self._find_re.match(send_event.content)
-            if find_match:
-                regex = find_match.group(1)
-                self.find(regex, send_event.id)
-                return
+        find_match = self._find_re.match(command.args)
+        if find_match:
+            regex = find_match.group(1)
+            self.find(regex, send_event.id)
+            return
 
-            self._bot.send_content("usage: !quote [ set | get | delete ] quote_name\n"
-                                   "usage: !quote find text_or_regex", parent=send_event.id)
+        self._bot.send_content("usage: !quote [ set | get | delete ] quote_name\n"
+                               "usage: !quote find text_or_regex", parent=send_event.id)
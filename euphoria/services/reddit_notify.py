@@ -18,13 +18,13 @@ import asyncio
 import logging
 import re
 import threading
-from typing import List
+from typing import List, Optional
 
 import praw
 
 import tiny_agent
 from euphoria import Bot
-from tiny_agent import Agent
+from tiny_agent import Agent, timer_wheel
 
 logger = logging.getLogger(__name__)
 
@@ -67,6 +67,9 @@ class Service(Agent):
     def __init__(self, bot: Bot, config: dict):
         super(Service, self).__init__(loop=bot.loop)
         self._bot = bot
+        self._timers = timer_wheel(bot.loop)
+        self._new_threads_timer = None
+        self._update_timers = {}
         self._init(config)
 
     @tiny_agent.send
@@ -82,10 +85,7 @@ class Service(Agent):
         self._watchers = []
 
         if self._threading:
-            async def reset_in_a_day():
-                await asyncio.sleep(self._hours_per_thread * 60 * 60)  # seconds in day
-                raise Exception("restarting reddit_notify")
-            self.spawn_linked_task(reset_in_a_day())
+            self._new_threads_timer = self._timers.schedule(self._hours_per_thread * 60 * 60, self._new_threads)
 
         while not self._bot.connected:
             await asyncio.sleep(1)
@@ -103,6 +103,10 @@ class Service(Agent):
             self._update_watcher(watcher)
             await asyncio.sleep(2.0)
 
+    @tiny_agent.send
+    async def _new_threads(self):
+        raise Exception("restarting reddit_notify")
+
     @tiny_agent.send
     async def _update_watcher(self, watcher: SubredditWatcher):
         out = []
@@ -117,8 +121,15 @@ class Service(Agent):
             else:
                 self._bot.send_content(msg)  # no parent
 
-        async def update_again():
-            await asyncio.sleep(30.0)
-            self._update_watcher(watcher)
-
-        self.spawn_linked_task(update_again())
+        timer = self._update_timers.get(watcher)
+        if timer is None:
+            self._update_timers[watcher] = self._timers.schedule(30.0, self._update_watcher, watcher)
+        else:
+            timer.reschedule(30.0)
+
+    def exit(self, exc: Optional[Exception] = None):
+        super(Service, self).exit(exc)
+        if self._new_threads_timer is not None:
+            self._new_threads_timer.cancel()
+        for timer in self._update_timers.values():
+            timer.cancel()
@@ -14,38 +14,237 @@
 # You should have received a copy of the GNU General Public License
 # along with this program.  If not, see <http://www.gnu.org/licenses/>.
 
-"""Say '!remind 15m eat food' to be reminded in 15 minutes to eat food"""
+"""Say '!remind 15m eat food' to be reminded in 15 minutes to eat food. The delay can also be
+in seconds, hours or days, like 30s, 2h or 1d. '!reminders' lists yours, and '!remind cancel 12'
+cancels number 12.
+
+Reminders are kept in a sqlite database, the db_file option, so they survive restarts."""
 
 import asyncio
+import heapq
+import logging
 import re
+import sqlite3
+import time
+from typing import List, Optional, Tuple
 
 import tiny_agent
-from euphoria import Bot, Packet
+from euphoria import Bot, Command, Disconnected, EuphoriaException, Packet
 from tiny_agent import Agent
 
+logger = logging.getLogger(__name__)
+
+UNITS = {'s': 1, 'm': 60, 'h': 60 * 60, 'd': 24 * 60 * 60}
+
+# The scheduler only keeps reminders due within this many seconds in memory, and fetches the next slice when it's up.
+HORIZON = 60 * 60
+# How many due reminders to fetch from the database at once.
+BATCH = 50
+# Seconds to wait before trying again to deliver a reminder the server didn't accept.
+RETRY_DELAY = 30.0
+
+_SCHEMA = """
+CREATE TABLE IF NOT EXISTS reminders (
+    id INTEGER PRIMARY KEY,
+    owner TEXT NOT NULL,
+    due REAL NOT NULL,
+    sender_id TEXT NOT NULL,
+    sender_name TEXT NOT NULL,
+    text TEXT NOT NULL
+);
+CREATE INDEX IF NOT EXISTS reminders_by_due ON reminders (owner, due);
+CREATE INDEX IF NOT EXISTS reminders_by_sender ON reminders (owner, sender_id, due);
+"""
+
+
+def parse_delay(amount: str, unit: str) -> float:
+    """Turns an amount and one of s, m, h or d into seconds.
+
+    :rtype: float"""
+    return float(amount) * UNITS[unit]
+
+
+def format_delay(seconds: float) -> str:
+    """Rounds a number of seconds to its two largest units, like '2d 3h' or '5m 10s'.
+
+    :rtype: str"""
+    seconds = max(0, int(seconds))
+    parts = []
+    for unit in 'dhms':
+        count, seconds = divmod(seconds, UNITS[unit])
+        if count or (unit == 's' and not parts):
+            parts.append("{0}{1}".format(count, unit))
+    return " ".join(parts[:2])
+
+
+class ReminderStore:
+    """The reminders of one bot, in a sqlite database indexed by due time and by sender.
+
+    :param str path: The database file, created if it doesn't exist
+    :param str owner: Keeps apart the reminders of bots sharing a file"""
+
+    def __init__(self, path: str, owner: str):
+        self._db = sqlite3.connect(path)
+        self._db.executescript(_SCHEMA)
+        self._owner = owner
+
+    def __repr__(self):
+        return "<ReminderStore owner='{0}'>".format(self._owner)
+
+    def add(self, due: float, sender_id: str, sender_name: str, text: str) -> int:
+        """Stores a reminder due at the unix time due, and returns its id.
+
+        :rtype: int"""
+        with self._db:
+            cursor = self._db.execute(
+                "INSERT INTO reminders (owner, due, sender_id, sender_name, text) VALUES (?, ?, ?, ?, ?)",
+                (self._owner, due, sender_id, sender_name, text))
+        return cursor.lastrowid
 
-async def chill_and_respond(bot: Bot, length: int, msg: str):
-    await asyncio.sleep(length, loop=bot.loop)
-    bot.send_content(msg)
+    def due_between(self, start: float, end: float) -> List[Tuple[float, int]]:
+        """Returns (due, id) for every reminder due at or after start and before end.
+
+        :rtype: list"""
+        return self._db.execute("SELECT due, id FROM reminders WHERE owner = ? AND due >= ? AND due < ?",
+                                (self._owner, start, end)).fetchall()
+
+    def fetch(self, ids: List[int]) -> List[Tuple[int, str, str]]:
+        """Returns (id, sender_name, text) for those of the given reminders that are still there.
+
+        :rtype: list"""
+        marks = ",".join("?" * len(ids))
+        return self._db.execute("SELECT id, sender_name, text FROM reminders WHERE owner = ? AND id IN ({0}) "
+                                "ORDER BY due".format(marks), [self._owner] + ids).fetchall()
+
+    def remove(self, id_: int):
+        """Deletes a reminder once it has been delivered."""
+        with self._db:
+            self._db.execute("DELETE FROM reminders WHERE id = ? AND owner = ?", (id_, self._owner))
+
+    def for_sender(self, sender_id: str, limit: int = 10) -> List[Tuple[int, float, str]]:
+        """Returns (id, due, text) for the next reminders of one sender, soonest first.
+
+        :rtype: list"""
+        return self._db.execute("SELECT id, due, text FROM reminders WHERE owner = ? AND sender_id = ? "
+                                "ORDER BY due LIMIT ?", (self._owner, sender_id, limit)).fetchall()
+
+    def cancel(self, id_: int, sender_id: str) -> bool:
+        """Deletes one of a sender's reminders, returns False if they have no reminder with that id.
+
+        :rtype: bool"""
+        with self._db:
+            cursor = self._db.execute("DELETE FROM reminders WHERE id = ? AND owner = ? AND sender_id = ?",
+                                      (id_, self._owner, sender_id))
+        return cursor.rowcount > 0
+
+    def close(self):
+        self._db.close()
 
 
 class Service(Agent):
     @tiny_agent.init
-    def __init__(self, bot: Bot, _: dict):
+    def __init__(self, bot: Bot, config: dict):
         super(Service, self).__init__(loop=bot.loop)
-        bot.add_listener(self)
+        bot.add_command_listener(self, ['remind', 'reminders'])
+        bot.add_listener(self, ['snapshot-event'])
         self._bot = bot
-        self._minute_re = re.compile("!remind (\d+)m (.*)")
+        owner = "{0}/{1}".format(bot.config.room, bot.config.nick)
+        self._store = ReminderStore(config.get("db_file", "reminders.sqlite3"), owner)
+        self._heap = []  # (due, id) of every reminder due before the horizon
+        self._horizon = None
+        self._wakeup = asyncio.Event(loop=bot.loop)
+        self._joined = asyncio.Event(loop=bot.loop)  # set by every snapshot-event, cleared when a send is Disconnected
+        if bot.joined:
+            self._joined.set()  # we were restarted, and the snapshot went by before we were listening
+        self._remind_re = re.compile(r"(\d+(?:\.\d+)?)([smhd]) (.*)", re.DOTALL)
+        self._cancel_re = re.compile(r"cancel (\d+)")
+        self.spawn_linked_task(self._schedule())
 
     @tiny_agent.send
     async def on_packet(self, packet: Packet):
-        send_event = packet.send_event
-        if send_event and send_event.content.startswith("!remind"):
-            match = self._minute_re.match(send_event.content)
-            if match:
-                minutes = float(match.group(1))
-                msg = "reminder @{0}: {1}".format(send_event.sender.name, match.group(2))
-                self.spawn_linked_task(chill_and_respond(self._bot, minutes * 60, msg), unlink_on_success=True)
-                await self._bot.send_content("acknowledged!", parent=send_event.id)
+        self._joined.set()
+
+    @tiny_agent.send
+    async def on_command(self, command: Command):
+        send_event = command.send_event
+        if command.name == "reminders":
+            self._list(send_event)
+        else:
+            cancel_match = self._cancel_re.match(command.args)
+            remind_match = self._remind_re.match(command.args)
+            if cancel_match:
+                if self._store.cancel(int(cancel_match.group(1)), send_event.sender.id):
+                    await self._bot.send_content("cancelled!", parent=send_event.id)
+                else:
+                    await self._bot.send_content("you don't have a reminder with that number", parent=send_event.id)
+            elif remind_match:
+                due = time.time() + parse_delay(remind_match.group(1), remind_match.group(2))
+                id_ = self._store.add(due, send_event.sender.id, send_event.sender.name, remind_match.group(3))
+                if self._horizon is not None and due < self._horizon:
+                    heapq.heappush(self._heap, (due, id_))
+                    self._wakeup.set()
+                await self._bot.send_content("acknowledged! (cancel with !remind cancel {0})".format(id_),
+                                             parent=send_event.id)
             else:
-                await self._bot.send_content("usage: !remind 15m go on a walk", parent=send_event.id)
+                await self._bot.send_content("usage: !remind 15m go on a walk, with s, m, h or d",
+                                             parent=send_event.id)
+
+    def _list(self, send_event):
+        reminders = self._store.for_sender(send_event.sender.id)
+        if not reminders:
+            self._bot.send_content("you have no reminders", parent=send_event.id)
+            return
+        now = time.time()
+        lines = ["{0}: in {1}, {2}".format(id_, format_delay(due - now), text) for id_, due, text in reminders]
+        self._bot.send_content("\n".join(lines), parent=send_event.id)
+
+    async def _schedule(self):
+        # Sleeps until the next reminder is due or the horizon passes, whichever is first. Nothing
+        # is sent until we've joined the room, so reminders that came due while we were away wait for us.
+        while True:
+            await self._joined.wait()
+            now = time.time()
+            if self._horizon is None or now >= self._horizon:
+                start = float('-inf') if self._horizon is None else self._horizon
+                self._horizon = now + HORIZON
+                for entry in self._store.due_between(start, self._horizon):
+                    heapq.heappush(self._heap, entry)
+            await self._fire(now)
+            wake = min(self._heap[0][0], self._horizon) if self._heap else self._horizon
+            self._wakeup.clear()
+            try:
+                await asyncio.wait_for(self._wakeup.wait(), max(0.0, wake - time.time()), loop=self.loop)
+            except asyncio.TimeoutError:
+                pass
+
+    async def _fire(self, now: float):
+        heap = self._heap
+        while heap and heap[0][0] <= now and self._joined.is_set():
+            ids = []
+            while heap and heap[0][0] <= now and len(ids) < BATCH:
+                ids.append(heapq.heappop(heap)[1])
+            reminders = self._store.fetch(ids)
+            await asyncio.gather(*[self._deliver(id_, sender_name, text) for id_, sender_name, text in reminders],
+                                 loop=self.loop)
+
+    async def _deliver(self, id_: int, sender_name: str, text: str):
+        # A reminder only leaves the database once the server has accepted it, otherwise it's tried again.
+        try:
+            packet = await self._bot.send_content("reminder @{0}: {1}".format(sender_name, text))
+            error = packet.error
+        except Disconnected as exc:
+            self._joined.clear()
+            error = exc
+        except EuphoriaException as exc:
+            error = exc
+        if error:
+            logger.info("%s couldn't deliver reminder %d because %s, will try again", self, id_, error)
+            heapq.heappush(self._heap, (time.time() + RETRY_DELAY, id_))
+        else:
+            self._store.remove(id_)
+
+    def exit(self, exc: Optional[Exception] = None):
+        super(Service, self).exit(exc)
+        store = getattr(self, '_store', None)  # we might not have gotten that far in __init__
+        if store is not None:
+            store.close()
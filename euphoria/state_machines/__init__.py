@@ -15,5 +15,9 @@
 # along with this program.  If not, see <http://www.gnu.org/licenses/>.
 
 from .nick_and_auth import *
+# noinspection PyUnresolvedReferences
+from .room_state import *
+# noinspection PyUnresolvedReferences
+from .message_cache import *
 
-__all__ = nick_and_auth.__all__
+__all__ = nick_and_auth.__all__ + room_state.__all__ + message_cache.__all__
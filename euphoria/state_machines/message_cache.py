@@ -0,0 +1,203 @@
+# euphoria-py
+# Copyright (C) 2015  Emily A. Bellows
+#
+# This program is free software: you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation, either version 3 of the License, or
+# (at your option) any later version.
+#
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with this program.  If not, see <http://www.gnu.org/licenses/>.
+
+"""Remembering recent messages and the reply trees they form."""
+
+import logging
+from asyncio import AbstractEventLoop
+from bisect import bisect_left, insort
+from collections import OrderedDict
+from typing import List, Optional
+
+import tiny_agent
+from euphoria import Client, Packet, Message
+from tiny_agent import Agent
+
+logger = logging.getLogger(__name__)
+
+__all__ = ['MessageCache']
+
+
+class MessageCache(Agent):
+    """Keeps up to max_size messages from snapshots, logs, send-events, our own sends, edits and
+    get-message replies, indexed by id, by parent and by time.
+
+    Messages are forgotten a whole thread at a time: each subtree of cached messages whose root's
+    parent isn't cached is one unit, reading any message in it counts as using it, and the least
+    recently used subtree goes first. Lookups read the indexes directly rather than going through
+    the mailbox, like :py:class:`euphoria.RoomState`.
+
+    :param client: The client to listen to and to fetch missing messages with
+    :param int max_size: The most messages to keep
+    :param loop: The event loop to run on"""
+
+    @tiny_agent.init
+    def __init__(self, client: Client, max_size: int = 1000, loop: AbstractEventLoop = None):
+        super(MessageCache, self).__init__(loop=loop)
+        self._client = client
+        self._client.add_listener(self, ['snapshot-event', 'log-reply', 'send-event', 'send-reply',
+                                         'edit-message-event', 'get-message-reply'])
+        self._max_size = max_size
+        self._messages = {}  # id -> message
+        self._children = {}  # parent id -> ids of its cached replies, as the keys of a dict
+        self._roots = OrderedDict()  # ids of the cached messages whose parent isn't, least recently used first
+        self._times = []  # (time, id) of every cached message, sorted
+        self._hits = 0
+        self._misses = 0
+        self._evictions = 0
+
+    def __len__(self) -> int:
+        return len(self._messages)
+
+    def __contains__(self, id_: str) -> bool:
+        return id_ in self._messages
+
+    @property
+    def max_size(self) -> int:
+        return self._max_size
+
+    @property
+    def hits(self) -> int:
+        """How many times get_message was answered without asking the server.
+
+        :rtype: int"""
+        return self._hits
+
+    @property
+    def misses(self) -> int:
+        """How many times get_message had to ask the server.
+
+        :rtype: int"""
+        return self._misses
+
+    @property
+    def evictions(self) -> int:
+        """How many messages have been forgotten to stay within max_size.
+
+        :rtype: int"""
+        return self._evictions
+
+    def message(self, id_: str) -> Optional[Message]:
+        """Returns the message with this id if it's cached, otherwise None.
+
+        :rtype: euphoria.Message"""
+        message = self._messages.get(id_)
+        if message is not None:
+            self._roots.move_to_end(self._root(id_))
+        return message
+
+    def children(self, id_: str) -> List[Message]:
+        """Returns the cached replies to a message, oldest first.
+
+        :rtype: list"""
+        return [self._messages[child] for child in sorted(self._children.get(id_, ()))]
+
+    def thread(self, id_: str) -> List[Message]:
+        """Returns a cached message followed by every cached reply under it, in the order they'd be
+        shown in a threaded view. Empty if the message isn't cached.
+
+        :rtype: list"""
+        if self.message(id_) is None:
+            return []
+        thread = []
+        stack = [id_]
+        while stack:
+            current = stack.pop()
+            thread.append(self._messages[current])
+            stack.extend(sorted(self._children.get(current, ()), reverse=True))
+        return thread
+
+    def between(self, start: int, end: int) -> List[Message]:
+        """Returns the cached messages posted at or after start and before end, as unix timestamps, oldest first.
+
+        :rtype: list"""
+        times = self._times
+        i = bisect_left(times, (start, ""))
+        j = bisect_left(times, (end, ""))
+        return [self._messages[id_] for _, id_ in times[i:j]]
+
+    async def get_message(self, id_: str) -> Message:
+        """Returns the message with this id, only asking the server for it if it isn't cached.
+
+        :raises euphoria.ErrorResponse: if the server couldn't find it
+        :rtype: euphoria.Message"""
+        message = self.message(id_)
+        if message is not None:
+            self._hits += 1
+            return message
+        self._misses += 1
+        packet = await self._client.send_get_message(id_)
+        return packet.data  # the reply reaches on_packet too, so the message is cached from here on
+
+    @tiny_agent.batch
+    async def on_packet(self, packets: List[Packet]):
+        for packet in packets:
+            if packet.error:
+                continue
+            type_ = packet.type
+            if type_ == 'snapshot-event':
+                for message in packet.snapshot_event.log:
+                    self._insert(message)
+            elif type_ == 'log-reply':
+                for message in packet.log_reply.log:
+                    self._insert(message)
+            else:
+                self._insert(packet.data)
+        while len(self._messages) > self._max_size and self._roots:
+            self._evict()
+
+    def _root(self, id_: str) -> str:
+        messages = self._messages
+        parent = messages[id_].parent
+        while parent and parent in messages:
+            id_, parent = parent, messages[parent].parent
+        return id_
+
+    def _insert(self, message: Message):
+        id_ = message.id
+        messages = self._messages
+        if id_ in messages:
+            messages[id_] = message  # an edit, or a message we had already
+            self._roots.move_to_end(self._root(id_))
+            return
+        messages[id_] = message
+        insort(self._times, (message.time, id_))
+        for child in self._children.get(id_, ()):
+            del self._roots[child]  # their subtrees hang off this message now
+        parent = message.parent
+        if parent:
+            self._children.setdefault(parent, {})[id_] = None
+        if parent and parent in messages:
+            self._roots.move_to_end(self._root(parent))
+        else:
+            self._roots[id_] = None
+
+    def _evict(self):
+        root, _ = self._roots.popitem(last=False)
+        parent = self._messages[root].parent
+        if parent:
+            # The parent isn't cached, but its entry still lists any other replies to it that are.
+            siblings = self._children[parent]
+            del siblings[root]
+            if not siblings:
+                del self._children[parent]
+        stack = [root]
+        while stack:
+            id_ = stack.pop()
+            message = self._messages.pop(id_)
+            stack.extend(self._children.pop(id_, ()))
+            del self._times[bisect_left(self._times, (message.time, id_))]
+            self._evictions += 1
@@ -21,7 +21,7 @@ from asyncio import AbstractEventLoop
 from typing import Optional
 
 import tiny_agent
-from euphoria import Client, Packet
+from euphoria import Client, Packet, EuphoriaException
 from tiny_agent import Agent
 
 logger = logging.getLogger(__name__)
@@ -34,7 +34,7 @@ class NickAndAuth(Agent):
     def __init__(self, client: Client, desired_nick: str, passcode: str = "", loop: AbstractEventLoop = None):
         super(NickAndAuth, self).__init__(loop=loop)
         self._client = client
-        self._client.add_listener(self)
+        self._client.add_listener(self, ['hello-event', 'bounce-event'])
 
         self._desired_nick = desired_nick
         self._current_nick = ""
@@ -60,7 +60,10 @@ class NickAndAuth(Agent):
     @tiny_agent.call
     async def set_desired_nick(self, new_nick: str) -> Optional[str]:
         self._desired_nick = new_nick
-        packet = await self._client.send_nick(new_nick)
+        try:
+            packet = await self._client.send_nick(new_nick)
+        except EuphoriaException as exc:
+            return str(exc)
         if packet.error:
             return packet.error
         else:
@@ -72,7 +75,10 @@ class NickAndAuth(Agent):
     @tiny_agent.call
     async def set_passcode(self, new_passcode: str) -> Optional[str]:
         self._passcode = new_passcode
-        packet = await self._client.send_auth(new_passcode)
+        try:
+            packet = await self._client.send_auth(new_passcode)
+        except EuphoriaException as exc:
+            return str(exc)
         if packet.error:
             return packet.error
         else:
@@ -0,0 +1,214 @@
+# euphoria-py
+# Copyright (C) 2015  Emily A. Bellows
+#
+# This program is free software: you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation, either version 3 of the License, or
+# (at your option) any later version.
+#
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with this program.  If not, see <http://www.gnu.org/licenses/>.
+
+"""Keeping track of who is in the room."""
+
+import logging
+from asyncio import AbstractEventLoop
+from typing import Dict, List, Optional
+
+import tiny_agent
+from euphoria import Client, Packet, SessionView
+from tiny_agent import Agent
+
+logger = logging.getLogger(__name__)
+
+__all__ = ['RoomState', 'RoomChange', 'normalize_nick']
+
+JOINED = 'join'
+PARTED = 'part'
+RENAMED = 'nick'
+RESET = 'snapshot'
+
+
+def normalize_nick(nick: str) -> str:
+    """Returns the form of a nick that @mentions of it match, with whitespace removed and case folded.
+
+    :rtype: str"""
+    return "".join(nick.split()).casefold()
+
+
+def _view(view, name: str) -> SessionView:
+    # A SessionView copy of a session, a JoinEvent or a renamed view, under the given name.
+    return SessionView({'id': view.id, 'name': name, 'server_id': view.server_id, 'server_era': view.server_era,
+                        'session_id': view.session_id, 'is_staff': view.is_staff, 'is_manager': view.is_manager})
+
+
+class RoomChange:
+    """Tells a :py:class:`euphoria.RoomState` listener what just changed.
+
+    :param str kind: 'join', 'part', 'nick', or 'snapshot' when the whole listing was replaced
+    :param session: The :py:class:`euphoria.SessionView` that joined, left or was renamed, None for a snapshot
+    :param previous: The view from before a rename, otherwise None"""
+
+    __slots__ = ['kind', 'session', 'previous']
+
+    def __init__(self, kind: str, session: Optional[SessionView] = None, previous: Optional[SessionView] = None):
+        self.kind = kind
+        self.session = session
+        self.previous = previous
+
+    def __repr__(self):
+        return "<euphoria.RoomChange kind='{0}' name={1!r}>".format(
+            self.kind, self.session.name if self.session is not None else None)
+
+
+class RoomState(Agent):
+    """Keeps the listing of the room up to date from snapshots, joins, parts and nick changes, so
+    sessions can be looked up by session id, agent id or nick without asking the server.
+
+    Lookups read the indexes directly rather than going through the mailbox, like the properties
+    of :py:class:`euphoria.NickAndAuth`. Our own session isn't in the listing, see own_session."""
+
+    @tiny_agent.init
+    def __init__(self, client: Client, loop: AbstractEventLoop = None):
+        super(RoomState, self).__init__(loop=loop)
+        self._client = client
+        self._client.add_listener(self, ['hello-event', 'snapshot-event', 'join-event', 'part-event',
+                                         'nick-event', 'nick-reply', 'network-event'])
+        self._own = None
+        self._sessions = {}  # type: Dict[str, SessionView]
+        self._by_agent = {}  # type: Dict[str, Dict[str, SessionView]]
+        self._by_nick = {}  # type: Dict[str, Dict[str, SessionView]]
+        self._listeners = set()
+
+    def __len__(self) -> int:
+        return len(self._sessions)
+
+    @property
+    def own_session(self) -> Optional[SessionView]:
+        """Our own session, from the hello-event and kept renamed as our nick changes.
+
+        :rtype: euphoria.SessionView"""
+        return self._own
+
+    @property
+    def sessions(self) -> List[SessionView]:
+        """Every other session in the room.
+
+        :rtype: list"""
+        return list(self._sessions.values())
+
+    @property
+    def nicks(self) -> List[str]:
+        """The names in use in the room, sorted and without duplicates. Lurkers have no name and are left out.
+
+        :rtype: list"""
+        return sorted(set(view.name for view in self._sessions.values() if view.name))
+
+    def session(self, session_id: str) -> Optional[SessionView]:
+        """Returns the session with this id, or None if it isn't in the room.
+
+        :rtype: euphoria.SessionView"""
+        return self._sessions.get(session_id)
+
+    def sessions_of(self, agent_id: str) -> List[SessionView]:
+        """Returns every session the agent or account with this id has in the room.
+
+        :rtype: list"""
+        return list(self._by_agent.get(agent_id, {}).values())
+
+    def with_nick(self, nick: str) -> List[SessionView]:
+        """Returns the sessions whose name an @mention of nick would match.
+
+        :rtype: list"""
+        return list(self._by_nick.get(normalize_nick(nick), {}).values())
+
+    def add_listener(self, listener: Agent):
+        """Registers an agent to have its on_room_change method called with a :py:class:`euphoria.RoomChange`
+        every time someone joins, leaves or changes their nick, until it exits."""
+        self._listeners.add(listener)
+
+    @tiny_agent.send
+    async def on_packet(self, packet: Packet):
+        type_ = packet.type
+        if type_ == 'join-event':
+            view = _view(packet.join_event, packet.join_event.name)
+            self._add(view)
+            self._notify(RoomChange(JOINED, view))
+        elif type_ == 'part-event':
+            view = self._remove(packet.part_event.session_id)
+            if view is not None:
+                self._notify(RoomChange(PARTED, view))
+        elif type_ == 'nick-event':
+            self._rename(packet.nick_event.session_id, packet.nick_event.to)
+        elif type_ == 'nick-reply':
+            if not packet.error and self._own is not None:
+                self._own = _view(self._own, packet.nick_reply.to)
+        elif type_ == 'snapshot-event':
+            self._reset(packet.snapshot_event.listing)
+        elif type_ == 'hello-event':
+            self._own = packet.hello_event.session
+        elif type_ == 'network-event':
+            network_event = packet.network_event
+            if network_event.type == 'partition':
+                self._partition(network_event.server_id, network_event.server_era)
+
+    def _add(self, view: SessionView):
+        if view.session_id in self._sessions:
+            self._remove(view.session_id)
+        self._sessions[view.session_id] = view
+        self._by_agent.setdefault(view.id, {})[view.session_id] = view
+        self._by_nick.setdefault(normalize_nick(view.name), {})[view.session_id] = view
+
+    def _remove(self, session_id: str) -> Optional[SessionView]:
+        view = self._sessions.pop(session_id, None)
+        if view is not None:
+            self._unindex(self._by_agent, view.id, session_id)
+            self._unindex(self._by_nick, normalize_nick(view.name), session_id)
+        return view
+
+    @staticmethod
+    def _unindex(index: Dict[str, Dict[str, SessionView]], key: str, session_id: str):
+        views = index.get(key)
+        if views is not None:
+            views.pop(session_id, None)
+            if not views:
+                del index[key]
+
+    def _rename(self, session_id: str, name: str):
+        previous = self._sessions.get(session_id)
+        if previous is None:
+            logger.debug("%s got a nick change for %s, who isn't in the listing", self, session_id)
+            return
+        view = _view(previous, name)
+        self._add(view)
+        self._notify(RoomChange(RENAMED, view, previous))
+
+    def _reset(self, listing: List[SessionView]):
+        self._sessions.clear()
+        self._by_agent.clear()
+        self._by_nick.clear()
+        for view in listing:
+            self._add(view)
+        self._notify(RoomChange(RESET))
+
+    def _partition(self, server_id: str, server_era: str):
+        # Everyone connected through the server that went away left with it.
+        gone = [view.session_id for view in self._sessions.values()
+                if view.server_id == server_id and view.server_era == server_era]
+        for session_id in gone:
+            self._notify(RoomChange(PARTED, self._remove(session_id)))
+
+    def _notify(self, change: RoomChange):
+        to_remove = []
+        for listener in self._listeners:
+            if listener.alive:
+                listener.on_room_change(change)
+            else:
+                to_remove.append(listener)
+        for listener in to_remove:
+            self._listeners.remove(listener)
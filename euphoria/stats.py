@@ -0,0 +1,108 @@
+# euphoria-py
+# Copyright (C) 2015  Emily A. Bellows
+#
+# This program is free software: you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation, either version 3 of the License, or
+# (at your option) any later version.
+#
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with this program.  If not, see <http://www.gnu.org/licenses/>.
+
+"""Fixed-size histograms for the latencies a Client measures"""
+
+from array import array
+from bisect import bisect_left
+from typing import List
+
+__all__ = ['Histogram']
+
+# Bucket upper bounds in seconds, each about 1.41 times the last, from half a millisecond to about 90 seconds.
+DEFAULT_BOUNDS = tuple(0.0005 * 2 ** (i / 2) for i in range(36))
+
+
+class Histogram:
+    """Counts samples into a fixed set of buckets, so it stays the same size however many
+    samples it sees. Quantiles are accurate to within one bucket.
+
+    :param bounds: The ascending upper bounds of the buckets, anything above the last goes in an overflow bucket"""
+
+    __slots__ = ['_bounds', '_counts', '_count', '_sum', '_max']
+
+    def __init__(self, bounds: List[float] = DEFAULT_BOUNDS):
+        self._bounds = bounds
+        self._counts = array('L', [0] * (len(bounds) + 1))
+        self._count = 0
+        self._sum = 0.0
+        self._max = 0.0
+
+    def __repr__(self):
+        return "<euphoria.Histogram count={0} p50={1:.4f} p99={2:.4f}>".format(self._count, self.quantile(0.5),
+                                                                           self.quantile(0.99))
+
+    def record(self, value: float):
+        self._counts[bisect_left(self._bounds, value)] += 1
+        self._count += 1
+        self._sum += value
+        if value > self._max:
+            self._max = value
+
+    @property
+    def bounds(self) -> List[float]:
+        return self._bounds
+
+    @property
+    def counts(self) -> array:
+        """How many samples fell in each bucket, the last one being the overflow bucket.
+
+        :rtype: array.array"""
+        return self._counts
+
+    @property
+    def count(self) -> int:
+        return self._count
+
+    @property
+    def sum(self) -> float:
+        return self._sum
+
+    @property
+    def max(self) -> float:
+        return self._max
+
+    @property
+    def mean(self) -> float:
+        return self._sum / self._count if self._count else 0.0
+
+    def quantile(self, q: float) -> float:
+        """Returns the upper bound of the bucket the q-th quantile falls in, or the largest sample
+        if that's smaller. 0.0 if nothing has been recorded.
+
+        :param float q: Between 0.0 and 1.0, 0.99 for the 99th percentile
+        :rtype: float"""
+        if not self._count:
+            return 0.0
+        rank = q * self._count
+        seen = 0
+        for i, n in enumerate(self._counts):
+            seen += n
+            if seen >= rank and n:
+                if i < len(self._bounds):
+                    return min(self._bounds[i], self._max)
+                break
+        return self._max
+
+    def summary(self) -> dict:
+        """Returns the count, mean, p50, p99 and max, for logging or sending somewhere.
+
+        :rtype: dict"""
+        return {'count': self._count,
+                'mean': self.mean,
+                'p50': self.quantile(0.5),
+                'p99': self.quantile(0.99),
+                'max': self._max}
@@ -0,0 +1,61 @@
+# euphoria-py
+# Copyright (C) 2015  Emily A. Bellows
+#
+# This program is free software: you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation, either version 3 of the License, or
+# (at your option) any later version.
+#
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with this program.  If not, see <http://www.gnu.org/licenses/>.
+
+"""Compares the installed JSON codecs, run with 'python -m euphoria.test.bench_codec'"""
+
+from euphoria import Packet, get_codec, available_codecs
+from euphoria.test.corpus import make_frames
+from tiny_agent.test.bench import best_of
+
+
+def main():
+    frames = make_frames()
+    as_bytes = [frame.encode('utf-8') for frame in frames]
+    commands = [{"type": "send", "id": str(i), "data": {"content": "reminder @someone: eat food", "parent": "00a0001"}}
+                for i in range(len(frames))]
+    print("{0} frames ({1} KiB), {2} outgoing commands".format(len(frames), sum(map(len, as_bytes)) // 1024,
+                                                                len(commands)))
+
+    for name in available_codecs():
+        codec = get_codec(name)
+        loads, dumps = codec.loads, codec.dumps
+
+        def parse_str():
+            for frame in frames:
+                loads(frame)
+
+        def parse_bytes():
+            for frame in as_bytes:
+                loads(frame)
+
+        def parse_and_decode():
+            for frame in frames:
+                Packet(loads(frame))
+
+        def serialize():
+            for command in commands:
+                dumps(command)
+
+        print("{0:<8} loads(str): {1:>9.0f}/s  loads(bytes): {2:>9.0f}/s  loads+Packet: {3:>9.0f}/s  "
+              "dumps: {4:>9.0f}/s".format(name,
+                                          len(frames) / best_of(parse_str),
+                                          len(frames) / best_of(parse_bytes),
+                                          len(frames) / best_of(parse_and_decode),
+                                          len(commands) / best_of(serialize)))
+
+
+if __name__ == '__main__':
+    main()
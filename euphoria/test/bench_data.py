@@ -0,0 +1,177 @@
+# euphoria-py
+# Copyright (C) 2015  Emily A. Bellows
+#
+# This program is free software: you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation, either version 3 of the License, or
+# (at your option) any later version.
+#
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with this program.  If not, see <http://www.gnu.org/licenses/>.
+
+"""Compares the generated data classes against hand-written property classes,
+run with 'python -m euphoria.test.bench_data'
+
+Both constructors do the same straight-line assignments, so construction
+should come out about even, within run to run noise. The generated
+classes win when fields are read."""
+
+import json
+
+from euphoria import SendEvent, SnapshotEvent, LogReply
+from euphoria.test.corpus import make_frames
+from tiny_agent.test import bench
+
+
+# The hand-written style the data classes used to have: private slots behind one property per field.
+
+class PropertySessionView:
+    __slots__ = ['_id', '_name', '_server_id', '_server_era', '_session_id', '_is_staff', '_is_manager']
+
+    def __init__(self, j: dict):
+        self._id = j['id']
+        self._name = j['name']
+        self._server_id = j['server_id']
+        self._server_era = j['server_era']
+        self._session_id = j['session_id']
+        self._is_staff = j.get('is_staff', False)
+        self._is_manager = j.get('is_manager', False)
+
+    @property
+    def id(self):
+        return self._id
+
+    @property
+    def name(self):
+        return self._name
+
+    @property
+    def session_id(self):
+        return self._session_id
+
+
+class PropertyMessage:
+    __slots__ = ['_id', '_edit_id', '_parent', '_previous_edit_id', '_time', '_sender', '_content',
+                 '_encryption_key_id', '_edited', '_deleted', '_truncated']
+
+    def __init__(self, j: dict):
+        self._id = j['id']
+        self._edit_id = j.get('edit_id', None)
+        self._parent = j.get('parent', None)
+        self._previous_edit_id = j.get('previous_edit_id', None)
+        self._time = j['time']
+        self._sender = PropertySessionView(j['sender'])
+        self._content = j['content']
+        self._encryption_key_id = j.get('encryption_key_id', None)
+        self._edited = j.get('edited', None)
+        self._deleted = j.get('deleted', None)
+        self._truncated = j.get('truncated', False)
+
+    @property
+    def id(self):
+        return self._id
+
+    @property
+    def parent(self):
+        return self._parent
+
+    @property
+    def time(self):
+        return self._time
+
+    @property
+    def sender(self):
+        return self._sender
+
+    @property
+    def content(self):
+        return self._content
+
+
+class PropertySnapshotEvent:
+    __slots__ = ['_identity', '_session_id', '_version', '_listing', '_log']
+
+    def __init__(self, j: dict):
+        self._identity = j['identity']
+        self._session_id = j['session_id']
+        self._version = j['version']
+        self._listing = [PropertySessionView(sub_j) for sub_j in j['listing']]
+        self._log = [PropertyMessage(sub_j) for sub_j in j['log']]
+
+    @property
+    def listing(self):
+        return self._listing
+
+    @property
+    def log(self):
+        return self._log
+
+
+class PropertyLogReply:
+    def __init__(self, j: dict):
+        self._before = j.get('before', None)
+        self._log = [PropertyMessage(x) for x in j['log']]
+
+    @property
+    def log(self):
+        return self._log
+
+
+def read_message(message) -> int:
+    return len(message.content) + message.time + len(message.id) + len(message.sender.name) + (message.parent is None)
+
+
+def compare(label: str, count: int, old, new):
+    bench.compare(label, count, old, new, names=("properties", "generated"))
+
+
+def main():
+    frames = [json.loads(frame) for frame in make_frames()]
+    sends = [frame["data"] for frame in frames if frame["type"] == "send-event"]
+    snapshot = frames[1]["data"]
+    log_reply = {"log": snapshot["log"], "before": snapshot["log"][-1]["id"]}
+    old_sends = [PropertyMessage(j) for j in sends]
+    new_sends = [SendEvent(j) for j in sends]
+
+    def construct(cls, items):
+        def run():
+            for j in items:
+                cls(j)
+        return run
+
+    def construct_log(cls, items):
+        # The log is decoded on first use, so touch it to count the Message objects.
+        def run():
+            for j in items:
+                cls(j).log
+        return run
+
+    def access(items):
+        def run():
+            for message in items:
+                read_message(message)
+        return run
+
+    def snapshot_and_read(cls):
+        def run():
+            for _ in range(100):
+                for message in cls(snapshot).log:
+                    read_message(message)
+        return run
+
+    compare("construct SendEvent", len(sends), construct(PropertyMessage, sends), construct(SendEvent, sends))
+    compare("read SendEvent fields", len(sends), access(old_sends), access(new_sends))
+    compare("construct SnapshotEvent", 1000, construct_log(PropertySnapshotEvent, [snapshot] * 1000),
+            construct_log(SnapshotEvent, [snapshot] * 1000))
+    compare("construct LogReply", 1000, construct_log(PropertyLogReply, [log_reply] * 1000),
+            construct_log(LogReply, [log_reply] * 1000))
+    compare("SnapshotEvent + read log", 100, snapshot_and_read(PropertySnapshotEvent), snapshot_and_read(SnapshotEvent))
+
+
+if __name__ == '__main__':
+    main()
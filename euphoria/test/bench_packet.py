@@ -0,0 +1,61 @@
+# euphoria-py
+# Copyright (C) 2015  Emily A. Bellows
+#
+# This program is free software: you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation, either version 3 of the License, or
+# (at your option) any later version.
+#
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with this program.  If not, see <http://www.gnu.org/licenses/>.
+
+"""Measures packets/sec for eager and lazy Packet decoding, run with 'python -m euphoria.test.bench_packet'"""
+
+import json
+
+from euphoria import Packet
+from euphoria.test.corpus import make_frames
+from tiny_agent.test.bench import best_of
+
+
+def ignore_everything(packet: Packet):
+    pass
+
+
+def read_send_events(packet: Packet):
+    # What most of the services do: look at the send-events, skip everything else.
+    send_event = packet.send_event
+    if send_event:
+        return send_event.content
+
+
+def read_everything(packet: Packet):
+    return packet.data
+
+
+def bench(decoded: list, lazy: bool, listener) -> float:
+    def run():
+        for j in decoded:
+            listener(Packet(j, lazy=lazy))
+
+    return len(decoded) / best_of(run)
+
+
+def main():
+    frames = make_frames()
+    decoded = [json.loads(frame) for frame in frames]
+    print("{0} frames, JSON parsing excluded".format(len(decoded)))
+    for listener in (ignore_everything, read_send_events, read_everything):
+        eager = bench(decoded, False, listener)
+        lazy = bench(decoded, True, listener)
+        print("{0:<20} eager: {1:>10.0f} packets/s   lazy: {2:>10.0f} packets/s   ({3:.2f}x)".format(
+            listener.__name__, eager, lazy, lazy / eager))
+
+
+if __name__ == '__main__':
+    main()
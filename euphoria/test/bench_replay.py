@@ -0,0 +1,65 @@
+# euphoria-py
+# Copyright (C) 2015  Emily A. Bellows
+#
+# This program is free software: you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation, either version 3 of the License, or
+# (at your option) any later version.
+#
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with this program.  If not, see <http://www.gnu.org/licenses/>.
+
+"""Replays a capture through a Client and a few listeners as fast as possible.
+
+Run with 'python -m euphoria.test.bench_replay [capture_file]'. Without a capture file
+the generated corpus is recorded to a temporary one first."""
+
+import asyncio
+import os
+import sys
+import tempfile
+import time
+
+from euphoria import CaptureWriter, Client, NickAndAuth, read_capture, replay_capture
+from euphoria.test.corpus import make_frames
+from euphoria.test.test_capture import Counter
+
+
+def main():
+    loop = asyncio.get_event_loop()
+    with tempfile.TemporaryDirectory() as directory:
+        if len(sys.argv) > 1:
+            path = sys.argv[1]
+        else:
+            path = os.path.join(directory, "corpus.cap")
+            writer = CaptureWriter(path)
+            for frame in make_frames(n=50000):
+                writer.write(frame)
+            writer.close()
+
+        client = Client(room="bench", loop=loop)
+        NickAndAuth(client, "bench-bot", loop=loop)
+        counters = [Counter(client, loop=loop) for _ in range(5)]
+
+        expected = sum(1 for _, frame in read_capture(path) if b'"send-event"' in frame)
+
+        async def run():
+            start = time.perf_counter()
+            replayed = await replay_capture(client, path)
+            while any(counter.count < expected for counter in counters):
+                await asyncio.sleep(0)
+            elapsed = time.perf_counter() - start
+            print("replayed {0} frames in {1:.2f}s, {2:.0f} frames/s through a Client, NickAndAuth and 5 "
+                  "send-event listeners".format(replayed, elapsed, replayed / elapsed))
+
+        loop.run_until_complete(run())
+        client.exit()
+
+
+if __name__ == '__main__':
+    main()
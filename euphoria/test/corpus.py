@@ -0,0 +1,122 @@
+# euphoria-py
+# Copyright (C) 2015  Emily A. Bellows
+#
+# This program is free software: you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation, either version 3 of the License, or
+# (at your option) any later version.
+#
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with this program.  If not, see <http://www.gnu.org/licenses/>.
+
+"""A reproducible stream of server frames shaped like a busy room, for benchmarks, and helpers
+for feeding hand written frames to a Client in tests."""
+
+import asyncio
+import json
+import random
+from asyncio import AbstractEventLoop
+from typing import List
+
+from tiny_agent import Agent
+
+SERVER_ID = "heim.1"
+SERVER_ERA = "1k4dm4rgpkkg0"
+
+WORDS = ["hello", "anyone", "here", "!ping", "bot", "what", "is", "the", "time", "lol", "ok", "sure", "thanks",
+         "euphoria", "python", "asyncio", "!remind", "15m", "eat", "food", "!quote", "get", "nice", "yes", "no"]
+
+
+def make_session(rng: random.Random, n: int) -> dict:
+    return {"id": "agent:{0:016x}".format(rng.getrandbits(64)),
+            "name": "user{0}".format(n),
+            "server_id": SERVER_ID,
+            "server_era": SERVER_ERA,
+            "session_id": "{0:016x}".format(rng.getrandbits(64))}
+
+
+def make_message(rng: random.Random, msg_id: int, time: int, sender: dict, parent: str = None) -> dict:
+    j = {"id": "{0:013x}".format(msg_id),
+         "time": time,
+         "sender": sender,
+         "content": " ".join(rng.choice(WORDS) for _ in range(rng.randint(1, 12)))}
+    if parent:
+        j["parent"] = parent
+    return j
+
+
+def make_frames(n: int = 10000, sessions: int = 40, seed: int = 0xBEEF) -> List[str]:
+    """Returns a hello-event and snapshot-event followed by n-2 frames of mixed room traffic.
+
+    Roughly 70% of the traffic is send-events, the rest is joins, parts, nick changes and pings."""
+    rng = random.Random(seed)
+    time = 1450000000
+    msg_id = 0x00a000000000
+    listing = [make_session(rng, i) for i in range(sessions)]
+    me = make_session(rng, sessions)
+    log = []
+    for _ in range(100):
+        msg_id += rng.randint(1, 1000)
+        time += rng.randint(0, 30)
+        parent = log[-rng.randint(1, len(log))]["id"] if log and rng.random() < 0.5 else None
+        log.append(make_message(rng, msg_id, time, rng.choice(listing), parent))
+
+    # Frames are serialized as soon as they're made, since nick changes edit the sessions in place.
+    frames = [json.dumps({"type": "hello-event",
+                          "data": {"id": me["id"], "session": me, "room_is_private": False,
+                                   "version": "deadbeef"}}),
+              json.dumps({"type": "snapshot-event",
+                          "data": {"identity": me["id"], "session_id": me["session_id"], "version": "deadbeef",
+                                   "listing": listing, "log": log}})]
+
+    recent = [m["id"] for m in log[-20:]]
+    while len(frames) < n:
+        roll = rng.random()
+        time += rng.randint(0, 3)
+        if roll < 0.70:
+            msg_id += rng.randint(1, 1000)
+            parent = rng.choice(recent) if rng.random() < 0.6 else None
+            msg = make_message(rng, msg_id, time, rng.choice(listing), parent)
+            recent = recent[1:] + [msg["id"]]
+            frames.append(json.dumps({"type": "send-event", "data": msg}))
+        elif roll < 0.80:
+            session = make_session(rng, len(listing))
+            listing.append(session)
+            frames.append(json.dumps({"type": "join-event", "data": session}))
+        elif roll < 0.90 and len(listing) > 1:
+            session = listing.pop(rng.randrange(len(listing)))
+            frames.append(json.dumps({"type": "part-event", "data": session}))
+        elif roll < 0.95:
+            session = rng.choice(listing)
+            new_name = "user{0}".format(rng.randint(0, 10000))
+            frames.append(json.dumps({"type": "nick-event",
+                                      "data": {"session_id": session["session_id"], "id": session["id"],
+                                               "from": session["name"], "to": new_name}}))
+            session["name"] = new_name
+        else:
+            frames.append(json.dumps({"type": "ping-event", "data": {"time": time, "next": time + 30}}))
+
+    return frames
+
+
+def frame(type_: str, data: dict, **extra) -> str:
+    """Returns the JSON of a server frame, extra goes at the top level next to type and data.
+
+    :rtype: str"""
+    j = {"type": type_, "data": data}
+    j.update(extra)
+    return json.dumps(j)
+
+
+def settle(loop: AbstractEventLoop, *agents: Agent):
+    """Runs the loop until every agent's mailbox is empty."""
+    async def wait():
+        while any(agent.mailbox_depth for agent in agents):
+            await asyncio.sleep(0)
+
+    loop.run_until_complete(asyncio.wait_for(wait(), timeout=5.0, loop=loop))
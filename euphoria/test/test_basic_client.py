@@ -20,6 +20,7 @@ from asyncio import AbstractEventLoop
 
 import tiny_agent
 from euphoria import Client, Packet
+from euphoria.mock_server import MockServer
 from tiny_agent import Agent
 
 
@@ -51,13 +52,16 @@ class Basic(Agent):
 def test_main():
     logging.basicConfig(level=logging.INFO)
     loop = asyncio.get_event_loop()
+    server = MockServer(loop=loop)
+    loop.run_until_complete(server.start())
 
-    client = Client(room="test", loop=loop)
+    client = Client(room="test", uri_format=server.uri_format, loop=loop)
     basic = Basic(client, loop=loop)
     basic.bidirectional_link(client)  # Execute both client and basic until either of them stops.
     client.connect()
 
     loop.run_until_complete(asyncio.wait([client.task, basic.task]))  # Wait on both
+    server.close()
     loop.run_until_complete(asyncio.wait(asyncio.Task.all_tasks(loop=loop)))  # Let everything else shutdown cleanly
 
 
@@ -0,0 +1,119 @@
+# euphoria-py
+# Copyright (C) 2015  Emily A. Bellows
+#
+# This program is free software: you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation, either version 3 of the License, or
+# (at your option) any later version.
+#
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with this program.  If not, see <http://www.gnu.org/licenses/>.
+
+import asyncio
+import os
+import tempfile
+from asyncio import AbstractEventLoop
+from typing import List
+
+import tiny_agent
+from euphoria import CaptureWriter, Client, Packet, read_capture, replay_capture
+from euphoria.test.corpus import make_frames
+from tiny_agent import Agent
+
+
+def write_corpus(path: str, frames: list):
+    writer = CaptureWriter(path)
+    for i, frame in enumerate(frames):
+        writer.write(frame, timestamp=1450000000.0 + i * 0.001)
+    writer.close()
+
+
+def test_round_trip():
+    frames = make_frames(n=300)
+    with tempfile.TemporaryDirectory() as directory:
+        path = os.path.join(directory, "room.cap")
+        write_corpus(path, frames[:100])
+        write_corpus(path, frames[100:])  # appending to an existing capture
+        records = list(read_capture(path))
+    assert [frame.decode('utf-8') for _, frame in records] == frames
+    assert [timestamp for timestamp, _ in records][:2] == [1450000000.0, 1450000000.001]
+
+
+class Counter(Agent):
+    @tiny_agent.init
+    def __init__(self, client: Client, loop: AbstractEventLoop = None):
+        super(Counter, self).__init__(loop=loop)
+        self.count = 0
+        client.add_listener(self, ['send-event'])
+
+    @tiny_agent.send
+    async def on_packet(self, packet: Packet):
+        assert packet.send_event is not None
+        self.count += 1
+
+
+def test_replay():
+    frames = make_frames(n=1000)
+    expected = len([frame for frame in frames if '"send-event"' in frame])
+    loop = asyncio.get_event_loop()
+    client = Client(room="test", loop=loop)
+    counter = Counter(client, loop=loop)
+
+    async def task():
+        with tempfile.TemporaryDirectory() as directory:
+            path = os.path.join(directory, "room.cap")
+            write_corpus(path, frames)
+            replayed = await replay_capture(client, path)
+        assert replayed == len(frames)
+        while counter.count < expected:
+            await asyncio.sleep(0)
+
+    loop.run_until_complete(asyncio.wait_for(task(), timeout=5.0, loop=loop))
+    client.exit()
+    counter.exit()
+
+
+class BatchCounter(Agent):
+    @tiny_agent.init
+    def __init__(self, client: Client, capacity: int = None, loop: AbstractEventLoop = None):
+        super(BatchCounter, self).__init__(loop=loop)
+        self.count = 0
+        self.batches = 0
+        client.add_listener(self, ['send-event'], capacity=capacity)
+
+    @tiny_agent.batch
+    async def on_packet(self, packets: List[Packet]):
+        assert all(packet.send_event is not None for packet in packets)
+        self.count += len(packets)
+        self.batches += 1
+
+
+def test_replay_batched():
+    frames = make_frames(n=1000)
+    expected = len([frame for frame in frames if '"send-event"' in frame])
+    loop = asyncio.get_event_loop()
+    client = Client(room="test", loop=loop)
+    direct = BatchCounter(client, loop=loop)
+    bounded = BatchCounter(client, capacity=5000, loop=loop)
+
+    async def task():
+        with tempfile.TemporaryDirectory() as directory:
+            path = os.path.join(directory, "room.cap")
+            write_corpus(path, frames)
+            await replay_capture(client, path)
+        while direct.count < expected or bounded.count < expected:
+            await asyncio.sleep(0)
+
+    loop.run_until_complete(asyncio.wait_for(task(), timeout=5.0, loop=loop))
+    assert direct.count == bounded.count == expected
+    assert direct.batches < expected / 10, "the packets should arrive many at a time"
+    assert bounded.batches < expected / 10
+    assert client.subscription(bounded).delivered == expected
+    client.exit()
+    direct.exit()
+    bounded.exit()
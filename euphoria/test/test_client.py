@@ -0,0 +1,341 @@
+# euphoria-py
+# Copyright (C) 2015  Emily A. Bellows
+#
+# This program is free software: you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation, either version 3 of the License, or
+# (at your option) any later version.
+#
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with this program.  If not, see <http://www.gnu.org/licenses/>.
+
+import asyncio
+import gc
+import json
+import logging
+from asyncio import AbstractEventLoop, Future
+from typing import Tuple
+
+import websockets
+
+import tiny_agent
+from euphoria import Client, ReplyTimeout, Disconnected, Packet
+from tiny_agent import Agent
+from euphoria.mock_server import MockServer
+from euphoria.test.corpus import frame
+
+
+class _SilentServer(MockServer):
+    # Takes every command and never answers.
+    async def _on_command(self, room, session, command):
+        pass
+
+
+def _connect_silent(loop: AbstractEventLoop, **kwargs) -> Tuple[MockServer, Client]:
+    server = _SilentServer(loop=loop)
+    loop.run_until_complete(server.start())
+    client = Client(room="test", uri_format=server.uri_format, loop=loop, **kwargs)
+    client.connect()
+
+    async def connected():
+        while not client.connected:
+            await asyncio.sleep(0.01, loop=loop)
+
+    loop.run_until_complete(asyncio.wait_for(connected(), timeout=5.0, loop=loop))
+    return server, client
+
+
+def _close(loop: AbstractEventLoop, server: MockServer, client: Client):
+    client.exit()
+    server.close()
+    loop.run_until_complete(server.wait_closed())
+
+
+def test_reply_timeout():
+    loop = asyncio.get_event_loop()
+    server, client = _connect_silent(loop, reply_timeout=10.0)
+
+    async def task():
+        # The server never answers, so these only end by timing out or by us going away.
+        quick = client.send_nick("quick", timeout=0.05)
+        slow = client.send_nick("slow")
+        try:
+            await quick
+        except ReplyTimeout:
+            pass
+        else:
+            assert False, "the short deadline should have expired"
+        assert not slow.done(), "the long deadline is still in the future"
+        assert client.timed_out_replies == 1
+        assert client.pending_replies == 1
+
+        client.exit()
+        try:
+            await slow
+        except Disconnected:
+            pass
+        else:
+            assert False, "exiting should fail everything still waiting"
+        assert client.orphaned_replies == 1
+        assert client.pending_replies == 0
+
+    try:
+        loop.run_until_complete(asyncio.wait_for(task(), timeout=3.0, loop=loop))
+    finally:
+        _close(loop, server, client)
+
+
+def test_send_while_disconnected_fails_fast():
+    # Between connections nothing is sent, so the reply fails now instead of at its deadline.
+    loop = asyncio.get_event_loop()
+    client = Client(room="test", reply_timeout=30.0, loop=loop)
+    future = client.send_content("hello")
+    assert future.done()
+    assert isinstance(future.exception(), Disconnected)
+    assert client.pending_replies == 0
+    assert client.orphaned_replies == 1
+    client.exit()
+
+
+def test_send_on_closed_socket():
+    # The socket can close between the writer checking it and sending, that fails the one frame and nothing else.
+    loop = asyncio.get_event_loop()
+    server, client = _connect_silent(loop)
+    closed_error = getattr(websockets.exceptions, 'ConnectionClosed', None)
+    error = closed_error(1006, "") if closed_error else websockets.exceptions.InvalidState("closed")
+
+    async def send(data):
+        raise error
+
+    client._sock.send = send
+    future = client.send_content("hello")
+    try:
+        loop.run_until_complete(asyncio.wait_for(future, timeout=5.0, loop=loop))
+    except Disconnected:
+        pass
+    else:
+        assert False, "the frame never went out"
+    assert client.alive, "the writer carries on"
+    assert client.orphaned_replies == 1
+    _close(loop, server, client)
+
+
+def test_unread_failures_are_quiet():
+    # Services often send without awaiting the reply, a failure they never look at shouldn't be logged as an error.
+    loop = asyncio.get_event_loop()
+    errors = []
+    loop.set_exception_handler(lambda loop_, context: errors.append(context))
+    try:
+        client = Client(room="test", loop=loop)
+        client.send_content("nobody is listening")
+        client.exit()
+        gc.collect()
+    finally:
+        loop.set_exception_handler(None)
+    assert errors == []
+
+
+def test_replies_resolve_by_id():
+    loop = asyncio.get_event_loop()
+    server, client = _connect_silent(loop)
+
+    async def task():
+        first = client.send_nick("first")
+        second = client.send_nick("second")
+        replies = [{"type": "nick-reply", "id": str(0xBEEF + n),
+                    "data": {"session_id": "s", "id": "i", "from": "", "to": name}}
+                   for n, name in ((2, "second"), (1, "first"), (7, "stranger"))]
+        for reply in replies:
+            client.feed(json.dumps(reply))
+        assert (await first).nick_reply.to == "first"
+        assert (await second).nick_reply.to == "second"
+        assert client.unexpected_replies == 1, "nobody was waiting on the third reply"
+        assert client.pending_replies == 0
+
+    try:
+        loop.run_until_complete(asyncio.wait_for(task(), timeout=3.0, loop=loop))
+    finally:
+        _close(loop, server, client)
+
+
+def test_writer_batches_frames():
+    loop = asyncio.get_event_loop()
+    server = MockServer(loop=loop)
+    loop.run_until_complete(server.start())
+    client = Client(room="test", uri_format=server.uri_format, loop=loop)
+    client.connect()
+
+    async def task():
+        while not client.connected:
+            await asyncio.sleep(0.01, loop=loop)
+        # Queued all at once, so the writer should pick them up in a few batches.
+        futures = [client.send_nick("nick-{0}".format(n)) for n in range(200)]
+        assert client.outbound_queue_depth == 200
+        await client.drain()
+        await asyncio.gather(*futures, loop=loop)
+        assert client.frames_sent == 200
+        assert client.batches_sent < client.frames_sent
+        assert client.max_outbound_queue_depth == 200
+        assert client.outbound_queue_depth == 0
+
+    try:
+        loop.run_until_complete(asyncio.wait_for(task(), timeout=5.0, loop=loop))
+    finally:
+        client.exit()
+        server.close()
+        loop.run_until_complete(server.wait_closed())
+
+
+class _OrderedServer(MockServer):
+    def __init__(self, *args, **kwargs):
+        super(_OrderedServer, self).__init__(*args, **kwargs)
+        self.order = []
+
+    async def _on_command(self, room, session, command):
+        self.order.append(command.get("type"))
+        await super(_OrderedServer, self)._on_command(room, session, command)
+
+
+def test_ping_reply_jumps_the_queue():
+    loop = asyncio.get_event_loop()
+    server = _OrderedServer(loop=loop)
+    loop.run_until_complete(server.start())
+    client = Client(room="test", uri_format=server.uri_format, loop=loop)
+    client.connect()
+
+    async def task():
+        while not client.connected:
+            await asyncio.sleep(0.01, loop=loop)
+        futures = [client.send_content("flood {0}".format(n)) for n in range(100)]
+        client.feed(frame("ping-event", {"time": 1, "next": 31}))
+        await asyncio.gather(*futures, loop=loop)
+        assert server.order[0] == "ping-reply"
+        assert client.ping_replies_sent == 1
+        assert 0.0 <= client.ping_turnaround_mean <= client.ping_turnaround_max
+
+    try:
+        loop.run_until_complete(asyncio.wait_for(task(), timeout=5.0, loop=loop))
+    finally:
+        client.exit()
+        server.close()
+        loop.run_until_complete(server.wait_closed())
+
+
+class _Resumer(Agent):
+    @tiny_agent.init
+    def __init__(self, client: Client, loop: AbstractEventLoop = None):
+        super(_Resumer, self).__init__(loop=loop)
+        client.add_listener(self, ['snapshot-event'])
+        self.snapshots = 0
+        self.reconnected = Future(loop=loop)
+
+    @tiny_agent.send
+    async def on_packet(self, packet: Packet):
+        self.snapshots += 1
+
+    @tiny_agent.send
+    async def on_reconnected(self, missed: list):
+        self.reconnected.set_result(missed)
+
+
+def test_reconnect_catches_up():
+    loop = asyncio.get_event_loop()
+    server = MockServer(loop=loop)
+    loop.run_until_complete(server.start())
+    client = Client(room="test", uri_format=server.uri_format, reconnect=True, reconnect_delay=0.5, loop=loop)
+    resumer = _Resumer(client, loop=loop)
+    client.connect()
+
+    async def task():
+        while not resumer.snapshots:
+            await asyncio.sleep(0.01, loop=loop)
+        await server.say("test", "before")
+        await asyncio.sleep(0.05, loop=loop)
+        server.kick("test")
+        # More than a snapshot holds, so the client has to page back through the log.
+        for n in range(150):
+            await server.say("test", "while away {0}".format(n))
+        missed = await resumer.reconnected
+        assert [m.content for m in missed] == ["while away {0}".format(n) for n in range(150)]
+        assert client.reconnects == 1
+        assert resumer.snapshots == 2
+        assert client.alive
+
+    try:
+        # Some releases of websockets take up to their 10 second close timeout to notice the drop.
+        loop.run_until_complete(asyncio.wait_for(task(), timeout=20.0, loop=loop))
+    finally:
+        client.exit()
+        resumer.exit()
+        server.close()
+        loop.run_until_complete(server.wait_closed())
+
+
+class _Recorder(Agent):
+    @tiny_agent.init
+    def __init__(self, loop: AbstractEventLoop = None):
+        super(_Recorder, self).__init__(loop=loop)
+        self.seen = []
+
+    @tiny_agent.send
+    async def on_packet(self, packet: Packet):
+        ping_event = packet.ping_event
+        self.seen.append((packet.type, ping_event.time if ping_event else None))
+
+
+def _ping(time: int) -> str:
+    return frame("ping-event", {"time": time, "next": time + 30})
+
+
+def _bounce(time: int) -> str:
+    return frame("bounce-event", {"reason": str(time)})
+
+
+class _Warnings(logging.Handler):
+    def __init__(self):
+        super(_Warnings, self).__init__(logging.WARNING)
+        self.records = []
+
+    def emit(self, record: logging.LogRecord):
+        self.records.append(record)
+
+
+def test_bounded_listeners():
+    loop = asyncio.get_event_loop()
+    client = Client(room="test", handle_pings=False, loop=loop)
+    warnings = _Warnings()
+    logging.getLogger("euphoria.client").addHandler(warnings)
+    oldest = _Recorder(loop=loop)
+    newest = _Recorder(loop=loop)
+    coalesce = _Recorder(loop=loop)
+    client.add_listener(oldest, ['ping-event'], capacity=3, policy='drop_oldest')
+    client.add_listener(newest, ['ping-event'], capacity=3, policy='drop_newest')
+    client.add_listener(coalesce, capacity=2, policy='coalesce')
+
+    async def task():
+        # Nobody gets to run while we feed, so everything past capacity has to be dropped.
+        client.feed(_bounce(0))
+        for n in range(1, 11):
+            client.feed(_ping(n))
+        await asyncio.sleep(0.05, loop=loop)
+        assert oldest.seen == [("ping-event", 8), ("ping-event", 9), ("ping-event", 10)]
+        assert newest.seen == [("ping-event", 1), ("ping-event", 2), ("ping-event", 3)]
+        assert [type_ for type_, time in coalesce.seen] == ["bounce-event", "ping-event"]
+        assert client.subscription(oldest).dropped == 7
+        assert client.subscription(newest).dropped == 7
+        assert client.subscription(coalesce).dropped == 9
+        assert client.subscription(oldest).delivered == 3
+        assert client.dropped_packets == 23
+        assert len(warnings.records) == 3, "one warning each time a listener falls behind, not one per packet"
+
+    try:
+        loop.run_until_complete(task())
+    finally:
+        logging.getLogger("euphoria.client").removeHandler(warnings)
+    for agent in (client, oldest, newest, coalesce):
+        agent.exit()
@@ -0,0 +1,38 @@
+# euphoria-py
+# Copyright (C) 2015  Emily A. Bellows
+#
+# This program is free software: you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation, either version 3 of the License, or
+# (at your option) any later version.
+#
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with this program.  If not, see <http://www.gnu.org/licenses/>.
+
+from euphoria import get_codec, available_codecs
+
+
+def test_codecs_agree():
+    command = {"type": "send", "id": "48879", "data": {"content": "héllo \U0001F600", "parent": None}}
+    for name in available_codecs():
+        codec = get_codec(name)
+        frame = codec.dumps(command)
+        assert isinstance(frame, str), "frames must go out as text"
+        assert codec.loads(frame) == command
+        assert codec.loads(frame.encode('utf-8')) == command, "bytes frames should parse too"
+
+
+def test_auto_and_fallback():
+    assert get_codec('auto').name == available_codecs()[0]
+    assert get_codec('json').name == 'json'
+    try:
+        get_codec('yaml')
+    except ValueError:
+        pass
+    else:
+        assert False, "unknown codecs should be refused"
@@ -0,0 +1,79 @@
+# euphoria-py
+# Copyright (C) 2015  Emily A. Bellows
+#
+# This program is free software: you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation, either version 3 of the License, or
+# (at your option) any later version.
+#
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with this program.  If not, see <http://www.gnu.org/licenses/>.
+
+import json
+
+from euphoria import Packet, MessageColumns
+from euphoria.test.corpus import make_frames
+
+
+def snapshot_packet() -> Packet:
+    return Packet(json.loads(make_frames(n=2)[1]))
+
+
+def test_columns_match_log():
+    snapshot = snapshot_packet().snapshot_event
+    columns = snapshot.columns
+    assert snapshot._raw_log is not None, "building columns shouldn't have decoded the log"
+    log = snapshot.log
+    assert len(columns) == len(log) == 100
+    assert columns.ids == [m.id for m in log]
+    assert list(columns.times) == [m.time for m in log]
+    assert columns.parents == [m.parent for m in log]
+    assert columns.sender_ids == [m.sender.id for m in log]
+    assert columns.contents() == [m.content for m in log]
+    assert [columns.content(row) for row in range(len(columns))] == [m.content for m in log]
+
+    from_messages = snapshot.columns
+    assert from_messages.ids == columns.ids and from_messages.contents() == columns.contents()
+
+
+def test_bulk_queries():
+    log = snapshot_packet().snapshot_event.log
+    columns = MessageColumns.from_messages(log)
+
+    rows = columns.rows_matching("!ping")
+    assert [columns.ids[row] for row in rows] == [m.id for m in log if "!ping" in m.content]
+
+    sender = log[0].sender.id
+    assert columns.count_by_sender()[sender] == len([m for m in log if m.sender.id == sender])
+    assert columns.select(columns.rows_from(sender)).sender_ids == [sender] * columns.count_by_sender()[sender]
+
+    middle = log[50].time
+    assert len(columns.rows_between(middle, middle + 1)) == len([m for m in log if m.time == middle])
+    assert columns.row_of(log[42].id) == 42
+    assert columns.sorted_by_time().ids == [m.id for m in sorted(log, key=lambda m: m.time)]
+
+
+def columns_of(*contents: str) -> MessageColumns:
+    sender = {"id": "agent:0", "name": "user0", "server_id": "heim.1", "server_era": "era", "session_id": "0"}
+    return MessageColumns.from_json([{"id": "{0:03d}".format(n), "time": n, "sender": sender, "content": content}
+                                     for n, content in enumerate(contents)])
+
+
+def test_nul_in_content():
+    columns = columns_of("one\x00two", "three")
+    assert columns.contents() == ["one\x00two", "three"], "a NUL in a message doesn't shift the rows after it"
+    assert columns.content(1) == "three"
+    assert columns.rows_matching("two") == [0]
+
+
+def test_matching_is_per_message():
+    columns = columns_of("hello", "hello world", "say hello", "ab", "b a b")
+    assert columns.rows_matching("^hello") == [0, 1]
+    assert columns.rows_matching("hello$") == [0, 2]
+    assert columns.rows_matching("a.*b") == [3, 4], "a greedy match can't run on into the next message"
+    assert columns.rows_matching("lo\x00say") == []
@@ -0,0 +1,123 @@
+# euphoria-py
+# Copyright (C) 2015  Emily A. Bellows
+#
+# This program is free software: you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation, either version 3 of the License, or
+# (at your option) any later version.
+#
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with this program.  If not, see <http://www.gnu.org/licenses/>.
+
+import asyncio
+
+import tiny_agent
+from euphoria import Client, Command, CommandRouter, Packet
+from tiny_agent import Agent
+
+
+def send_event(content: str) -> Packet:
+    return Packet({"type": "send-event",
+                   "data": {"id": "00a000000001", "time": 1450000000, "content": content,
+                            "sender": {"id": "agent:0", "name": "user0", "server_id": "heim.1",
+                                       "server_era": "era", "session_id": "0"}}})
+
+
+def parse(content: str) -> Command:
+    return Command.parse(send_event(content).send_event)
+
+
+def test_parse():
+    command = parse("!remind 15m eat\nfood")
+    assert (command.name, command.target, command.args) == ("remind", None, "15m eat\nfood")
+    command = parse("!ping @TestBot")
+    assert (command.name, command.target, command.args) == ("ping", "TestBot", "")
+    command = parse("!kill  @TestBot  now please")
+    assert (command.name, command.target, command.args) == ("kill", "TestBot", "now please")
+    assert parse("!ping").args == ""
+    assert parse("hello !ping") is None
+    assert parse("!") is None
+    assert parse("! ping") is None
+
+
+def test_addressed_to():
+    assert parse("!ping @TestBot").addressed_to("TestBot")
+    assert not parse("!ping @TestBot").addressed_to("OtherBot")
+    assert not parse("!ping").addressed_to("TestBot")
+    assert parse("!ping @TestBot").addressed_to("Test Bot"), "mentions leave out spaces"
+    assert parse("!ping @Test Bot").addressed_to("Test Bot")
+    assert not parse("!ping @TestBot").addressed_to("")
+
+
+class Handler(Agent):
+    @tiny_agent.init
+    def __init__(self, loop: asyncio.AbstractEventLoop = None):
+        super(Handler, self).__init__(loop=loop)
+        self.commands = []
+
+    @tiny_agent.send
+    async def on_command(self, command: Command):
+        self.commands.append(command)
+
+    @tiny_agent.call
+    async def sync(self):
+        pass
+
+
+def test_router():
+    loop = asyncio.get_event_loop()
+    owner = Agent(loop=loop)
+    pings, quotes = Handler(loop=loop), Handler(loop=loop)
+    router = CommandRouter(owner)
+    router.add(pings, ['ping', 'uptime'])
+    router.add(quotes, ['quote', 'ping'])
+    assert router.commands == ['ping', 'quote', 'uptime']
+
+    for content in ["!ping", "!quote get x", "!uptime @bot", "!nothing", "hello", "!pingpong"]:
+        router.on_packet(send_event(content))
+    loop.run_until_complete(asyncio.wait([pings.sync(), quotes.sync()]))
+    assert [c.name for c in pings.commands] == ['ping', 'uptime']
+    assert [c.name for c in quotes.commands] == ['ping', 'quote']
+    assert quotes.commands[1].args == "get x"
+    assert router.routed == 4
+
+    quotes.exit()
+    router.on_packet(send_event("!ping"))
+    loop.run_until_complete(pings.sync())
+    assert len(pings.commands) == 3
+    assert router.commands == ['ping', 'uptime'], "handlers that exited are dropped"
+
+    pings.exit()
+    owner.exit()
+    assert not router.alive
+    loop.run_until_complete(asyncio.sleep(0))
+
+
+def test_bounded_handler():
+    # A slow service behind a Subscription only ever has capacity commands waiting on it.
+    loop = asyncio.get_event_loop()
+    owner = Agent(loop=loop)
+    client = Client(room="test", loop=loop)
+    handler = Handler(loop=loop)
+    router = CommandRouter(owner)
+    subscription = client.subscribe(handler, 2, 'drop_oldest', method='on_command')
+    router.add(subscription, ['quote'])
+    assert client.subscription(handler, 'on_command') is subscription
+    assert client.subscription(handler) is None, "that's only for packets"
+
+    for n in range(5):
+        router.on_packet(send_event("!quote get {0}".format(n)))
+    loop.run_until_complete(handler.sync())
+    loop.run_until_complete(asyncio.sleep(0.01))
+    assert [c.args for c in handler.commands] == ["get 3", "get 4"]
+    assert subscription.dropped == 3
+    assert client.dropped_packets == 3
+
+    for agent in (handler, client, owner):
+        agent.exit()
+    loop.run_until_complete(asyncio.sleep(0))
@@ -0,0 +1,96 @@
+# euphoria-py
+# Copyright (C) 2015  Emily A. Bellows
+#
+# This program is free software: you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation, either version 3 of the License, or
+# (at your option) any later version.
+#
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with this program.  If not, see <http://www.gnu.org/licenses/>.
+
+import asyncio
+
+from euphoria import Client, MessageCache
+from euphoria.test.corpus import frame, make_frames, settle
+
+SENDER = {"id": "agent:0", "name": "user0", "server_id": "heim.1", "server_era": "era", "session_id": "session0"}
+
+
+def message(id_: str, time: int, parent: str = None, content: str = "hi") -> dict:
+    j = {"id": id_, "time": time, "sender": SENDER, "content": content}
+    if parent:
+        j["parent"] = parent
+    return j
+
+
+def test_message_cache():
+    loop = asyncio.get_event_loop()
+    client = Client(room="test", loop=loop)
+    cache = MessageCache(client, max_size=6, loop=loop)
+
+    # Two threads, a1 with replies a2 and a3 (and a4 under a2), and b1 on its own.
+    log = [message("a1", 100), message("a2", 101, "a1"), message("b1", 102), message("a3", 103, "a1")]
+    client.feed(frame("snapshot-event", {"identity": "agent:0", "session_id": "session0", "version": "1",
+                                         "listing": [], "log": log}))
+    client.feed(frame("send-event", message("a4", 104, "a2")))
+    client.feed(frame("edit-message-event", dict(message("b1", 102, content="edited"), edit_id="e1")))
+    settle(loop, cache)
+    assert len(cache) == 5
+    assert [m.id for m in cache.children("a1")] == ["a2", "a3"]
+    assert [m.id for m in cache.thread("a1")] == ["a1", "a2", "a4", "a3"]
+    assert [m.id for m in cache.between(101, 104)] == ["a2", "b1", "a3"]
+    assert cache.message("b1").content == "edited"
+    assert loop.run_until_complete(cache.get_message("a4")).id == "a4"
+    assert (cache.hits, cache.misses) == (1, 0)
+
+    # a1's thread was used last, so b1 is the one to go once we're over.
+    client.feed(frame("send-event", message("c1", 105)))
+    client.feed(frame("send-event", message("c2", 106, "c1")))
+    settle(loop, cache)
+    assert len(cache) == 6
+    assert "b1" not in cache and "a1" in cache
+    assert cache.evictions == 1
+
+    # Reading any message of a thread keeps the whole thread, and the rest goes a thread at a time.
+    cache.message("c2")
+    client.feed(frame("send-event", message("d1", 107)))
+    settle(loop, cache)
+    assert "a1" not in cache and "a4" not in cache, "a subtree is forgotten all at once"
+    assert [m.id for m in cache.thread("c1")] == ["c1", "c2"]
+    assert cache.between(0, 200) == [cache.message(id_) for id_ in ["c1", "c2", "d1"]]
+
+    # A parent arriving after its reply takes the reply into its thread.
+    client.feed(frame("send-event", message("e2", 109, "e1")))
+    client.feed(frame("get-message-reply", message("e1", 108)))
+    settle(loop, cache)
+    assert [m.id for m in cache.thread("e1")] == ["e1", "e2"]
+
+    cache.exit()
+    client.exit()
+
+
+def test_message_cache_stays_consistent():
+    loop = asyncio.get_event_loop()
+    client = Client(room="test", loop=loop)
+    cache = MessageCache(client, max_size=200, loop=loop)
+    for f in make_frames(n=5000):
+        client.feed(f)
+    settle(loop, cache)
+    assert 0 < len(cache) <= 200
+    assert cache.evictions > 0
+    messages = cache.between(0, 2 ** 40)
+    assert len(messages) == len(cache)
+    for m in messages:
+        assert cache.message(m.id) is m
+        if m.parent and m.parent in cache:
+            assert m in cache.children(m.parent)
+        assert all(child.parent == m.id for child in cache.children(m.id))
+
+    cache.exit()
+    client.exit()
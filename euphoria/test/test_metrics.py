@@ -0,0 +1,56 @@
+# euphoria-py
+# Copyright (C) 2015  Emily A. Bellows
+#
+# This program is free software: you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation, either version 3 of the License, or
+# (at your option) any later version.
+#
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with this program.  If not, see <http://www.gnu.org/licenses/>.
+
+import asyncio
+
+from euphoria import Bot, BotConfig
+from euphoria.mock_server import MockServer
+
+
+def test_scrape():
+    loop = asyncio.get_event_loop()
+    server = MockServer(loop=loop)
+    loop.run_until_complete(server.start())
+    config = BotConfig({'bot': {'room': "test", 'nick': "metrics-bot", 'uri_format': server.uri_format,
+                                'metrics_port': 0,
+                                'services': {'botrulez': "euphoria.services.botrulez"}}})
+    bot = Bot(config, loop=loop)
+
+    async def task():
+        while bot.current_nick != "metrics-bot" or not bot._metrics_server.port:
+            await asyncio.sleep(0.01, loop=loop)
+        reader, writer = await asyncio.open_connection("127.0.0.1", bot._metrics_server.port, loop=loop)
+        writer.write(b"GET /metrics HTTP/1.0\r\n\r\n")
+        response = (await reader.read()).decode('utf-8')
+        writer.close()
+        head, body = response.split("\r\n\r\n", 1)
+        assert head.startswith("HTTP/1.0 200 OK")
+        lines = body.splitlines()
+        assert 'euphoria_packets_in_total{bot="metrics-bot",room="test",type="hello-event"} 1' in lines
+        assert 'euphoria_packets_out_total{bot="metrics-bot",room="test",type="nick"} 1' in lines
+        assert 'tiny_agent_mailbox_depth{agent="botrulez",bot="metrics-bot",room="test"} 0' in lines
+        assert any(line.startswith('euphoria_reply_latency_seconds_count{bot="metrics-bot",room="test",type="nick"}')
+                   for line in lines)
+        # Every sample of a metric has to come right after its TYPE line.
+        names = [line.split()[2] for line in lines if line.startswith("# TYPE")]
+        assert len(names) == len(set(names))
+
+    try:
+        loop.run_until_complete(asyncio.wait_for(task(), timeout=5.0, loop=loop))
+    finally:
+        bot.exit()
+        server.close()
+        loop.run_until_complete(server.wait_closed())
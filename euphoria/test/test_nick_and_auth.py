@@ -16,15 +16,20 @@
 
 import asyncio
 import logging
+from typing import Optional
+
 from euphoria import Client, NickAndAuth
+from euphoria.mock_server import MockServer
 
 
-def test_main():
+def run_nick_and_auth(passcode: Optional[str] = None):
     logging.basicConfig(level=logging.INFO)
     loop = asyncio.get_event_loop()
+    server = MockServer(passcode=passcode, loop=loop)
+    loop.run_until_complete(server.start())
 
-    client = Client(room="test", loop=loop)
-    nick_and_auth = NickAndAuth(client, "nick-and-auth-bot", loop=loop)
+    client = Client(room="test", uri_format=server.uri_format, loop=loop)
+    nick_and_auth = NickAndAuth(client, "nick-and-auth-bot", passcode=passcode or "", loop=loop)
     nick_and_auth.bidirectional_link(client)  # Execute both client and nick_and_auth until either of them stops.
     client.connect()
 
@@ -40,8 +45,19 @@ def test_main():
                                          return_when=asyncio.FIRST_COMPLETED))  # Wait on all three
     client.exit()  # Exit if it didn't crash
     nick_and_auth.exit()  # Exit if it didn't crash
+    server.close()
     loop.run_until_complete(asyncio.wait(asyncio.Task.all_tasks(loop=loop)))  # Let everything else shutdown cleanly
     assert nick_cell[0] == nick_and_auth.desired_nick, "after all of this I hope we got to set our nick"
+    return nick_and_auth
+
+
+def test_main():
+    run_nick_and_auth()
+
+
+def test_private_room():
+    nick_and_auth = run_nick_and_auth(passcode="hunter2")
+    assert nick_and_auth.authorized, "we should have gotten past the bounce with our passcode"
 
 
 if __name__ == '__main__':
@@ -0,0 +1,69 @@
+# euphoria-py
+# Copyright (C) 2015  Emily A. Bellows
+#
+# This program is free software: you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation, either version 3 of the License, or
+# (at your option) any later version.
+#
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with this program.  If not, see <http://www.gnu.org/licenses/>.
+
+import json
+
+from euphoria import Packet, SendEvent, SnapshotEvent, ErrorResponse, SessionViewPool, set_session_view_pool
+from euphoria.test.corpus import make_frames
+
+
+def test_lazy_matches_eager():
+    for frame in make_frames(n=200):
+        j = json.loads(frame)
+        eager = Packet(j)
+        lazy = Packet(j, lazy=True)
+        assert eager.type == lazy.type
+        assert eager.is_type(SendEvent) == lazy.is_type(SendEvent)
+        assert type(eager.data) is type(lazy.data), "decoding on demand should give us the same type"
+        if eager.send_event:
+            assert eager.send_event.content == lazy.send_event.content
+            assert eager.send_event.sender.name == lazy.send_event.sender.name
+
+
+def test_lazy_is_type_does_not_decode():
+    snapshot = json.loads(make_frames(n=2)[1])
+    packet = Packet(snapshot, lazy=True)
+    assert packet.is_type(SnapshotEvent)
+    assert packet.send_event is None
+    assert packet._data is None, "checking the type shouldn't have decoded anything"
+    assert len(packet.snapshot_event.log) == 100
+
+
+def test_lazy_error():
+    packet = Packet({"type": "send-reply", "id": "1", "error": "oops"}, lazy=True)
+    try:
+        packet.data
+    except ErrorResponse:
+        pass
+    else:
+        assert False, "errors should still raise when accessing the data"
+
+
+def test_session_view_pool():
+    frames = [json.loads(frame) for frame in make_frames(n=500)]
+    pool = SessionViewPool(max_size=16)
+    set_session_view_pool(pool)
+    try:
+        senders = [Packet(j).send_event.sender for j in frames if j["type"] == "send-event"]
+    finally:
+        set_session_view_pool(None)
+
+    assert len(pool) <= 16, "the pool should stay bounded"
+    assert pool.hits > 0, "a busy room should repeat senders"
+    assert len(set(map(id, senders))) < len(senders), "repeated senders should share views"
+    for sender in senders:
+        same = [other for other in senders if other.session_id == sender.session_id and other.name == sender.name]
+        assert all(other.id == sender.id for other in same)
@@ -0,0 +1,47 @@
+# euphoria-py
+# Copyright (C) 2015  Emily A. Bellows
+#
+# This program is free software: you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation, either version 3 of the License, or
+# (at your option) any later version.
+#
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with this program.  If not, see <http://www.gnu.org/licenses/>.
+
+from euphoria import RateLimiter, shared_rate_limiter
+
+
+def test_bucket_refills_at_rate():
+    limiter = RateLimiter(rate=2.0, burst=2.0)
+    assert limiter.try_acquire(0.0) == 0.0
+    assert limiter.try_acquire(0.0) == 0.0
+    assert limiter.try_acquire(0.0) == 0.5, "the bucket is empty, a token takes half a second at 2/s"
+    assert limiter.try_acquire(0.5) == 0.0
+    assert limiter.delays == 1
+
+
+def test_throttling_backs_off_then_recovers():
+    limiter = RateLimiter(rate=4.0, burst=4.0, min_rate=1.0, backoff=0.5, recovery=1.0)
+    limiter.throttled(0.0)
+    assert limiter.rate == 2.0
+    assert limiter.try_acquire(0.0) > 0.0, "throttling empties the bucket"
+    limiter.throttled(0.0)
+    limiter.throttled(0.0)
+    assert limiter.rate == 1.0, "never below min_rate"
+    assert limiter.throttle_events == 3
+    limiter.try_acquire(2.0)
+    assert limiter.rate == 3.0
+    limiter.try_acquire(10.0)
+    assert limiter.rate == limiter.max_rate
+
+
+def test_shared_limiter_per_key():
+    first = shared_rate_limiter("test_shared_limiter_per_key", 5.0)
+    assert shared_rate_limiter("test_shared_limiter_per_key", 1.0) is first
+    assert shared_rate_limiter("test_shared_limiter_per_key_other", 5.0) is not first
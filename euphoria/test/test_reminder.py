@@ -0,0 +1,120 @@
+# euphoria-py
+# Copyright (C) 2015  Emily A. Bellows
+#
+# This program is free software: you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation, either version 3 of the License, or
+# (at your option) any later version.
+#
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with this program.  If not, see <http://www.gnu.org/licenses/>.
+
+import asyncio
+import os
+import tempfile
+
+from euphoria import Bot, BotConfig
+from euphoria.mock_server import MockServer
+from euphoria.services.reminder import ReminderStore, format_delay, parse_delay
+
+
+def test_delays():
+    assert parse_delay("30", "s") == 30.0
+    assert parse_delay("1.5", "h") == 5400.0
+    assert parse_delay("2", "d") == 172800.0
+    assert format_delay(90061) == "1d 1h"
+    assert format_delay(125) == "2m 5s"
+    assert format_delay(0) == "0s"
+
+
+def test_store_survives_reopening():
+    with tempfile.TemporaryDirectory() as directory:
+        path = os.path.join(directory, "reminders.sqlite3")
+        store = ReminderStore(path, "room/bot")
+        early = store.add(100.0, "agent:a", "alice", "eat food")
+        late = store.add(5000.0, "agent:a", "alice", "sleep")
+        other = store.add(200.0, "agent:b", "bob", "walk")
+        ReminderStore(path, "room/other-bot").add(150.0, "agent:a", "alice", "not ours")
+        store.close()
+
+        store = ReminderStore(path, "room/bot")
+        assert store.due_between(float('-inf'), 1000.0) == [(100.0, early), (200.0, other)], \
+            "only the near-term slice, and only this bot's"
+        assert [id_ for id_, _, _ in store.for_sender("agent:a")] == [early, late]
+        assert not store.cancel(late, "agent:b"), "you can't cancel someone else's reminder"
+        assert store.cancel(late, "agent:a")
+        assert store.due_between(1000.0, 10000.0) == []
+        assert store.fetch([early, other, late]) == [(early, "alice", "eat food"), (other, "bob", "walk")], \
+            "a cancelled reminder doesn't fire"
+        store.remove(early)
+        assert store.fetch([early]) == [], "and neither does one that was delivered"
+        store.close()
+
+
+def test_overdue_reminder_delivered_after_joining():
+    loop = asyncio.get_event_loop()
+    server = MockServer(loop=loop)
+    loop.run_until_complete(server.start())
+    with tempfile.TemporaryDirectory() as directory:
+        path = os.path.join(directory, "reminders.sqlite3")
+        store = ReminderStore(path, "test/reminder-bot")
+        id_ = store.add(100.0, "agent:a", "alice", "eat food")  # long overdue by the time the bot starts
+        config = BotConfig({'bot': {'room': "test", 'nick': "reminder-bot", 'uri_format': server.uri_format,
+                                    'services': {'reminder': {'module': "euphoria.services.reminder",
+                                                              'db_file': path}}}})
+        bot = Bot(config, loop=loop)
+
+        async def task():
+            while not store.due_between(float('-inf'), 1000.0) == []:
+                await asyncio.sleep(0.01, loop=loop)
+
+        try:
+            loop.run_until_complete(asyncio.wait_for(task(), timeout=5.0, loop=loop))
+            contents = [message["content"] for message in server._rooms["test"].log]
+            assert "reminder @alice: eat food" in contents, "the row only goes once the server has the message"
+            assert store.fetch([id_]) == []
+        finally:
+            bot.exit()
+            store.close()
+            server.close()
+            loop.run_until_complete(server.wait_closed())
+
+
+def test_restarted_service_delivers():
+    # A restarted service comes up after the snapshot went by, it still knows we're in the room.
+    loop = asyncio.get_event_loop()
+    server = MockServer(loop=loop)
+    loop.run_until_complete(server.start())
+    with tempfile.TemporaryDirectory() as directory:
+        path = os.path.join(directory, "reminders.sqlite3")
+        store = ReminderStore(path, "test/reminder-bot")
+        config = BotConfig({'bot': {'room': "test", 'nick': "reminder-bot", 'uri_format': server.uri_format,
+                                    'services': {'reminder': {'module': "euphoria.services.reminder",
+                                                              'db_file': path}}}})
+        bot = Bot(config, loop=loop)
+
+        async def task():
+            while not bot.joined:
+                await asyncio.sleep(0.01, loop=loop)
+            service = await bot.service_supervisor.get("reminder")
+            id_ = store.add(100.0, "agent:a", "alice", "eat food")  # the running service isn't looking for it
+            service.exit(Exception("crash"))
+            while await bot.service_supervisor.get("reminder") is service:
+                await asyncio.sleep(0.01, loop=loop)
+            while store.fetch([id_]):
+                await asyncio.sleep(0.01, loop=loop)
+
+        try:
+            loop.run_until_complete(asyncio.wait_for(task(), timeout=5.0, loop=loop))
+            contents = [message["content"] for message in server._rooms["test"].log]
+            assert "reminder @alice: eat food" in contents
+        finally:
+            bot.exit()
+            store.close()
+            server.close()
+            loop.run_until_complete(server.wait_closed())
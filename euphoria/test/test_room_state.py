@@ -0,0 +1,116 @@
+# euphoria-py
+# Copyright (C) 2015  Emily A. Bellows
+#
+# This program is free software: you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation, either version 3 of the License, or
+# (at your option) any later version.
+#
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with this program.  If not, see <http://www.gnu.org/licenses/>.
+
+import asyncio
+import json
+from asyncio import AbstractEventLoop
+
+import tiny_agent
+from euphoria import Client, RoomChange, RoomState, normalize_nick
+from euphoria.test.corpus import frame, make_frames, settle
+from tiny_agent import Agent
+
+
+def session(n: int, name: str, agent: int = None, server: str = "heim.1") -> dict:
+    return {"id": "agent:{0}".format(n if agent is None else agent), "name": name, "server_id": server,
+            "server_era": "era", "session_id": "session{0}".format(n)}
+
+
+class Watcher(Agent):
+    @tiny_agent.init
+    def __init__(self, loop: AbstractEventLoop = None):
+        super(Watcher, self).__init__(loop=loop)
+        self.changes = []
+
+    @tiny_agent.send
+    async def on_room_change(self, change: RoomChange):
+        self.changes.append(change)
+
+
+def test_normalize_nick():
+    assert normalize_nick("Test Bot") == normalize_nick("testbot") == "testbot"
+    assert normalize_nick(" a\tB ") == "ab"
+
+
+def test_room_state():
+    loop = asyncio.get_event_loop()
+    client = Client(room="test", loop=loop)
+    room = RoomState(client, loop=loop)
+    watcher = Watcher(loop=loop)
+    room.add_listener(watcher)
+
+    client.feed(frame("hello-event", {"id": "agent:me", "session": session(0, "me", agent=0),
+                                      "room_is_private": False, "version": "1"}))
+    listing = [session(1, "Alice"), session(2, "Alice", agent=1), session(3, "Test Bot", server="heim.2")]
+    client.feed(frame("snapshot-event", {"identity": "agent:0", "session_id": "session0", "version": "1",
+                                         "listing": listing, "log": []}))
+    settle(loop, room, watcher)
+    assert room.own_session.name == "me"
+    assert len(room) == 3
+    assert [view.session_id for view in room.sessions_of("agent:1")] == ["session1", "session2"]
+    assert [view.session_id for view in room.with_nick("testbot")] == ["session3"]
+    assert room.nicks == ["Alice", "Test Bot"]
+
+    client.feed(frame("join-event", session(4, "Bob")))
+    client.feed(frame("nick-event", {"session_id": "session1", "id": "agent:1", "from": "Alice", "to": "Carol"}))
+    client.feed(frame("part-event", session(2, "Alice", agent=1)))
+    client.feed(frame("part-event", session(9, "Nobody")))
+    client.feed(frame("nick-reply", {"session_id": "session0", "id": "agent:0", "from": "me", "to": "bot"}, id="1"))
+    settle(loop, room, watcher)
+    assert room.own_session.name == "bot"
+    assert room.session("session1").name == "Carol"
+    assert room.with_nick("alice") == [], "the old nick and the session that left are both forgotten"
+    assert room.session("session2") is None
+    assert room.nicks == ["Bob", "Carol", "Test Bot"]
+
+    client.feed(frame("network-event", {"type": "partition", "server_id": "heim.2", "server_era": "era"}))
+    settle(loop, room, watcher)
+    assert room.with_nick("Test Bot") == []
+    assert [(change.kind, change.session and change.session.name) for change in watcher.changes] == \
+        [("snapshot", None), ("join", "Bob"), ("nick", "Carol"), ("part", "Alice"), ("part", "Test Bot")]
+    assert watcher.changes[2].previous.name == "Alice"
+
+    watcher.exit()
+    room.exit()
+    client.exit()
+
+
+def test_room_state_matches_rebuild():
+    # After a long stretch of joins, parts and nick changes the indexes agree with a listing built from scratch.
+    loop = asyncio.get_event_loop()
+    client = Client(room="test", loop=loop)
+    room = RoomState(client, loop=loop)
+    listing = {}
+    for f in make_frames(n=3000):
+        client.feed(f)
+        j = json.loads(f)
+        type_, data = j["type"], j.get("data")
+        if type_ == "snapshot-event":
+            listing = {view["session_id"]: view["name"] for view in data["listing"]}
+        elif type_ == "join-event":
+            listing[data["session_id"]] = data["name"]
+        elif type_ == "part-event":
+            listing.pop(data["session_id"], None)
+        elif type_ == "nick-event" and data["session_id"] in listing:
+            listing[data["session_id"]] = data["to"]
+    settle(loop, room)
+    assert {view.session_id: view.name for view in room.sessions} == listing
+    for session_id, name in listing.items():
+        assert room.session(session_id) in room.with_nick(name)
+        assert room.session(session_id) in room.sessions_of(room.session(session_id).id)
+
+    room.exit()
+    client.exit()
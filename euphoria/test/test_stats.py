@@ -0,0 +1,63 @@
+# euphoria-py
+# Copyright (C) 2015  Emily A. Bellows
+#
+# This program is free software: you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation, either version 3 of the License, or
+# (at your option) any later version.
+#
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with this program.  If not, see <http://www.gnu.org/licenses/>.
+
+import asyncio
+
+from euphoria import Client, Histogram
+from euphoria.mock_server import MockServer
+from euphoria.services.botrulez import format_stats
+
+
+def test_histogram_quantiles():
+    histogram = Histogram()
+    assert histogram.quantile(0.5) == 0.0
+    for n in range(1, 101):
+        histogram.record(n / 1000)
+    assert histogram.count == 100
+    assert abs(histogram.mean - 0.0505) < 1e-9
+    # Buckets grow by about 41% each, so that's how far off a quantile can be.
+    assert 0.050 <= histogram.quantile(0.5) <= 0.050 * 1.42
+    assert 0.099 <= histogram.quantile(0.99) <= 0.100
+    histogram.record(1000.0)
+    assert histogram.quantile(1.0) == 1000.0, "the overflow bucket reports the largest sample"
+    assert len(histogram.counts) == len(histogram.bounds) + 1
+
+
+def test_client_latency():
+    loop = asyncio.get_event_loop()
+    server = MockServer(loop=loop)
+    loop.run_until_complete(server.start())
+    client = Client(room="test", uri_format=server.uri_format, loop=loop)
+    client.connect()
+
+    async def task():
+        while not client.connected:
+            await asyncio.sleep(0.01, loop=loop)
+        await asyncio.gather(*[client.send_content("hi {0}".format(n)) for n in range(20)], loop=loop)
+        latency = client.latency("send")
+        assert latency.count == 20
+        assert 0.0 < latency.quantile(0.5) <= latency.quantile(0.99) < 1.0
+        assert client.latency("nick") is None
+        stats = client.stats()
+        assert stats['latency']['send']['count'] == 20
+        assert "send: " in format_stats(stats)
+
+    try:
+        loop.run_until_complete(asyncio.wait_for(task(), timeout=5.0, loop=loop))
+    finally:
+        client.exit()
+        server.close()
+        loop.run_until_complete(server.wait_closed())
@@ -15,6 +15,7 @@
 # along with this program.  If not, see <http://www.gnu.org/licenses/>.
 
 from .agent import *
+from .timer import *
 from .supervisor import *
 
-__all__ = (agent.__all__ + supervisor.__all__)
+__all__ = (agent.__all__ + timer.__all__ + supervisor.__all__)
@@ -16,12 +16,13 @@
 
 import asyncio
 import logging
-from asyncio import AbstractEventLoop, Queue, Future, Task
+from asyncio import AbstractEventLoop, Future, Task
+from collections import deque
 from functools import wraps
 from typing import Optional
 from weakref import WeakSet
 
-__all__ = ['Agent', 'LinkedTask', 'send', 'call', 'init']
+__all__ = ['Agent', 'AgentExited', 'LinkedTask', 'send', 'call', 'batch', 'init']
 
 logger = logging.getLogger(__name__)
 
@@ -29,33 +30,79 @@ logger = logging.getLogger(__name__)
 def send(f):
     @wraps(f)
     def send_wrapper(self: 'Agent', *args, **kwargs) -> None:
-        async def do_it():
-            result = await f(self, *args, **kwargs)
-            if result is not None:
-                logger.warning("%s tried to return a result in a @Agent.send method, %s", self, f)
-
-        if self.alive:
-            self._queue.put_nowait(do_it)
+        if self._task is not None:
+            self._enqueue((f, args, kwargs, None))
 
     return send_wrapper
 
 
-def call(f):
+class AgentExited(Exception):
+    """Set on the future of a call to an agent that has exited, or that exits before answering.
+
+    :param agent: The agent that exited
+    :param reason: The exception it exited because of, None if it exited normally"""
+
+    def __init__(self, agent: 'Agent', reason: Optional[Exception] = None):
+        if reason is None:
+            message = "{0} exited".format(agent)
+        else:
+            message = "{0} exited because {1!r}".format(agent, reason)
+        super(AgentExited, self).__init__(message)
+        self.agent = agent
+        self.reason = reason
+
+
+def _time_out(future: Future, timeout: float):
+    if not future.done():
+        future.set_exception(asyncio.TimeoutError("no answer within {0} seconds".format(timeout)))
+
+
+def call(f=None, *, timeout: Optional[float] = None):
+    """Makes a method run in the agent's mailbox, returning a future for its result. If the method
+    raises, the future gets the exception. If the agent has exited, or exits before getting to
+    it, the future gets :py:class:`tiny_agent.AgentExited`.
+
+    Use as @call, or as @call(timeout=seconds) to fail the future with asyncio.TimeoutError if
+    the answer takes longer than that. The method still runs when it gets its turn."""
+    if f is None:
+        return lambda f_: call(f_, timeout=timeout)
+
     @wraps(f)
     def call_wrapper(self: 'Agent', *args, **kwargs) -> Future:
         future = Future(loop=self._loop)
-
-        async def do_it():
-            x = await f(self, *args, **kwargs)
-            future.set_result(x)
-
-        if self.alive:
-            self._queue.put_nowait(do_it)
+        if self._task is None:
+            future.set_exception(AgentExited(self))
+            return future
+        self._enqueue((f, args, kwargs, future))
+        if timeout is not None:
+            handle = (self._loop or asyncio.get_event_loop()).call_later(timeout, _time_out, future, timeout)
+            future.add_done_callback(lambda _: handle.cancel())
         return future
 
     return call_wrapper
 
 
+# Stands in for the future of a @batch message, so _main knows to gather its neighbours.
+_BATCH = object()
+
+
+def batch(f):
+    """Like send, but the method takes a list. Every message for it that is waiting back to back
+    in the mailbox is handed over in one call, up to the agent's MAILBOX_BATCH, so the sender still
+    calls it with one item at a time."""
+    @wraps(f)
+    def batch_wrapper(self: 'Agent', item) -> None:
+        if self._task is not None:
+            self._enqueue((f, item, None, _BATCH))
+
+    batch_wrapper.batched = True
+    return batch_wrapper
+
+
+async def _run_posted(self: 'Agent', fn, *args, **kwargs):
+    return await fn(*args, **kwargs)
+
+
 def init(f):
     @wraps(f)
     def init_wrapper(self: 'Agent', *args, **kwargs):
@@ -75,13 +122,17 @@ def init(f):
     return init_wrapper
 
 
-class Agent:
+class _Linkable:
+    # What agents and linked tasks share: a task, and the links and monitors that hear when it ends.
+
+    # What holds links and monitors. Agents link to each other in every direction, so they hold each other weakly.
+    _link_set = WeakSet
+
     def __init__(self, loop: AbstractEventLoop = None):
         self._loop = loop
-        self._links = WeakSet()
-        self._monitors = WeakSet()
-        self._queue = Queue(loop=self._loop)
-        self._task = asyncio.ensure_future(self._main(), loop=self._loop)
+        self._links = self._link_set()
+        self._monitors = self._link_set()
+        self._task = None
 
     @property
     def alive(self) -> bool:
@@ -99,32 +150,18 @@ class Agent:
     def task(self) -> Task:
         return self._task
 
-    def bidirectional_link(self, to: 'Agent'):
+    def bidirectional_link(self, to: '_Linkable'):
         self._links.add(to)
         to._links.add(self)
 
-    def unlink(self, from_: 'Agent'):
+    def unlink(self, from_: '_Linkable'):
         self._links.remove(from_)
         from_._links.remove(self)
 
-    def monitor(self, monitored: 'Agent'):
+    def monitor(self, monitored: '_Linkable'):
         self._links.add(monitored)
         monitored._monitors.add(self)
 
-    def spawn_linked_task(self, coro_or_future, unlink_on_success: bool = True) -> 'LinkedTask':
-        return LinkedTask(self, coro_or_future, unlink_on_success=unlink_on_success, loop=self._loop)
-
-    async def _main(self):
-        # noinspection PyBroadException
-        try:
-            while self.alive:
-                fun = await self._queue.get()
-                await fun()
-        except Exception as exc:
-            self.exit(exc)
-        else:
-            self.exit(None)
-
     def exit(self, exc: Optional[Exception] = None):
         old_task = self._task
         try:
@@ -147,28 +184,141 @@ class Agent:
                                    monitor, self)
         finally:
             if old_task is not None:
+                self._on_exit(exc)
                 old_task.cancel()
-                self._links = WeakSet()
-                self._monitors = WeakSet()
+                self._links = self._link_set()
+                self._monitors = self._link_set()
 
+    def _on_exit(self, exc: Optional[Exception]):
+        pass
+
+
+class Agent(_Linkable):
+    # The most messages to handle back to back before letting other tasks run, and the
+    # longest list a @batch method is handed at once.
+    MAILBOX_BATCH = 256
+
+    def __init__(self, loop: AbstractEventLoop = None):
+        super(Agent, self).__init__(loop=loop)
+        # Every message is one (function, args, kwargs, future or None) tuple, the future only for @call.
+        # A @batch message carries its one item where the args would be.
+        # _waker is only set while _main is waiting on an empty mailbox.
+        self._mailbox = deque()
+        self._waker = None
+        self._current = None  # the future of the @call being handled right now
+        self._task = asyncio.ensure_future(self._main(), loop=self._loop)
+
+    @property
+    def mailbox_depth(self) -> int:
+        return len(self._mailbox)
+
+    def post(self, fn, *args, **kwargs) -> Future:
+        # Runs the coroutine function fn in our mailbox, like a @call method
+        # would, but for a function decided on at runtime. If it raises, the
+        # future gets the exception and we exit just as we would for a method.
+        future = Future(loop=self._loop)
+        if self._task is not None:
+            self._enqueue((_run_posted, (fn,) + args, kwargs, future))
+        else:
+            future.cancel()
+        return future
+
+    def _enqueue(self, message: tuple):
+        self._mailbox.append(message)
+        waker = self._waker
+        if waker is not None:
+            self._waker = None
+            if not waker.done():
+                waker.set_result(None)
+
+    def spawn_linked_task(self, coro_or_future, unlink_on_success: bool = True) -> 'LinkedTask':
+        return LinkedTask(self, coro_or_future, unlink_on_success=unlink_on_success, loop=self._loop)
+
+    async def _main(self):
+        # noinspection PyBroadException
+        try:
+            mailbox = self._mailbox
+            limit = self.MAILBOX_BATCH
+            handled = 0
+            while self._task is not None:
+                if not mailbox:
+                    handled = 0
+                    self._waker = Future(loop=self._loop)
+                    await self._waker
+                    continue
+                if handled >= limit:
+                    handled = 0
+                    await asyncio.sleep(0, loop=self._loop)
+                    continue
+                f, args, kwargs, future = mailbox.popleft()
+                handled += 1
+                if future is _BATCH:
+                    items = [args]
+                    while mailbox and len(items) < limit and mailbox[0][0] is f and mailbox[0][3] is _BATCH:
+                        items.append(mailbox.popleft()[1])
+                    handled += len(items) - 1
+                    result = await f(self, items)
+                    future = None
+                else:
+                    self._current = future
+                    result = await f(self, *args, **kwargs)
+                if future is not None:
+                    self._current = None
+                    if not future.done():  # the caller may have given up on it
+                        future.set_result(result)
+                elif result is not None:
+                    logger.warning("%s tried to return a result in a @Agent.send method, %s", self, f)
+        except Exception as exc:
+            current = self._current
+            if current is not None and not current.done():
+                current.set_exception(exc)
+            self.exit(exc)
+        else:
+            self.exit(None)
+
+    def _on_exit(self, exc: Optional[Exception]):
+        # Nobody is going to answer these now, so don't leave the callers waiting forever.
+        error = AgentExited(self, exc)
+        futures = [self._current] + [message[3] for message in self._mailbox]
+        self._current = None
+        self._mailbox.clear()
+        for future in futures:
+            if future is not None and future is not _BATCH and not future.done():
+                future.set_exception(error)
+
+
+class LinkedTask(_Linkable):
+    """Runs a coroutine in its own task, linked both ways to an agent: if the coroutine raises,
+    the agent exits too, and if the agent exits, the coroutine is cancelled. If it finishes
+    successfully it unlinks first when unlink_on_success, otherwise it takes the agent down with it.
+
+    Just the task and a done callback, no mailbox, so there can be one per timer."""
+
+    # Nothing links to a linked task but the agent that spawned it, which the task needs alive anyway,
+    # so plain sets do and are much smaller than WeakSets.
+    _link_set = set
 
-class LinkedTask(Agent):
-    @init
     def __init__(self, linked_to: Agent, coro_or_future, unlink_on_success: bool = True,
                  loop: AbstractEventLoop = None):
         super(LinkedTask, self).__init__(loop=loop)
+        self._linked_to = linked_to if unlink_on_success else None
+        self._task = asyncio.ensure_future(coro_or_future, loop=loop)
         self.bidirectional_link(linked_to)
-
-        async def do_it():
-            try:
-                result = await coro_or_future
-                if result is not None:
-                    logger.warning("%s tried to return a result from a LinkedTask, %s", coro_or_future, self)
-                if unlink_on_success:
-                    self.unlink(linked_to)  # We finished successfully so lets not kill our friend when we die
-            except Exception:
-                raise
-            else:
-                self.exit()
-
-        self._queue.put_nowait(do_it)
+        self._task.add_done_callback(self._on_done)
+
+    def _on_done(self, task: Future):
+        linked_to, self._linked_to = self._linked_to, None
+        if self._task is None:
+            return  # we were told to exit, that's what cancelled it
+        if task.cancelled():
+            self.exit(asyncio.CancelledError())
+            return
+        exc = task.exception()
+        if exc is not None:
+            self.exit(exc)
+            return
+        if task.result() is not None:
+            logger.warning("%s tried to return a result from a LinkedTask, %s", task, self)
+        if linked_to is not None and linked_to in self._links:
+            self.unlink(linked_to)  # We finished successfully so lets not kill our friend when we die
+        self.exit()
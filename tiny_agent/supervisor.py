@@ -14,17 +14,19 @@
 # You should have received a copy of the GNU General Public License
 # along with this program.  If not, see <http://www.gnu.org/licenses/>.
 
-import asyncio
 import logging
 from asyncio import AbstractEventLoop
-from typing import Optional, Callable
-from tiny_agent import Agent
+from typing import Optional, Callable, Dict
+from tiny_agent import Agent, timer_wheel
 import tiny_agent
 
 __all__ = ['SupervisorOneForOne', 'SupervisorOneForAll', 'Restart', 'TooManyRestarts']
 
 logger = logging.getLogger(__name__)
 
+# A lookup is instant, so only a wedged supervisor takes this long to answer one.
+GET_TIMEOUT = 10.0
+
 
 class Restart(Exception):
     pass
@@ -40,12 +42,26 @@ class SupervisorOneForOne(Agent):
         super(SupervisorOneForOne, self).__init__(loop=loop)
         self._max_restarts = max_restarts
         self._restarts = 0
+        self._total_restarts = 0
+        self._restarts_by_name = {}
         self._period = period
-        self._period_task = None
+        self._period_timer = None
         self._children = {}
         self._agent_to_name = {}
         self._name_to_agent = {}
 
+    @property
+    def total_restarts(self) -> int:
+        return self._total_restarts
+
+    @property
+    def restarts_by_name(self) -> Dict[str, int]:
+        return self._restarts_by_name
+
+    @property
+    def children(self) -> Dict[str, Agent]:
+        return self._name_to_agent
+
     @tiny_agent.send
     async def add_child(self, name: str, factory: Callable[[], Agent]):
         assert name not in self._children
@@ -55,12 +71,10 @@ class SupervisorOneForOne(Agent):
         self._agent_to_name[child] = name
         self._name_to_agent[name] = child
 
-    async def _period_task_body(self):
-        await asyncio.sleep(self._period)
-        if self.alive:
-            logger.debug("%s: resetting restart count", self)
-            self._restarts = 0
-        self._period_task = None
+    @tiny_agent.send
+    async def _end_period(self):
+        logger.debug("%s: resetting restart count", self)
+        self._restarts = 0
 
     @tiny_agent.send
     async def on_monitored_exit(self, who: Agent, exc: Optional[Exception]):
@@ -74,10 +88,13 @@ class SupervisorOneForOne(Agent):
         if self._restarts >= self._max_restarts:
             raise TooManyRestarts
         self._restarts += 1
+        self._total_restarts += 1
+        self._restarts_by_name[name] = self._restarts_by_name.get(name, 0) + 1
 
-        if self._period_task:
-            self._period_task.cancel()
-        self._period_task = asyncio.ensure_future(self._period_task_body(), loop=self._loop)
+        if self._period_timer is None:
+            self._period_timer = timer_wheel(self._loop).schedule(self._period, self._end_period)
+        else:
+            self._period_timer.reschedule(self._period)
 
         factory = self._children[name]
         new_child = factory()
@@ -85,10 +102,17 @@ class SupervisorOneForOne(Agent):
         self._agent_to_name[new_child] = name
         self._name_to_agent[name] = new_child
 
-    @tiny_agent.call
+    @tiny_agent.call(timeout=GET_TIMEOUT)
     async def get(self, name: str, default: Optional[Agent] = None) -> Optional[Agent]:
         return self._name_to_agent.get(name, default)
 
+    def exit(self, exc: Optional[Exception] = None):
+        super(SupervisorOneForOne, self).exit(exc)
+        # The wheel is shared by the whole loop, don't leave it holding on to us until the period ends.
+        period_timer = getattr(self, '_period_timer', None)  # we might not have gotten that far in __init__
+        if period_timer is not None:
+            period_timer.cancel()
+
 
 class SupervisorOneForAll(Agent):
     @tiny_agent.init
@@ -99,6 +123,10 @@ class SupervisorOneForAll(Agent):
         self._name_to_agent = {}
         self._restarts = 0
 
+    @property
+    def total_restarts(self) -> int:
+        return self._restarts
+
     @tiny_agent.send
     async def add_child(self, name: str, factory: Callable[[], Agent]):
         assert name not in self._children
@@ -130,6 +158,6 @@ class SupervisorOneForAll(Agent):
         self._agent_to_name = {}
         self._name_to_agent = {}
 
-    @tiny_agent.call
+    @tiny_agent.call(timeout=GET_TIMEOUT)
     async def get(self, name: str, default: Optional[Agent] = None) -> Optional[Agent]:
         return self._name_to_agent.get(name, default)
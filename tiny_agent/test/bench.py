@@ -0,0 +1,43 @@
+# euphoria-py
+# Copyright (C) 2015  Emily A. Bellows
+#
+# This program is free software: you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation, either version 3 of the License, or
+# (at your option) any later version.
+#
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with this program.  If not, see <http://www.gnu.org/licenses/>.
+
+
+"""Timing helpers shared by the benchmarks."""
+
+import time
+from typing import Callable
+
+
+def best_of(fn: Callable, repeat: int = 5, clock: Callable[[], float] = time.perf_counter) -> float:
+    """Runs fn repeat times and returns the fastest run in seconds, as measured by clock.
+
+    :rtype: float"""
+    best = None
+    for _ in range(repeat):
+        started = clock()
+        fn()
+        elapsed = clock() - started
+        best = elapsed if best is None else min(best, elapsed)
+    return best
+
+
+def compare(label: str, count: int, old: Callable, new: Callable, names: tuple = ("old", "new"), repeat: int = 5,
+            clock: Callable[[], float] = time.perf_counter):
+    """Prints how many of count operations a second old and new each manage, and how much faster new is."""
+    old_rate = count / best_of(old, repeat, clock)
+    new_rate = count / best_of(new, repeat, clock)
+    print("{0:<28} {1}: {2:>10.0f}/s   {3}: {4:>10.0f}/s   ({5:.2f}x)".format(
+        label, names[0], old_rate, names[1], new_rate, new_rate / old_rate))
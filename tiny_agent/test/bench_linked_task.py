@@ -0,0 +1,103 @@
+# euphoria-py
+# Copyright (C) 2015  Emily A. Bellows
+#
+# This program is free software: you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation, either version 3 of the License, or
+# (at your option) any later version.
+#
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with this program.  If not, see <http://www.gnu.org/licenses/>.
+
+"""Compares spawning linked tasks as plain tasks with a done callback against the full agents
+they used to be, run with 'python -m tiny_agent.test.bench_linked_task'"""
+
+import asyncio
+import gc
+import time
+import tracemalloc
+
+import tiny_agent
+from tiny_agent import Agent
+
+
+# The old LinkedTask: an agent of its own, with a mailbox, a _main task and an @init check task.
+
+class AgentLinkedTask(Agent):
+    @tiny_agent.init
+    def __init__(self, linked_to: Agent, coro_or_future, loop=None):
+        super(AgentLinkedTask, self).__init__(loop=loop)
+        self.bidirectional_link(linked_to)
+        self._enqueue((AgentLinkedTask._run, (linked_to, coro_or_future), {}, None))
+
+    async def _run(self, linked_to: Agent, coro_or_future):
+        await coro_or_future
+        self.unlink(linked_to)
+        self.exit()
+
+
+def spawn_agents(parent: Agent, coro):
+    return AgentLinkedTask(parent, coro, loop=parent.loop)
+
+
+def spawn_tasks(parent: Agent, coro):
+    return parent.spawn_linked_task(coro)
+
+
+def measure(loop, spawn, count: int, trace: bool):
+    # Returns the seconds to spawn count linked tasks and see them all finish, and with
+    # trace, the memory they held once they were all running.
+    parent = Agent(loop=loop)
+    release = asyncio.Event(loop=loop)
+
+    async def wait():
+        await release.wait()
+
+    async def run():
+        started = time.perf_counter()
+        tasks = [spawn(parent, wait()) for _ in range(count)]
+        await asyncio.sleep(0, loop=loop)
+        held = tracemalloc.get_traced_memory()[0] if trace else 0
+        release.set()
+        while any(task.alive for task in tasks):
+            await asyncio.sleep(0.01, loop=loop)
+        return time.perf_counter() - started, held
+
+    # An agent that exits itself cancels its own _main task, which asyncio then complains about
+    # once per old linked task. That's not what's being measured, so don't spend time logging it.
+    loop.set_exception_handler(lambda loop_, context: None)
+    gc.collect()
+    if trace:
+        tracemalloc.start()
+    try:
+        elapsed, held = loop.run_until_complete(run())
+    finally:
+        if trace:
+            tracemalloc.stop()
+        loop.set_exception_handler(None)
+    assert parent.alive, "every linked task finished successfully, so the parent should be fine"
+    parent.exit()
+    return elapsed, held
+
+
+def main():
+    loop = asyncio.get_event_loop()
+    count = 100000
+    old_time, _ = measure(loop, spawn_agents, count, trace=False)
+    new_time, _ = measure(loop, spawn_tasks, count, trace=False)
+    _, old_peak = measure(loop, spawn_agents, count, trace=True)
+    _, new_peak = measure(loop, spawn_tasks, count, trace=True)
+    print("{0} linked tasks".format(count))
+    print("{0:<8} agents: {1:>8.2f}s     tasks: {2:>8.2f}s     ({3:.2f}x)".format(
+        "time", old_time, new_time, old_time / new_time))
+    print("{0:<8} agents: {1:>8.1f}MiB   tasks: {2:>8.1f}MiB   ({3:.2f}x)".format(
+        "memory", old_peak / 2 ** 20, new_peak / 2 ** 20, old_peak / new_peak))
+
+
+if __name__ == '__main__':
+    main()
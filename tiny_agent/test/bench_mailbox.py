@@ -0,0 +1,114 @@
+# euphoria-py
+# Copyright (C) 2015  Emily A. Bellows
+#
+# This program is free software: you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation, either version 3 of the License, or
+# (at your option) any later version.
+#
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with this program.  If not, see <http://www.gnu.org/licenses/>.
+
+"""Compares the deque mailbox against the asyncio.Queue of closures agents used to have,
+run with 'python -m tiny_agent.test.bench_mailbox'"""
+
+import asyncio
+import time
+from asyncio import Future, Queue
+
+import tiny_agent
+from tiny_agent import Agent
+
+
+# The old mailbox: an asyncio.Queue, and a fresh closure for every message put on it.
+
+class QueueAgent:
+    def __init__(self, loop=None):
+        self._loop = loop
+        self._queue = Queue(loop=loop)
+        self._task = asyncio.ensure_future(self._main(), loop=loop)
+        self._counter = 0
+
+    async def _main(self):
+        while self._task is not None:
+            fun = await self._queue.get()
+            await fun()
+
+    def exit(self):
+        self._task.cancel()
+        self._task = None
+
+    def increment(self):
+        async def do_it():
+            self._counter += 1
+
+        self._queue.put_nowait(do_it)
+
+    def current(self) -> Future:
+        future = Future(loop=self._loop)
+
+        async def do_it():
+            future.set_result(self._counter)
+
+        self._queue.put_nowait(do_it)
+        return future
+
+
+class DequeAgent(Agent):
+    def __init__(self, loop=None):
+        super(DequeAgent, self).__init__(loop=loop)
+        self._counter = 0
+
+    @tiny_agent.send
+    async def increment(self):
+        self._counter += 1
+
+    @tiny_agent.call
+    async def current(self) -> int:
+        return self._counter
+
+
+def throughput(loop, agent, count: int) -> float:
+    # Messages per second for a burst of sends followed by one call to wait for them all.
+    async def run():
+        started = time.perf_counter()
+        for _ in range(count):
+            agent.increment()
+        await agent.current()
+        return time.perf_counter() - started
+
+    return count / min(loop.run_until_complete(run()) for _ in range(5))
+
+
+def latency(loop, agent, count: int) -> float:
+    # Mean seconds from making a call on an idle agent to having its answer.
+    async def run():
+        started = time.perf_counter()
+        for _ in range(count):
+            await agent.current()
+        return time.perf_counter() - started
+
+    return min(loop.run_until_complete(run()) for _ in range(5)) / count
+
+
+def main():
+    loop = asyncio.get_event_loop()
+    old, new = QueueAgent(loop=loop), DequeAgent(loop=loop)
+    old_rate, new_rate = throughput(loop, old, 100000), throughput(loop, new, 100000)
+    print("{0:<16} queue: {1:>10.0f}/s   deque: {2:>10.0f}/s   ({3:.2f}x)".format(
+        "send throughput", old_rate, new_rate, new_rate / old_rate))
+    old_latency, new_latency = latency(loop, old, 20000), latency(loop, new, 20000)
+    print("{0:<16} queue: {1:>9.1f}us   deque: {2:>9.1f}us   ({3:.2f}x)".format(
+        "call latency", old_latency * 1e6, new_latency * 1e6, old_latency / new_latency))
+    old.exit()
+    new.exit()
+    loop.run_until_complete(asyncio.sleep(0, loop=loop))
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,80 @@
+# euphoria-py
+# Copyright (C) 2015  Emily A. Bellows
+#
+# This program is free software: you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation, either version 3 of the License, or
+# (at your option) any later version.
+#
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with this program.  If not, see <http://www.gnu.org/licenses/>.
+
+"""Compares the timer wheel against the event loop's own timers, run with
+'python -m tiny_agent.test.bench_timer'"""
+
+import asyncio
+import random
+import time
+
+from tiny_agent import TimerWheel
+from tiny_agent.test import bench
+
+
+def nothing():
+    pass
+
+
+def compare(label: str, count: int, old, new):
+    # CPU time rather than wall time, so waiting for timers to come due doesn't count.
+    bench.compare(label, count, old, new, names=("call_later", "wheel"), repeat=3, clock=time.process_time)
+
+
+def main():
+    loop = asyncio.get_event_loop()
+    count = 1000000
+    delays = [random.uniform(1.0, 24 * 60 * 60.0) for _ in range(count)]
+
+    def loop_churn():
+        # Schedule, push every timer back once, then cancel them all. The loop's heap can
+        # only move a timer by cancelling it and making another.
+        handles = [loop.call_later(delay, nothing) for delay in delays]
+        handles = [handle.cancel() or loop.call_later(delay + 30.0, nothing) for handle, delay in zip(handles, delays)]
+        for handle in handles:
+            handle.cancel()
+        loop.run_until_complete(asyncio.sleep(0, loop=loop))  # let the loop drop the cancelled handles
+
+    def wheel_churn():
+        wheel = TimerWheel(loop=loop)
+        timers = [wheel.schedule(delay, nothing) for delay in delays]
+        for timer, delay in zip(timers, delays):
+            timer.reschedule(delay + 30.0)
+        for timer in timers:
+            timer.cancel()
+
+    compare("schedule/move/cancel", count, loop_churn, wheel_churn)
+
+    fire_count = 100000
+    short_delays = [random.uniform(0.0, 0.5) for _ in range(fire_count)]
+
+    def loop_fire():
+        for delay in short_delays:
+            loop.call_later(delay, nothing)
+        loop.run_until_complete(asyncio.sleep(0.55, loop=loop))
+
+    def wheel_fire():
+        wheel = TimerWheel(loop=loop)
+        for delay in short_delays:
+            wheel.schedule(delay, nothing)
+        loop.run_until_complete(asyncio.sleep(0.55, loop=loop))
+        assert wheel.fired == fire_count
+
+    compare("schedule and fire", fire_count, loop_fire, wheel_fire)
+
+
+if __name__ == '__main__':
+    main()
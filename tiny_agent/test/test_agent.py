@@ -48,6 +48,139 @@ def test_counter():
     loop.run_until_complete(task())
 
 
+def test_post():
+    loop = asyncio.get_event_loop()
+    counter = Counter(loop=loop)
+
+    async def add(n):
+        counter._counter += n
+        return counter._counter
+
+    async def task():
+        counter.increment()
+        result = await counter.post(add, 10)
+        assert result == 11, "posted functions run in order with the mailbox"
+        counter.exit()
+        assert counter.post(add, 1).cancelled(), "nothing runs once we've exited"
+
+    loop.run_until_complete(task())
+
+
+def test_mailbox_depth():
+    loop = asyncio.get_event_loop()
+    counter = Counter(loop=loop)
+
+    async def task():
+        for _ in range(100):
+            counter.increment()
+        assert counter.mailbox_depth == 100, "nothing runs until we yield"
+        assert await counter.current() == 100
+        assert counter.mailbox_depth == 0
+        await asyncio.sleep(0.01)
+        counter.increment()
+        assert await counter.current() == 101, "an idle agent wakes up for new mail"
+        counter.exit()
+
+    loop.run_until_complete(task())
+
+
+class Batcher(Agent):
+    MAILBOX_BATCH = 8
+
+    def __init__(self, loop=None):
+        super(Batcher, self).__init__(loop=loop)
+        self.batches = []
+
+    @tiny_agent.batch
+    async def add(self, items):
+        self.batches.append(items)
+
+    @tiny_agent.send
+    async def mark(self):
+        self.batches.append("mark")
+
+
+def test_batch():
+    loop = asyncio.get_event_loop()
+    batcher = Batcher(loop=loop)
+    ran_between = []
+
+    async def other():
+        ran_between.append(len(batcher.batches))
+
+    async def task():
+        for i in range(12):
+            batcher.add(i)
+        batcher.mark()
+        batcher.add(12)
+        for _ in range(8):
+            batcher.mark()
+        asyncio.ensure_future(other(), loop=loop)
+        await batcher.post(asyncio.sleep, 0)
+        assert batcher.batches == [list(range(8)), list(range(8, 12)), "mark", [12]] + ["mark"] * 8
+        assert ran_between and ran_between[0] < len(batcher.batches), "a long mailbox lets other tasks run"
+        batcher.exit()
+
+    loop.run_until_complete(task())
+
+
+class Slow(Agent):
+    @tiny_agent.call
+    async def boom(self):
+        raise ValueError("boom")
+
+    @tiny_agent.call
+    async def nap(self, seconds: float) -> float:
+        await asyncio.sleep(seconds)
+        return seconds
+
+    @tiny_agent.call(timeout=0.05)
+    async def impatient_nap(self, seconds: float) -> float:
+        await asyncio.sleep(seconds)
+        return seconds
+
+
+def test_call_failures():
+    loop = asyncio.get_event_loop()
+
+    async def task():
+        slow = Slow(loop=loop)
+        try:
+            await slow.boom()
+            assert False, "the exception should reach the caller"
+        except ValueError:
+            pass
+        assert slow.exited, "raising in a call still takes the agent down"
+        try:
+            await slow.nap(0)
+            assert False, "calling an exited agent should fail right away"
+        except tiny_agent.AgentExited as exc:
+            assert exc.agent is slow
+
+        slow = Slow(loop=loop)
+        running, waiting = slow.nap(10), slow.nap(0)
+        await asyncio.sleep(0.01)
+        slow.exit()
+        for future in (running, waiting):
+            try:
+                await future
+                assert False, "exiting should fail every outstanding call"
+            except tiny_agent.AgentExited:
+                pass
+
+        slow = Slow(loop=loop)
+        try:
+            await slow.impatient_nap(0.2)
+            assert False, "that nap was longer than the timeout"
+        except asyncio.TimeoutError:
+            pass
+        assert await slow.nap(0) == 0, "the agent finishes the nap and carries on"
+        assert slow.alive, "a caller timing out doesn't hurt the agent"
+        slow.exit()
+
+    loop.run_until_complete(asyncio.wait_for(task(), timeout=5.0, loop=loop))
+
+
 def test_linked_task_successful():
     loop = asyncio.get_event_loop()
     agent = Agent(loop=loop)
@@ -79,4 +212,29 @@ def test_linked_task_failure():
         assert mini.exited, "we exploded"
         assert agent.exited, "our linked task should have taken us down too"
 
-    loop.run_until_complete(task())
\ No newline at end of file
+    loop.run_until_complete(task())
+
+
+def test_linked_task_cancelled_with_agent():
+    loop = asyncio.get_event_loop()
+    agent = Agent(loop=loop)
+    cancelled = []
+
+    async def forever():
+        try:
+            await asyncio.sleep(60)
+        except asyncio.CancelledError:
+            cancelled.append(True)
+            raise
+
+    async def task():
+        mini = agent.spawn_linked_task(forever())
+        finale = agent.spawn_linked_task(asyncio.sleep(0.05), unlink_on_success=False)
+        await asyncio.sleep(0.10)
+        assert finale.exited
+        assert agent.exited, "without unlink_on_success, finishing takes the agent down too"
+        assert mini.exited, "and the agent takes its other linked tasks down"
+        await asyncio.sleep(0)
+        assert cancelled, "the coroutine of an exited linked task gets cancelled"
+
+    loop.run_until_complete(task())
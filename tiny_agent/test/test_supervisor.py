@@ -67,6 +67,8 @@ def test_one_for_one_period_reset():
         bomb.explode()
         await asyncio.sleep(0.20)
         assert one_for_one.alive, "we're not dead because the period elapses and resets the restart counter"
+        assert one_for_one.total_restarts == 3, "the period resets the limit, not the running total"
+        assert one_for_one.restarts_by_name == {"bomb": 3}
 
     loop.run_until_complete(task())
 
@@ -82,8 +84,12 @@ def test_one_for_one_period_failure():
         await asyncio.sleep(0.10)
         bomb = await one_for_one.get("bomb")
         bomb.explode()
-        await asyncio.sleep(0.10)
+        for _ in range(10):
+            if one_for_one.exited:
+                break
+            await asyncio.sleep(0.01)
         assert one_for_one.exited, "we're dead because we exploded twice too fast."
+        assert not one_for_one._period_timer.active, "and the shared timer wheel lets go of us before the period ends"
 
     loop.run_until_complete(task())
 
@@ -0,0 +1,104 @@
+# euphoria-py
+# Copyright (C) 2015  Emily A. Bellows
+#
+# This program is free software: you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation, either version 3 of the License, or
+# (at your option) any later version.
+#
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with this program.  If not, see <http://www.gnu.org/licenses/>.
+
+import asyncio
+
+import tiny_agent
+from tiny_agent import Agent, TimerWheel, timer_wheel
+
+
+class Alarm(Agent):
+    def __init__(self, loop=None):
+        super(Alarm, self).__init__(loop=loop)
+        self.rang = []
+
+    @tiny_agent.send
+    async def ring(self, label: str):
+        self.rang.append((label, self.loop.time()))
+
+
+def test_timers_fire_in_order():
+    loop = asyncio.get_event_loop()
+    wheel = TimerWheel(tick=0.005, loop=loop)
+    alarm = Alarm(loop=loop)
+
+    async def task():
+        start = loop.time()
+        wheel.schedule(0.06, alarm.ring, "c")
+        wheel.schedule(0.02, alarm.ring, "a")
+        wheel.schedule(0.04, alarm.ring, "b")
+        cancelled = wheel.schedule(0.03, alarm.ring, "cancelled")
+        moved = wheel.schedule(0.01, alarm.ring, "moved")
+        assert len(wheel) == 5
+        cancelled.cancel()
+        moved.reschedule(0.05)
+        assert not cancelled.active and moved.active
+        await asyncio.sleep(0.1)
+        assert [label for label, _ in alarm.rang] == ["a", "b", "moved", "c"]
+        for (label, when), delay in zip(alarm.rang, [0.02, 0.04, 0.05, 0.06]):
+            assert when >= start + delay - 0.001, "{0} fired early".format(label)
+        assert len(wheel) == 0 and wheel.fired == 4
+        alarm.exit()
+
+    loop.run_until_complete(task())
+
+
+def test_timers_beyond_the_first_level():
+    loop = asyncio.get_event_loop()
+    # Four slots a level and two levels only cover 16 ticks, so these have to cascade and wrap.
+    wheel = TimerWheel(tick=0.005, bits=2, levels=2, loop=loop)
+    alarm = Alarm(loop=loop)
+
+    async def task():
+        start = loop.time()
+        delays = [0.013, 0.037, 0.061, 0.149, 0.002]
+        for delay in delays:
+            wheel.schedule(delay, alarm.ring, delay)
+        await asyncio.sleep(0.2)
+        assert [label for label, _ in alarm.rang] == sorted(delays)
+        for delay, when in alarm.rang:
+            assert start + delay - 0.001 <= when <= start + delay + 0.05
+        alarm.exit()
+
+    loop.run_until_complete(task())
+
+
+def test_timer_set_while_firing():
+    # Setting a later timer from a timer's function doesn't hold back the ones already waiting.
+    loop = asyncio.get_event_loop()
+    wheel = TimerWheel(tick=0.005, loop=loop)
+    alarm = Alarm(loop=loop)
+
+    def first():
+        alarm.ring("first")
+        wheel.schedule(0.5, alarm.ring, "last")
+
+    async def task():
+        start = loop.time()
+        wheel.schedule(0.02, first)
+        wheel.schedule(0.1, alarm.ring, "second")
+        await asyncio.sleep(0.15)
+        assert [label for label, _ in alarm.rang] == ["first", "second"]
+        assert alarm.rang[1][1] <= start + 0.15
+        wheel.close()
+        alarm.exit()
+
+    loop.run_until_complete(task())
+
+
+def test_shared_wheel():
+    loop = asyncio.get_event_loop()
+    assert timer_wheel(loop) is timer_wheel(loop), "everything on a loop shares one wheel"
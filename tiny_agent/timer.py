@@ -0,0 +1,254 @@
+# euphoria-py
+# Copyright (C) 2015  Emily A. Bellows
+#
+# This program is free software: you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation, either version 3 of the License, or
+# (at your option) any later version.
+#
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with this program.  If not, see <http://www.gnu.org/licenses/>.
+
+"""A hierarchical timing wheel, so an agent can have thousands of timers without a task each.
+
+Time is cut into ticks. The first level of the wheel has a slot for each of the next
+few hundred ticks, each level above has slots as long as a whole turn of the level
+below, and timers move down a level whenever the level below comes round to them.
+Scheduling, cancelling and rescheduling are all O(1), and one loop callback drives
+the whole wheel."""
+
+import asyncio
+import logging
+from asyncio import AbstractEventLoop
+from math import ceil, floor
+from typing import Callable, Optional
+from weakref import WeakKeyDictionary
+
+__all__ = ['TimerWheel', 'Timer', 'timer_wheel']
+
+logger = logging.getLogger(__name__)
+
+
+class Timer:
+    """One pending call on a :py:class:`tiny_agent.TimerWheel`. Pass a @tiny_agent.send method
+    as the function and the firing arrives in that agent's mailbox like any other message."""
+
+    __slots__ = ['_wheel', '_expires', '_fn', '_args', '_bucket']
+
+    def __init__(self, wheel: 'TimerWheel', fn: Callable, args: tuple):
+        self._wheel = wheel
+        self._expires = 0
+        self._fn = fn
+        self._args = args
+        self._bucket = None  # the slot we're waiting in, None once fired or cancelled
+
+    def __repr__(self):
+        return "<tiny_agent.Timer fn={0} deadline={1:.2f} active={2}>".format(self._fn, self.deadline, self.active)
+
+    @property
+    def active(self) -> bool:
+        """True until the timer fires or is cancelled.
+
+        :rtype: bool"""
+        return self._bucket is not None
+
+    @property
+    def deadline(self) -> float:
+        """When the timer fires, in the event loop's time.
+
+        :rtype: float"""
+        return self._wheel._tick_time(self._expires)
+
+    def cancel(self):
+        self._wheel.cancel(self)
+
+    def reschedule(self, delay: float):
+        self._wheel.reschedule(self, delay)
+
+
+class TimerWheel:
+    """Calls functions after a delay, to within one tick.
+
+    :param float tick: The resolution of the wheel in seconds, timers fire on the first tick at or after their deadline
+    :param int bits: Each level has 2 ** bits slots
+    :param int levels: How many levels, together they cover tick * 2 ** (bits * levels) seconds. Longer
+        timers wait at the top and are placed again once they come round.
+    :param loop: The event loop to run on"""
+
+    def __init__(self, tick: float = 0.01, bits: int = 8, levels: int = 4, loop: AbstractEventLoop = None):
+        self._loop = loop or asyncio.get_event_loop()
+        self._tick = tick
+        self._bits = bits
+        self._mask = (1 << bits) - 1
+        self._levels = levels
+        self._wheels = [[{} for _ in range(1 << bits)] for _ in range(levels)]
+        self._origin = self._loop.time()
+        self._current = 0  # the last tick we processed
+        self._count = 0
+        self._fired = 0
+        self._handle = None
+        self._wake_at = None
+
+    def __repr__(self):
+        return "<tiny_agent.TimerWheel tick={0} pending={1}>".format(self._tick, self._count)
+
+    def __len__(self) -> int:
+        return self._count
+
+    @property
+    def tick(self) -> float:
+        return self._tick
+
+    @property
+    def fired(self) -> int:
+        """How many timers this wheel has fired.
+
+        :rtype: int"""
+        return self._fired
+
+    def schedule(self, delay: float, fn: Callable, *args) -> Timer:
+        """Calls fn(*args) once delay seconds have passed.
+
+        :rtype: tiny_agent.Timer"""
+        timer = Timer(self, fn, args)
+        self.reschedule(timer, delay)
+        return timer
+
+    def reschedule(self, timer: Timer, delay: float):
+        """Moves a timer to fire delay seconds from now instead, or brings back one that already
+        fired or was cancelled."""
+        now = self._loop.time() - self._origin
+        if timer._bucket is not None:
+            del timer._bucket[timer]
+        else:
+            if not self._count:
+                # Nothing is waiting, so rather than catch up on empty ticks, jump straight to now.
+                self._current = max(self._current, floor(now / self._tick))
+            self._count += 1
+        expires = ceil((now + delay) / self._tick)
+        timer._expires = max(expires, self._current + 1)
+        self._place(timer)
+        if self._wake_at is None or timer._expires < self._wake_at:
+            self._wake(timer._expires)
+
+    def cancel(self, timer: Timer):
+        """Stops a timer from firing, does nothing if it already fired or was cancelled."""
+        if timer._bucket is not None:
+            del timer._bucket[timer]
+            timer._bucket = None
+            self._count -= 1
+            if not self._count and self._handle is not None:
+                self._handle.cancel()
+                self._handle = self._wake_at = None
+
+    def close(self):
+        """Drops every pending timer."""
+        if self._handle is not None:
+            self._handle.cancel()
+            self._handle = self._wake_at = None
+        for wheel in self._wheels:
+            for bucket in wheel:
+                for timer in bucket:
+                    timer._bucket = None
+                bucket.clear()
+        self._count = 0
+
+    def _tick_time(self, tick: int) -> float:
+        return self._origin + tick * self._tick
+
+    def _place(self, timer: Timer):
+        # Files the timer on the lowest level whose turn reaches its tick. Buckets are dicts so
+        # cancelling is O(1) and timers due on the same tick fire in the order they were set.
+        expires = timer._expires
+        distance = expires - self._current
+        if distance <= self._mask:
+            bucket = self._wheels[0][max(expires, self._current) & self._mask]
+        else:
+            level = (distance.bit_length() - 1) // self._bits
+            if level < self._levels:
+                slot = (expires >> (self._bits * level)) & self._mask
+            else:
+                level = self._levels - 1
+                slot = ((self._current >> (self._bits * level)) - 1) & self._mask  # the slot that comes round last
+            bucket = self._wheels[level][slot]
+        bucket[timer] = None
+        timer._bucket = bucket
+
+    def _wake(self, tick: int):
+        if self._handle is not None:
+            self._handle.cancel()
+        self._wake_at = tick
+        self._handle = self._loop.call_at(self._tick_time(tick), self._advance)
+
+    def _advance(self):
+        target = max(self._wake_at, floor((self._loop.time() - self._origin) / self._tick))
+        self._handle = self._wake_at = None
+        for tick in range(self._current + 1, target + 1):
+            self._current = tick
+            if not tick & self._mask:
+                self._cascade(tick)
+            slot = tick & self._mask
+            bucket = self._wheels[0][slot]
+            if bucket:
+                self._wheels[0][slot] = {}
+                self._fire(bucket)
+        if self._count:
+            # A function we fired may have set a timer, and so our wake up, further out than what's already waiting.
+            tick = self._next_tick()
+            if self._wake_at is None or tick < self._wake_at:
+                self._wake(tick)
+
+    def _cascade(self, tick: int):
+        # A level below just finished a turn, so the slots above that now fall within its reach
+        # get spread down. The highest go first, they might be landing in a slot that cascades too.
+        bits = self._bits
+        level = 1
+        while level < self._levels - 1 and not (tick >> (bits * level)) & self._mask:
+            level += 1
+        for level in range(level, 0, -1):
+            slot = (tick >> (bits * level)) & self._mask
+            bucket = self._wheels[level][slot]
+            if bucket:
+                self._wheels[level][slot] = {}
+                for timer in bucket:
+                    self._place(timer)
+
+    def _fire(self, bucket: dict):
+        for timer in list(bucket):
+            if timer._bucket is not bucket:
+                continue  # an earlier timer's function cancelled or moved this one
+            timer._bucket = None
+            self._count -= 1
+            self._fired += 1
+            try:
+                timer._fn(*timer._args)
+            except Exception:
+                logger.exception("%s raised firing %s", self, timer)
+
+    def _next_tick(self) -> int:
+        # The next tick with something due, or else the next one that cascades the level above.
+        wheel = self._wheels[0]
+        mask = self._mask
+        tick = self._current + 1
+        while tick & mask and not wheel[tick & mask]:
+            tick += 1
+        return tick
+
+
+_wheels = WeakKeyDictionary()
+
+
+def timer_wheel(loop: Optional[AbstractEventLoop] = None) -> TimerWheel:
+    """Returns the TimerWheel shared by everything on a loop, creating it the first time.
+
+    :rtype: tiny_agent.TimerWheel"""
+    loop = loop or asyncio.get_event_loop()
+    wheel = _wheels.get(loop)
+    if wheel is None:
+        wheel = _wheels[loop] = TimerWheel(loop=loop)
+    return wheel